@@ -3,190 +3,525 @@ aggregator.py
 -------------
 Pull data from multiple sources: Twitter, StockTwits, Reddit, NewsAPI, RSS Feeds.
 Combine them into a single list of { "text", "source", "created_at", ... } dicts.
+
+Every (source, symbol) request runs at the same time on a thread pool, so
+the slowest source sets the wall time instead of the sum of all of them:
+
+  timeouts     each source has its own (connect, read) timeout, and
+               fetch_all stops waiting at the largest one; a late source is
+               reported as 'timeout' and left out of the result
+  rate limits  a token bucket per source (requests/second + burst). An empty
+               bucket skips the source for that call instead of queueing, and
+               a 429 empties it until the server's reset time (Twitter's
+               x-rate-limit-reset, or Retry-After)
+  cache        results are kept per (source, symbol, max_items, since) for
+               the source's TTL
+  since        fetch_many(..., since={(source, symbol): high-water mark}) asks
+               each source only for newer items: since_id for Twitter and
+               StockTwits, from= for NewsAPI; everything is also filtered on
+               created_at >= the mark client-side (sentiment_store.py keeps the marks)
+  sessions     one pooled requests.Session per source (keep-alive)
+
+Base URLs come from the environment (TWITTER_API_URL, STOCKTWITS_API_URL,
+REDDIT_API_URL, NEWSAPI_URL, RSS_URL) or the base_urls argument, so the
+whole thing runs against local servers. `python aggregator.py bench` does
+that: it starts fake endpoints on 127.0.0.1, one of them slow and one
+answering 429, and compares the old serial loop with the concurrent one.
 """
 
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from xml.etree import ElementTree
+
 import requests
+from requests.adapters import HTTPAdapter
 
 # Optional: If you plan to use load_dotenv for secrets
 from dotenv import load_dotenv
 load_dotenv()
 
-############################
-# TWITTER (X) FETCH (Stub) #
-############################
+DEFAULT_BASE_URLS = {
+    'twitter': 'https://api.twitter.com/2',
+    'stocktwits': 'https://api.stocktwits.com/api/2',
+    'reddit': 'https://www.reddit.com',
+    'news': 'https://newsapi.org/v2',
+    'rss': 'https://news.google.com/rss/search',
+}
 
-def fetch_twitter_for_symbol(symbol, max_results=10):
-    """
-    Attempt to fetch tweets about the symbol (if not rate-limited).
-    Returns a list of dicts, each with: {"text", "created_at", "source": "twitter", ... }
-    If rate-limited or fails, raise an exception or return an empty list.
-    """
-    # PSEUDO-CODE / STUB
-    # from your sentiment_fetch or test_twitter_api approach:
-    # bearer_token = os.getenv("TWITTER_BEARER_TOKEN")
-    # if not bearer_token: raise Exception("No Twitter token")
-
-    # The query might be something like:
-    # query = f"{symbol} -is:retweet lang:en"
-    # ...
-    # Or you might skip Twitter if you're hitting 429 repeatedly.
-
-    # For demonstration, returning an empty list or a fake list:
-    # return []  # If you prefer to skip
-    tweets = []
-    # Example fake data:
-    # tweets = [
-    #     { "text": f"{symbol} soared today!", "created_at": "2025-01-10T14:55:00Z", "source": "twitter" },
-    # ]
-    return tweets
+ENV_BASE_URLS = {
+    'twitter': 'TWITTER_API_URL',
+    'stocktwits': 'STOCKTWITS_API_URL',
+    'reddit': 'REDDIT_API_URL',
+    'news': 'NEWSAPI_URL',
+    'rss': 'RSS_URL',
+}
+
+USER_AGENT = "Stock-Bot/1.0 (sentiment aggregator)"
+
+class RateLimited(Exception):
+    """The source answered 429; 'reset_at' is when it accepts requests again (epoch seconds)."""
+
+    def __init__(self, reset_at):
+        super().__init__(f"rate limited until {datetime.fromtimestamp(reset_at, timezone.utc):%H:%M:%S} UTC")
+        self.reset_at = reset_at
+
+class SourceUnavailable(Exception):
+    """The source can't be called (e.g. no API key configured)."""
 
 #############################
-# STOCKTWITS FETCH (Stub)   #
+# RATE LIMITS + CACHE       #
 #############################
 
-def fetch_stocktwits_for_symbol(symbol, max_results=10):
-    """
-    Use the StockTwits API for a symbol's feed.
-    Docs: https://api.stocktwits.com/developers/docs
-    GET https://api.stocktwits.com/api/2/streams/symbol/{symbol}.json
-    Returns list of { "text", "created_at", "source": "stocktwits" }
-    """
-    # Example:
-    # url = f"https://api.stocktwits.com/api/2/streams/symbol/{symbol}.json"
-    # resp = requests.get(url)
-    # data = resp.json()
-    # messages = data["messages"]  # each message has "body", "created_at", etc.
-    # ...
-    # or handle errors
-    # For now, we return a dummy list:
-    messages = []
-    return messages
+class TokenBucket:
+    """'rate' requests per second on average, bursts of up to 'capacity'."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # wall clock (time.time()) after a 429
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if time.time() < self.blocked_until:
+                return False
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def block_until(self, reset_at):
+        with self._lock:
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, reset_at)
+
+class TTLCache:
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._items.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
 
 #############################
-# REDDIT FETCH (Stub)       #
+# SOURCES                   #
 #############################
+# Each fetcher takes (session, base_url, symbol, max_items, timeout, keys, since)
+# and returns a list of { "text", "created_at", "source", "id", ... } dicts.
+# 'since' is None or {"since_id", "last_created_at"} (either may be None).
 
-def fetch_reddit_for_symbol(symbol, max_items=10):
-    """
-    Possibly use PRAW or direct requests + OAuth to fetch from a relevant subreddit or search.
-    Return list of { "text", "created_at", "source": "reddit" }
-    """
-    # For PRAW, you'd do something like:
-    # import praw
-    # reddit = praw.Reddit(client_id=..., client_secret=..., user_agent=...)
-    # subreddit = reddit.subreddit("stocks")
-    # for submission in subreddit.search(f"{symbol}", limit=max_items):
-    #     ...
-    # Or for r/wallstreetbets, etc.
-    # Return a list of dicts with text & created_at.
-
-    # Dummy return
+def _get(session, url, timeout, **kwargs):
+    resp = session.get(url, timeout=timeout, **kwargs)
+    if resp.status_code == 429:
+        reset = resp.headers.get('x-rate-limit-reset')
+        retry_after = resp.headers.get('Retry-After')
+        if reset:
+            reset_at = float(reset)
+        elif retry_after and retry_after.isdigit():
+            reset_at = time.time() + int(retry_after)
+        else:
+            reset_at = time.time() + 60
+        raise RateLimited(reset_at)
+    resp.raise_for_status()
+    return resp
+
+def fetch_twitter(session, base_url, symbol, max_items, timeout, keys, since=None):
+    """Recent tweets with the cashtag (API v2 search/recent; needs TWITTER_BEARER_TOKEN)."""
+    token = keys.get('twitter')
+    if not token:
+        raise SourceUnavailable("no TWITTER_BEARER_TOKEN")
+    params = {"query": f"${symbol} -is:retweet lang:en",
+              "tweet.fields": "created_at,public_metrics,text",
+              "max_results": max(10, min(max_items, 100))}  # the API's allowed range
+    if since and since.get("since_id"):
+        params["since_id"] = since["since_id"]
+    resp = _get(session, f"{base_url}/tweets/search/recent", timeout,
+                headers={"Authorization": f"Bearer {token}"}, params=params)
+    return [{"id": tweet.get("id"), "text": tweet.get("text", ""), "created_at": tweet.get("created_at"),
+             "source": "twitter"}
+            for tweet in resp.json().get("data", [])[:max_items]]
+
+def fetch_stocktwits(session, base_url, symbol, max_items, timeout, keys, since=None):
+    """The symbol's StockTwits stream (GET /streams/symbol/{symbol}.json)."""
+    params = {"since": since["since_id"]} if since and since.get("since_id") else None
+    resp = _get(session, f"{base_url}/streams/symbol/{symbol}.json", timeout, params=params)
+    return [{"id": msg.get("id"), "text": msg.get("body", ""), "created_at": msg.get("created_at"),
+             "source": "stocktwits"}
+            for msg in resp.json().get("messages", [])[:max_items]]
+
+def fetch_reddit(session, base_url, symbol, max_items, timeout, keys, since=None):
+    """Newest Reddit posts mentioning the symbol (public search.json)."""
+    resp = _get(session, f"{base_url}/search.json", timeout,
+                params={"q": symbol, "sort": "new", "limit": max_items})
     posts = []
+    for child in resp.json().get("data", {}).get("children", [])[:max_items]:
+        post = child.get("data", {})
+        created = post.get("created_utc")
+        posts.append({
+            "id": post.get("id"),
+            "text": " ".join(filter(None, [post.get("title"), post.get("selftext")])),
+            "created_at": datetime.fromtimestamp(created, timezone.utc).isoformat() if created else None,
+            "source": "reddit",
+        })
     return posts
 
-#############################
-# NEWSAPI FETCH (Stub)      #
-#############################
+def fetch_newsapi(session, base_url, symbol, max_items, timeout, keys, since=None):
+    """NewsAPI.org /everything (needs NEWSAPI_KEY)."""
+    api_key = keys.get('news')
+    if not api_key:
+        raise SourceUnavailable("no NEWSAPI_KEY")
+    params = {"q": symbol, "apiKey": api_key, "language": "en", "pageSize": max_items, "sortBy": "publishedAt"}
+    if since and since.get("last_created_at"):
+        params["from"] = since["last_created_at"]
+    resp = _get(session, f"{base_url}/everything", timeout, params=params)
+    return [{"id": article.get("url"),
+             "text": " ".join(filter(None, [article.get("title"), article.get("description")])),
+             "created_at": article.get("publishedAt"), "source": "news"}
+            for article in resp.json().get("articles", [])[:max_items]]
 
-def fetch_newsapi_for_symbol(symbol, max_items=10):
+def fetch_rss(session, base_url, symbol, max_items, timeout, keys, since=None):
+    """Items of an RSS search feed (Google News by default), parsed with ElementTree."""
+    resp = _get(session, base_url, timeout, params={"q": symbol})
+    items = []
+    for item in ElementTree.fromstring(resp.content).iter('item'):
+        published = item.findtext('pubDate')
+        try:
+            created_at = parsedate_to_datetime(published).isoformat() if published else None
+        except (TypeError, ValueError):
+            created_at = None
+        items.append({"id": item.findtext('guid') or item.findtext('link'),
+                      "text": item.findtext('title', ''), "created_at": created_at, "source": "rss"})
+        if len(items) >= max_items:
+            break
+    return items
+
+def _utc(value):
+    # ISO 8601 (with 'Z' or an offset) -> aware UTC datetime; None if unparseable
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def newer_than(items, since):
     """
-    Use NewsAPI.org to fetch news articles related to the symbol.
-    Return list of { "text", "created_at", "source": "news" }
+    Drop items older than the high-water mark (sources that ignore
+    since_id/from, or have none). Items at the mark are kept: timestamps have
+    second resolution, so another item may share it, and the store's primary
+    key ignores the ones already stored.
     """
-    # Example usage:
-    # api_key = os.getenv("NEWSAPI_KEY")
-    # endpoint = "https://newsapi.org/v2/everything"
-    # params = {
-    #     "q": symbol,
-    #     "apiKey": api_key,
-    #     "language": "en",
-    #     "pageSize": max_items
-    # }
-    # resp = requests.get(endpoint, params=params)
-    # data = resp.json()
-    # articles = data["articles"]  # each has "title", "description", "publishedAt"
-    # ...
-    # Return them as a list of dicts with "text" = title or description, "created_at" = publishedAt
-
-    articles = []
-    return articles
+    mark = _utc(since["last_created_at"]) if since and since.get("last_created_at") else None
+    if mark is None:
+        return items
+    kept = []
+    for item in items:
+        created = _utc(item["created_at"]) if item.get("created_at") else None
+        if created is None or created >= mark:
+            kept.append(item)  # undated items are left to the store's id dedup
+    return kept
+
+class Source:
+    def __init__(self, name, fetch, timeout=5.0, rate=1.0, burst=5, ttl=300):
+        self.name = name
+        self.fetch = fetch
+        self.timeout = timeout  # read timeout; connecting gets min(timeout, 3s)
+        self.bucket = TokenBucket(rate, burst)
+        self.ttl = ttl
+
+# Twitter's free tier allows very few searches (the 429s in sentiment_fetch.py)
+def default_sources():
+    return [
+        Source('twitter', fetch_twitter, timeout=5.0, rate=1 / 60, burst=1, ttl=900),
+        Source('stocktwits', fetch_stocktwits, timeout=5.0, rate=0.5, burst=10, ttl=120),
+        Source('reddit', fetch_reddit, timeout=5.0, rate=1.0, burst=10, ttl=300),
+        Source('news', fetch_newsapi, timeout=8.0, rate=0.1, burst=5, ttl=900),
+        Source('rss', fetch_rss, timeout=8.0, rate=1.0, burst=10, ttl=900),
+    ]
 
 #############################
-# RSS FEEDS FETCH (Stub)    #
+# AGGREGATE ALL SOURCES     #
 #############################
 
-def fetch_rss_for_symbol(symbol, max_items=10):
+class Aggregator:
+    def __init__(self, sources=None, base_urls=None, keys=None, max_workers=16):
+        self.sources = {source.name: source for source in (sources or default_sources())}
+        self.base_urls = {name: (base_urls or {}).get(name) or os.getenv(ENV_BASE_URLS[name], DEFAULT_BASE_URLS[name])
+                          for name in self.sources}
+        self.keys = keys if keys is not None else {
+            'twitter': os.getenv("TWITTER_BEARER_TOKEN"),
+            'news': os.getenv("NEWSAPI_KEY"),
+        }
+        self.cache = TTLCache()
+        self.sessions = {name: self._session(max_workers) for name in self.sources}
+        self.max_workers = max_workers
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='aggregator')
+        self.last_report = {}
+
+    @staticmethod
+    def _session(pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = USER_AGENT
+        return session
+
+    def _fetch_one(self, name, symbol, max_items, since=None):
+        """(status, items) for one source; status is 'ok', 'cached', 'rate_limited', 'unavailable' or 'error: ...'."""
+        source = self.sources[name]
+        key = (name, symbol, max_items, tuple(sorted((since or {}).items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return 'cached', cached
+        if not source.bucket.try_acquire():
+            return 'rate_limited', []
+        try:
+            items = source.fetch(self.sessions[name], self.base_urls[name], symbol, max_items,
+                                 (min(source.timeout, 3.0), source.timeout), self.keys, since)
+            items = newer_than(items, since)
+        except RateLimited as e:
+            source.bucket.block_until(e.reset_at)
+            return 'rate_limited', []
+        except SourceUnavailable:
+            return 'unavailable', []
+        except (requests.Timeout, requests.ConnectionError):
+            return 'timeout', []
+        except Exception as e:
+            return f"error: {e}", []
+        self.cache.set(key, items, source.ttl)
+        return 'ok', items
+
+    def fetch_many(self, symbols, max_items=10, since=None):
+        """
+        {symbol: combined items} for every symbol, all (source, symbol)
+        requests in flight at once. 'since' maps (source, symbol) to a
+        high-water mark. Per-request outcomes go to last_report.
+        """
+        since = since or {}
+        start = time.perf_counter()
+        futures = {self.pool.submit(self._fetch_one, name, symbol, max_items, since.get((name, symbol))): (name, symbol)
+                   for symbol in symbols for name in self.sources}
+        # Requests queue behind max_workers at a time, so every batch gets the full timeout
+        batches = -(-len(futures) // self.max_workers)
+        deadline = max(source.timeout for source in self.sources.values()) * batches
+        done, not_done = wait(futures, timeout=deadline)
+        for future in not_done:
+            future.cancel()  # don't let requests that never started hold slots into the next poll
+
+        results = {symbol: [] for symbol in symbols}
+        report = {}
+        for future, (name, symbol) in futures.items():
+            if future in done:
+                status, items = future.result()
+            else:
+                status, items = 'timeout', []
+            results[symbol].extend(items)
+            report[(name, symbol)] = {"status": status, "items": len(items)}
+        self.last_report = {"seconds": round(time.perf_counter() - start, 3), "requests": report}
+        return results
+
+    def fetch_all(self, symbol, max_items=10):
+        return self.fetch_many([symbol], max_items)[symbol]
+
+    def stats(self):
+        return {
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "tokens": {name: round(source.bucket.tokens, 2) for name, source in self.sources.items()},
+        }
+
+_default = None
+_default_lock = threading.Lock()
+
+def default_aggregator():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Aggregator()
+        return _default
+
+def fetch_all_sentiment(symbol, max_items=10):
     """
-    Use feedparser or requests to parse RSS feeds from Yahoo/Google or other sources.
-    Return list of { "text", "created_at", "source": "rss" }
+    Fetches from all sources concurrently. A source that fails, times out or
+    is rate-limited is skipped (see default_aggregator().last_report).
+    Returns a combined list of dicts: { "text", "created_at", "source", ... }
     """
-    # Example with feedparser (pip install feedparser):
-    # import feedparser
-    # feed_url = f"https://news.google.com/rss/search?q={symbol}"
-    # feed = feedparser.parse(feed_url)
-    # entries = feed.entries[:max_items]
-    # ...
-    # For each entry, you have title, link, published, etc.
-
-    # Dummy return
-    rss_items = []
-    return rss_items
+    aggregator = default_aggregator()
+    results = aggregator.fetch_all(symbol, max_items)
+    for (name, _), outcome in aggregator.last_report["requests"].items():
+        if outcome["status"] not in ('ok', 'cached', 'unavailable'):
+            print(f"{name}: {outcome['status']}")
+    return results
+
+def _fetch_source(name, symbol, max_items):
+    return default_aggregator()._fetch_one(name, symbol, max_items)[1]
+
+def fetch_twitter_for_symbol(symbol, max_results=10):
+    return _fetch_source('twitter', symbol, max_results)
+
+def fetch_stocktwits_for_symbol(symbol, max_results=10):
+    return _fetch_source('stocktwits', symbol, max_results)
+
+def fetch_reddit_for_symbol(symbol, max_items=10):
+    return _fetch_source('reddit', symbol, max_items)
+
+def fetch_newsapi_for_symbol(symbol, max_items=10):
+    return _fetch_source('news', symbol, max_items)
+
+def fetch_rss_for_symbol(symbol, max_items=10):
+    return _fetch_source('rss', symbol, max_items)
 
 #############################
-# AGGREGATE ALL SOURCES     #
+# FAKE SERVERS + BENCH      #
 #############################
 
-def fetch_all_sentiment(symbol, max_items=10):
+def start_fake_server(latency=None, rate_limit_every=0):
     """
-    Attempts to fetch from all sources. If one fails or is rate-limited, it logs or skips.
-    Returns a combined list of dicts: { "text", "created_at", "source", ... }
+    Serve fake versions of every source on 127.0.0.1 (a daemon thread).
+    'latency' is {source: seconds}; every 'rate_limit_every'-th Twitter
+    request gets a 429. Returns (server, base_urls).
     """
-    combined_data = []
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
 
-    # 1) Twitter
-    try:
-        twitter_data = fetch_twitter_for_symbol(symbol, max_results=max_items)
-        combined_data.extend(twitter_data)
-    except Exception as e:
-        print(f"Twitter error: {e}")
+    latency = latency or {}
+    counter = {'twitter': 0}
+    counter_lock = threading.Lock()
+    now = datetime.now(timezone.utc)
 
-    # 2) StockTwits
-    try:
-        st_data = fetch_stocktwits_for_symbol(symbol, max_results=max_items)
-        combined_data.extend(st_data)
-    except Exception as e:
-        print(f"StockTwits error: {e}")
+    def payload(source, symbol, n):
+        texts = [f"{symbol} looks strong today #{i}" if i % 2 else f"Selling {symbol}, weak guidance #{i}"
+                 for i in range(n)]
+        if source == 'twitter':
+            return {"data": [{"id": str(i), "text": t, "created_at": now.isoformat()} for i, t in enumerate(texts)]}
+        if source == 'stocktwits':
+            return {"messages": [{"id": i, "body": t, "created_at": now.isoformat()} for i, t in enumerate(texts)]}
+        if source == 'reddit':
+            return {"data": {"children": [{"data": {"id": str(i), "title": t, "created_utc": now.timestamp()}}
+                                          for i, t in enumerate(texts)]}}
+        return {"articles": [{"url": f"https://example.com/{symbol}/{i}", "title": t,
+                              "publishedAt": now.isoformat()} for i, t in enumerate(texts)]}
 
-    # 3) Reddit
-    try:
-        reddit_data = fetch_reddit_for_symbol(symbol, max_items=max_items)
-        combined_data.extend(reddit_data)
-    except Exception as e:
-        print(f"Reddit error: {e}")
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
 
-    # 4) NewsAPI
-    try:
-        newsapi_data = fetch_newsapi_for_symbol(symbol, max_items=max_items)
-        combined_data.extend(newsapi_data)
-    except Exception as e:
-        print(f"NewsAPI error: {e}")
+        def do_GET(self):
+            url = urlparse(self.path)
+            source = url.path.strip('/').split('/')[0]
+            query = parse_qs(url.query)
+            time.sleep(latency.get(source, 0.0))
+            if source == 'twitter' and rate_limit_every:
+                with counter_lock:
+                    counter['twitter'] += 1
+                    limited = counter['twitter'] % rate_limit_every == 0
+                if limited:
+                    self.send_response(429)
+                    self.send_header('x-rate-limit-reset', str(int(time.time()) + 60))
+                    self.end_headers()
+                    return
+            symbol = query.get('q', [url.path.rsplit('/', 1)[-1].replace('.json', '')])[0].lstrip('$').split()[0]
+            if source == 'rss':
+                items = ''.join(f"<item><title>{symbol} headline {i}</title><guid>{symbol}-{i}</guid>"
+                                f"<pubDate>{now:%a, %d %b %Y %H:%M:%S} GMT</pubDate></item>" for i in range(10))
+                body = f"<rss><channel>{items}</channel></rss>".encode()
+                content_type = 'application/rss+xml'
+            else:
+                body = json.dumps(payload(source, symbol, 10)).encode()
+                content_type = 'application/json'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up (timeout)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = f"http://127.0.0.1:{server.server_address[1]}"
+    base_urls = {'twitter': f"{root}/twitter", 'stocktwits': f"{root}/stocktwits/api/2",
+                 'reddit': f"{root}/reddit", 'news': f"{root}/news", 'rss': f"{root}/rss"}
+    return server, base_urls
+
+def benchmark(symbols=('AAPL', 'MSFT', 'TSLA', 'NVDA'), max_items=5):
+    """Old serial loop vs concurrent fan-out vs warm cache, against local fake sources."""
+    latency = {'twitter': 0.3, 'stocktwits': 0.2, 'reddit': 0.4, 'news': 0.3, 'rss': 3.0}  # RSS hangs past the timeout
+    server, base_urls = start_fake_server(latency, rate_limit_every=3)
+    keys = {'twitter': 'fake-token', 'news': 'fake-key'}
+
+    def sources():
+        # Generous buckets so the benchmark measures latency, except Twitter's
+        return [Source(s.name, s.fetch, timeout=2.0, rate=100, burst=100 if s.name != 'twitter' else 2, ttl=s.ttl)
+                for s in default_sources()]
 
-    # 5) RSS
     try:
-        rss_data = fetch_rss_for_symbol(symbol, max_items=max_items)
-        combined_data.extend(rss_data)
-    except Exception as e:
-        print(f"RSS error: {e}")
+        # The old shape: one source after another, no timeout of our own (capped at 15s here)
+        serial = Aggregator(sources(), base_urls, keys, max_workers=1)
+        start = time.perf_counter()
+        count = 0
+        for symbol in symbols:
+            for name, source in serial.sources.items():
+                try:
+                    count += len(source.fetch(serial.sessions[name], serial.base_urls[name], symbol,
+                                              max_items, 15.0, keys))
+                except Exception as e:
+                    print(f"serial {name}/{symbol}: {type(e).__name__}")
+        print(f"serial:     {time.perf_counter() - start:6.2f}s  {count} items")
 
-    return combined_data
+        concurrent = Aggregator(sources(), base_urls, keys)
+        for label in ("concurrent", "cached"):
+            start = time.perf_counter()
+            results = concurrent.fetch_many(symbols, max_items)
+            statuses = {}
+            for outcome in concurrent.last_report["requests"].values():
+                statuses[outcome["status"]] = statuses.get(outcome["status"], 0) + 1
+            print(f"{label + ':':<11} {time.perf_counter() - start:6.2f}s  "
+                  f"{sum(len(v) for v in results.values())} items  {statuses}")
+        print(concurrent.stats())
+    finally:
+        server.shutdown()
 
 #############################
 # TEST OR DEMO              #
 #############################
 
 if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        benchmark()
+        sys.exit(0)
+
     # Example usage
     symbol_to_test = "AAPL"
     results = fetch_all_sentiment(symbol_to_test, max_items=5)
@@ -0,0 +1,330 @@
+"""
+backtest.py
+-----------
+Vectorized backtests of the per-ticker KNN signals.
+
+A signal on day t (features at t's close) sets the position held from t's
+close to t+1's close:
+
+  pnl[t]  = position[t] * (close[t+1] / close[t] - 1) - cost * |position[t] - position[t-1]|
+
+Every ticker and parameter set is computed at once over a
+(thresholds x long/short x costs x symbols x days) array. Positions and
+equity are never looped over day by day.
+
+Label-threshold sweep without retraining
+  A KNN prediction is a vote of the neighbours' training labels. Training
+  labels are buy/sell when the next close moved more than LABEL_THRESHOLD
+  (1%, train_knn.py). So the neighbours of every day are looked up once.
+  The next-day move of each neighbour is kept, and the vote is then re-run
+  for any other threshold with a few array comparisons. That is the model
+  you would get by retraining with that threshold and the same k/metric/
+  scaling. At the threshold the model was trained with, the positions are
+  the model's own predictions.
+
+  This needs a model artifact trained on the current feature cache
+  (train_knn.py). For legacy pickles, or if the training rows no longer
+  match the features, only the model's own predictions are tested
+  ('relabeled': False).
+
+By default only days after the model's training range are traded (out of
+sample); in_sample=True trades every day with features.
+
+  python backtest.py [SYMBOLS...]      sweep DEFAULT_THRESHOLDS x long/short x DEFAULT_COSTS_BPS
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import features
+import knn_artifact
+from schema import to_day
+
+TRADING_DAYS = 252
+
+# train_knn.LABEL_THRESHOLD (not imported: train_knn pulls in sklearn)
+TRAINED_THRESHOLD = 0.01
+
+DEFAULT_THRESHOLDS = [0.0, 0.0025, 0.005, 0.01, 0.015, 0.02, 0.03]
+DEFAULT_COSTS_BPS = [0.0, 5.0, 10.0]
+
+CLASSES = np.array([-1, 0, 1])  # sell, hold, buy; vote ties go to the first
+
+METRICS = ['total_return', 'buy_hold_return', 'sharpe', 'max_drawdown', 'turnover', 'trades', 'exposure', 'days']
+
+class SymbolInputs:
+    """
+    What the backtest needs from one symbol's model, for its 'days' (T days):
+      next_return   (T,)    close[t+1] / close[t] - 1 (0 on the last day)
+      weights       (T, k)  neighbour vote weights
+      labels        (T, k)  the neighbours' training labels
+      close, future (T, k)  the neighbours' training close / next close, or None
+                            when the model can't be relabeled
+    """
+
+    def __init__(self, symbol, days, next_return, weights, labels, close=None, future=None, trained_threshold=None):
+        self.symbol = symbol
+        self.days = days
+        self.next_return = next_return
+        self.weights = weights
+        self.labels = labels
+        self.close = close
+        self.future = future
+        self.trained_threshold = trained_threshold
+
+    @property
+    def relabeled(self):
+        return self.close is not None
+
+    def labels_at(self, threshold):
+        """Neighbour labels under 'threshold', computed the way train_knn.add_labels does."""
+        if not self.relabeled:
+            return self.labels
+        return ((self.future > self.close * (1 + threshold)).astype(np.int8)
+                - (self.future < self.close * (1 - threshold)).astype(np.int8))
+
+def neighbors(model, X):
+    """(distances, indices, training label per row, weights mode) for an artifact or a fitted sklearn model."""
+    if isinstance(model, knn_artifact.KNNArtifact):
+        dist, ind = model.kneighbors(X)
+        return dist, ind, model.classes[model.y], model.weights
+    # Fitted on DataFrames: keep the column names
+    X = pd.DataFrame(X, columns=features.FEATURE_COLS)
+    if hasattr(model, 'named_steps'):
+        knn = model.steps[-1][1]
+        X = model[:-1].transform(X) if len(model.steps) > 1 else X
+    else:
+        knn = model
+    dist, ind = knn.kneighbors(X)
+    return dist, ind, knn.classes_[knn._y], knn.weights
+
+def training_rows(model, matrix):
+    """
+    (close, next close) of each of the model's training rows, read back from
+    the feature matrix, or None if they can't be matched up (legacy pickle,
+    data rewritten since training). Training rows are the first meta['rows']
+    feature rows from train first_date, in order (train_knn.search_symbol).
+    """
+    if not isinstance(model, knn_artifact.KNNArtifact):
+        return None
+    train = model.meta.get('train') or {}
+    if 'first_date' not in train:
+        return None
+    start = int(np.searchsorted(matrix.days, to_day(train['first_date'])))
+    end = start + model.meta['rows']
+    if end >= len(matrix) or matrix.days[end - 1] != to_day(train['last_date']):
+        return None
+    close = matrix.column('close')
+    return close[start:end], close[start + 1:end + 1]
+
+def prepare(symbol, model, matrix, in_sample=False):
+    """SymbolInputs for 'symbol' from its model and FeatureMatrix (None if there is nothing to trade)."""
+    rows = training_rows(model, matrix)
+    train = (model.meta.get('train') or {}) if isinstance(model, knn_artifact.KNNArtifact) else {}
+    if train.get('last_date') and not in_sample:
+        matrix = matrix.after(to_day(train['last_date']))
+    if len(matrix) < 2:
+        return None
+
+    dist, ind, train_labels, weights = neighbors(model, matrix.X)
+    close = matrix.column('close').astype(float)
+    next_return = np.zeros(len(close))
+    next_return[:-1] = close[1:] / close[:-1] - 1
+    inputs = SymbolInputs(symbol, matrix.days, next_return, knn_artifact.neighbor_weights(dist, weights),
+                          np.asarray(train_labels)[ind])
+
+    if rows is not None:
+        threshold = model.meta.get('metrics', {}).get('label_threshold', TRAINED_THRESHOLD)
+        candidate = SymbolInputs(symbol, inputs.days, next_return, inputs.weights, inputs.labels,
+                                 rows[0][ind], rows[1][ind], threshold)
+        # Only trust the mapping if it reproduces the stored labels exactly
+        if np.array_equal(candidate.labels_at(threshold), inputs.labels):
+            inputs = candidate
+    return inputs
+
+def load_inputs(conn, symbols, model_dir=None, in_sample=False, load_model=None):
+    """
+    SymbolInputs for every symbol with a model and features. 'load_model'
+    is symbol -> (model, version); default: signal_store.load_model_file.
+    """
+    if load_model is None:
+        from signal_store import MODEL_DIR, load_model_file
+        load_model = lambda symbol: load_model_file(symbol, model_dir or MODEL_DIR)  # noqa: E731
+
+    inputs = []
+    for symbol in symbols:
+        model, _ = load_model(symbol)
+        if model is None:
+            continue
+        prepared = prepare(symbol, model, features.load_features(conn, symbol), in_sample)
+        if prepared is not None:
+            inputs.append(prepared)
+    return inputs
+
+#############################
+# ENGINE                    #
+#############################
+
+class Backtest:
+    """
+    Results of run(). Arrays are indexed [threshold, short, cost, symbol, day]
+    (positions without the cost axis); metrics[name] is [threshold, short, cost, symbol].
+    """
+
+    def __init__(self, inputs, days, thresholds, shorts, costs_bps, positions, net, active, metrics):
+        self.symbols = [i.symbol for i in inputs]
+        self.relabeled = [i.relabeled for i in inputs]
+        self.days = days
+        self.thresholds = list(thresholds)
+        self.shorts = list(shorts)
+        self.costs_bps = list(costs_bps)
+        self.positions = positions
+        self.net = net
+        self.active = active
+        self.metrics = metrics
+
+    def table(self):
+        """One row per (symbol, threshold, short, cost_bps) with every metric."""
+        P, S, C, N = self.metrics['sharpe'].shape
+        p, s, c, n = (axis.ravel() for axis in np.indices((P, S, C, N)))
+        df = pd.DataFrame({
+            'symbol': np.asarray(self.symbols)[n],
+            'threshold': np.asarray(self.thresholds)[p],
+            'short': np.asarray(self.shorts)[s],
+            'cost_bps': np.asarray(self.costs_bps)[c],
+            'relabeled': np.asarray(self.relabeled)[n],
+        })
+        for name in METRICS:
+            df[name] = self.metrics[name].ravel()
+        return df
+
+    def index(self, symbol, threshold, short, cost_bps):
+        return (self.thresholds.index(threshold), self.shorts.index(short),
+                self.costs_bps.index(cost_bps), self.symbols.index(symbol))
+
+    def result(self, symbol, threshold, short, cost_bps):
+        """Metrics plus the daily position and equity series of one run."""
+        p, s, c, n = self.index(symbol, threshold, short, cost_bps)
+        active = self.active[n]
+        equity = np.cumprod(1 + self.net[p, s, c, n])[active]
+        return {
+            'symbol': symbol,
+            'params': {'threshold': threshold, 'short': short, 'cost_bps': cost_bps},
+            'relabeled': self.relabeled[n],
+            'metrics': {name: _plain(self.metrics[name][p, s, c, n]) for name in METRICS},
+            'dates': np.datetime_as_string(self.days[active].astype('datetime64[D]')).tolist(),
+            'position': self.positions[p, s, n][active].astype(int).tolist(),
+            'equity': np.round(equity, 6).tolist(),
+        }
+
+def _plain(value):
+    value = value.item() if hasattr(value, 'item') else value
+    return round(value, 6) if isinstance(value, float) else value
+
+def _pad(inputs, days, attr, fill, dtype):
+    # Stack one per-symbol (T_i, ...) array into (N, T, ...) on the shared day axis
+    first = getattr(inputs[0], attr)
+    k = max(getattr(i, attr).shape[1] for i in inputs) if first.ndim == 2 else None
+    out = np.full((len(inputs), len(days)) + ((k,) if k else ()), fill, dtype=dtype)
+    for n, i in enumerate(inputs):
+        values = getattr(i, attr)
+        cols = np.searchsorted(days, i.days)
+        if k:
+            out[n, cols, :values.shape[1]] = values
+        else:
+            out[n, cols] = values
+    return out
+
+def run(inputs, thresholds=DEFAULT_THRESHOLDS, shorts=(False, True), costs_bps=DEFAULT_COSTS_BPS, workers=None):
+    """
+    Backtest every SymbolInputs under every (threshold, short, cost) at once.
+    The vote for each threshold runs on a thread pool ('workers' threads;
+    NumPy releases the GIL), everything after it is one array expression.
+    """
+    days = np.unique(np.concatenate([i.days for i in inputs]))
+    weights = _pad(inputs, days, 'weights', 0.0, float)
+    labels = _pad(inputs, days, 'labels', 0, np.int8)
+    next_return = _pad(inputs, days, 'next_return', 0.0, float)
+    active = np.zeros((len(inputs), len(days)), dtype=bool)
+    for n, i in enumerate(inputs):
+        active[n, np.searchsorted(days, i.days)] = True
+    relabel = np.array([i.relabeled for i in inputs])
+    if relabel.any():
+        relabeled = [i for i in inputs if i.relabeled]
+        close = _pad(relabeled, days, 'close', np.nan, np.float32)
+        future = _pad(relabeled, days, 'future', np.nan, np.float32)
+
+    def positions_at(threshold):
+        threshold_labels = labels
+        if relabel.any():
+            # Same comparisons as SymbolInputs.labels_at, for every relabeled symbol at once
+            threshold_labels = labels.copy()
+            threshold_labels[relabel] = ((future > close * (1 + threshold)).astype(np.int8)
+                                         - (future < close * (1 - threshold)).astype(np.int8))
+        votes = np.stack([(weights * (threshold_labels == cls)).sum(axis=-1) for cls in CLASSES])
+        return CLASSES[votes.argmax(axis=0)] * active
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        positions = np.stack(list(pool.map(positions_at, [float(t) for t in thresholds])))
+
+    # [threshold, short, symbol, day]
+    positions = np.stack([positions if short else np.maximum(positions, 0) for short in shorts], axis=1)
+    turnover = np.abs(np.diff(positions, axis=-1, prepend=0))
+    cost = np.asarray(costs_bps, dtype=float)[None, None, :, None, None] / 10_000
+    net = (positions * next_return)[:, :, None] - cost * turnover[:, :, None]
+
+    days_traded = np.maximum(active.sum(axis=-1), 1)
+    equity = np.cumprod(1 + net, axis=-1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=-1), 1.0)
+    mean = net.sum(axis=-1) / days_traded
+    std = np.sqrt((((net - mean[..., None]) ** 2) * active).sum(axis=-1) / days_traded)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(TRADING_DAYS), 0.0)
+
+    shape = net.shape[:-1]
+    metrics = {
+        'total_return': equity[..., -1] - 1,
+        'buy_hold_return': np.broadcast_to(np.prod(1 + next_return, axis=-1) - 1, shape),
+        'sharpe': sharpe,
+        'max_drawdown': (equity / peak - 1).min(axis=-1),
+        'turnover': np.broadcast_to((turnover.sum(axis=-1) / days_traded)[:, :, None], shape),
+        'trades': np.broadcast_to(np.count_nonzero(turnover, axis=-1)[:, :, None], shape),
+        'exposure': np.broadcast_to((np.abs(positions).sum(axis=-1) / days_traded)[:, :, None], shape),
+        'days': np.broadcast_to(active.sum(axis=-1), shape),
+    }
+    return Backtest(inputs, days, thresholds, shorts, costs_bps, positions, net, active, metrics)
+
+def print_best(table, by='sharpe'):
+    """Best parameter set per symbol."""
+    best = table.sort_values(by, ascending=False).groupby('symbol', sort=True).head(1)
+    for row in best.sort_values('symbol').itertuples():
+        note = '' if row.relabeled else '  (model labels only)'
+        print(f"{row.symbol:<6} thr {row.threshold:<6} {'long/short' if row.short else 'long only ':<10} "
+              f"cost {row.cost_bps:>4.0f}bp  return {row.total_return * 100:7.2f}% "
+              f"(buy&hold {row.buy_hold_return * 100:7.2f}%)  sharpe {row.sharpe:5.2f}  "
+              f"maxDD {row.max_drawdown * 100:6.2f}%  turnover {row.turnover:.2f}{note}")
+
+if __name__ == "__main__":
+    import market_summary
+
+    conn = features.connect()
+    symbols = sys.argv[1:] or market_summary.read_symbols(conn)
+    start = time.perf_counter()
+    inputs = load_inputs(conn, symbols)
+    conn.close()
+    prepared = time.perf_counter() - start
+    if not inputs:
+        print("No symbols with both a model and features.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    backtest = run(inputs, workers=int(os.getenv("BACKTEST_WORKERS", "0")) or None)
+    table = backtest.table()
+    print(f"{len(inputs)} symbols x {len(DEFAULT_THRESHOLDS) * 2 * len(DEFAULT_COSTS_BPS)} parameter sets "
+          f"x {len(backtest.days)} days: neighbours {prepared:.2f}s, sweep {time.perf_counter() - start:.3f}s")
+    print_best(table)
@@ -0,0 +1,308 @@
+"""
+columnar_store.py
+-----------------
+market_data exported to per-symbol columnar files, for analytics that want a
+few columns over many symbols without pulling every column of every row
+through SQLite.
+
+  data/columnar/{symbol}.json                    header: format, columns, rows,
+                                                 day range, summary revision
+  data/columnar/{symbol}.{version}.arrow         Arrow IPC (pyarrow installed), or
+  data/columnar/{symbol}.{version}.parquet       Parquet (COLUMNAR_FORMAT=parquet), or
+  data/columnar/{symbol}.{version}.{column}.npy  one array per column (no pyarrow)
+
+Rows are sorted by 'day' (schema.py epoch days; every other column is
+float64 with NaN for NULL). Reads memory-map the files: a date range is
+found with a binary search on the day column and only the requested
+columns of that range are touched (Parquet reads push the columns and day
+filter down to the file instead). As with knn_artifact.py, the .json header is
+written last with an atomic rename and names the data files, so a reader
+never sees a half-written export.
+
+export() skips symbols whose symbol_summary revision matches the header, so
+the scheduler can run it after every update (the 'columnar' job) and only
+the symbols that got new bars are rewritten.
+
+  python columnar_store.py export [SYMBOLS...]   export changed symbols (all with --force)
+  python columnar_store.py bench                 SQLite vs columnar reads of a few columns
+"""
+
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import market_summary
+from schema import from_day, migrate, to_day
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: pip install pyarrow
+    pa = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_PATH = os.path.join(BASE_DIR, 'data', 'historical_data.db')
+COLUMNAR_DIR = os.path.join(BASE_DIR, 'data', 'columnar')
+
+FORMATS = ['arrow', 'parquet', 'npy']
+DEFAULT_FORMAT = os.getenv("COLUMNAR_FORMAT") or ('arrow' if pa is not None else 'npy')
+
+def header_path(symbol, out_dir=COLUMNAR_DIR):
+    return os.path.join(out_dir, f"{symbol}.json")
+
+def read_header(symbol, out_dir=COLUMNAR_DIR):
+    try:
+        with open(header_path(symbol, out_dir)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+#############################
+# EXPORT                    #
+#############################
+
+def read_market_data(conn, symbol):
+    """Every market_data column of 'symbol' (day int64, the rest float64), sorted by day."""
+    df = pd.read_sql_query("SELECT * FROM market_data WHERE symbol = ? ORDER BY day", conn, params=(symbol,))
+    df = df.drop(columns=['symbol', 'date'])
+    return df.astype({col: 'int64' if col == 'day' else 'float64' for col in df.columns})
+
+def _write_files(df, symbol, version, fmt, out_dir):
+    """Write the data files; returns their names (relative to out_dir)."""
+    if fmt == 'npy':
+        files = {}
+        for col in df.columns:
+            name = f"{symbol}.{version}.{col}.npy"
+            np.save(os.path.join(out_dir, name), df[col].to_numpy())
+            files[col] = name
+        return files
+    if pa is None:
+        raise RuntimeError(f"COLUMNAR_FORMAT={fmt} needs pyarrow (pip install pyarrow)")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    name = f"{symbol}.{version}.{fmt}"
+    if fmt == 'arrow':
+        # Uncompressed, so the buffers can be used straight from the memory map
+        feather.write_feather(table, os.path.join(out_dir, name), compression='uncompressed')
+    else:
+        pq.write_table(table, os.path.join(out_dir, name))
+    return {'*': name}
+
+def export_symbol(conn, symbol, out_dir=COLUMNAR_DIR, fmt=None, force=False):
+    """Export one symbol if its summary revision moved (or 'force'). Returns rows written (0 = skipped)."""
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown columnar format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    summary = market_summary.read_summary(conn, symbol)
+    if summary is None:
+        return 0
+    old = read_header(symbol, out_dir)
+    if not force and old is not None and old['revision'] == summary['revision'] and old['format'] == fmt:
+        return 0
+
+    df = read_market_data(conn, symbol)
+    os.makedirs(out_dir, exist_ok=True)
+    version = f"{summary['revision']}-{time.time_ns() % 10**9:09d}"
+    header = {
+        'symbol': symbol,
+        'format': fmt,
+        'version': version,
+        'revision': summary['revision'],
+        'rows': len(df),
+        'first_day': int(df['day'].iloc[0]) if len(df) else None,
+        'last_day': int(df['day'].iloc[-1]) if len(df) else None,
+        'columns': list(df.columns),
+        'files': _write_files(df, symbol, version, fmt, out_dir),
+    }
+    path = header_path(symbol, out_dir)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(header, f, indent=2)
+    os.replace(tmp, path)
+
+    # The previous version's files; a process still mapping one keeps its view
+    if old is not None:
+        for name in set(old['files'].values()) - set(header['files'].values()):
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except FileNotFoundError:
+                pass
+    return len(df)
+
+def export(conn, symbols=None, out_dir=COLUMNAR_DIR, fmt=None, force=False):
+    """export_symbol for 'symbols' (default: all). Returns {symbol: rows written} for the ones rewritten."""
+    symbols = symbols or market_summary.read_symbols(conn)
+    start = time.perf_counter()
+    written = {}
+    for symbol in symbols:
+        rows = export_symbol(conn, symbol, out_dir, fmt, force)
+        if rows:
+            written[symbol] = rows
+    print(f"Columnar export ({fmt or DEFAULT_FORMAT}): {len(written)} of {len(symbols)} symbols rewritten, "
+          f"{sum(written.values())} rows in {time.perf_counter() - start:.2f}s")
+    return written
+
+#############################
+# READING                   #
+#############################
+
+def _day_range(days, start, end):
+    lo = 0 if start is None else int(np.searchsorted(days, to_day(start), side='left'))
+    hi = len(days) if end is None else int(np.searchsorted(days, to_day(end), side='right'))
+    return lo, hi
+
+# (out_dir, symbol) -> (header mtime, header, {column: memmap}); see _open()
+_MAPS = {}
+
+def _open(symbol, out_dir):
+    """
+    (header, {column: array}) for npy exports, reusing this process's maps
+    until the header file changes (one stat per read), or (header, None).
+    """
+    try:
+        mtime = os.stat(header_path(symbol, out_dir)).st_mtime_ns
+    except FileNotFoundError:
+        return None, None
+    cached = _MAPS.get((out_dir, symbol))
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+    header = read_header(symbol, out_dir)
+    if header is None:
+        return None, None
+    maps = {} if header['format'] == 'npy' else None
+    _MAPS[(out_dir, symbol)] = (mtime, header, maps)
+    return header, maps
+
+def read_arrays(symbol, columns, start=None, end=None, out_dir=COLUMNAR_DIR):
+    """
+    {'day': ..., column: ...} for start <= date <= end ('YYYY-MM-DD' or dates;
+    None = open-ended). For npy exports the arrays are read-only views of the
+    memory-mapped files. Returns None if the symbol hasn't been exported.
+    """
+    header, maps = _open(symbol, out_dir)
+    if header is None:
+        return None
+    missing = [col for col in columns if col not in header['columns']]
+    if missing:
+        raise KeyError(f"{symbol}: no columns {missing} in the export (have {header['columns']})")
+    wanted = ['day'] + [col for col in columns if col != 'day']
+    fmt, files = header['format'], header['files']
+
+    if fmt == 'npy':
+        for col in wanted:
+            if col not in maps:
+                maps[col] = np.load(os.path.join(out_dir, files[col]), mmap_mode='r')
+        lo, hi = _day_range(maps['day'], start, end)
+        return {col: maps[col][lo:hi] for col in wanted}
+
+    if pa is None:
+        raise RuntimeError(f"{symbol} was exported as {fmt}; reading it needs pyarrow")
+    path = os.path.join(out_dir, files['*'])
+    if fmt == 'parquet':
+        filters = []
+        if start is not None:
+            filters.append(('day', '>=', to_day(start)))
+        if end is not None:
+            filters.append(('day', '<=', to_day(end)))
+        table = pq.read_table(path, columns=wanted, filters=filters or None, memory_map=True)
+    else:
+        with pa.memory_map(path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        lo, hi = _day_range(table.column('day').to_numpy(), start, end)
+        table = table.slice(lo, hi - lo).select(wanted)
+    return {col: table.column(col).to_numpy() for col in wanted}
+
+def read(symbol, columns, start=None, end=None, out_dir=COLUMNAR_DIR):
+    """DataFrame with 'date' ('YYYY-MM-DD') and 'columns' for one symbol (empty if not exported)."""
+    arrays = read_arrays(symbol, columns, start, end, out_dir)
+    if arrays is None:
+        return pd.DataFrame(columns=['date'] + list(columns))
+    df = pd.DataFrame({col: arrays[col] for col in columns})
+    df.insert(0, 'date', [from_day(day) for day in arrays['day']])
+    return df
+
+def read_many(symbols, columns, start=None, end=None, out_dir=COLUMNAR_DIR):
+    """Long DataFrame (symbol, day, columns...) for every exported symbol in 'symbols'."""
+    names, parts = [], []
+    for symbol in symbols:
+        arrays = read_arrays(symbol, columns, start, end, out_dir)
+        if arrays is not None and len(arrays['day']):
+            names.append(symbol)
+            parts.append(arrays)
+    wanted = ['day'] + [col for col in columns if col != 'day']
+    # One concatenate per column; the frame is built once
+    df = pd.DataFrame({col: np.concatenate([part[col] for part in parts]) if parts else []
+                       for col in wanted})
+    df.insert(0, 'symbol', np.repeat(names, [len(part['day']) for part in parts]) if parts else [])
+    return df
+
+def exported_symbols(out_dir=COLUMNAR_DIR):
+    return sorted(os.path.basename(path)[:-5] for path in glob.glob(os.path.join(out_dir, '*.json')))
+
+def connect(db_path=None):
+    conn = sqlite3.connect(db_path or DATABASE_PATH)
+    migrate(conn)
+    market_summary.ensure_summary_tables(conn)
+    return conn
+
+#############################
+# BENCH                     #
+#############################
+
+def benchmark(db_path=None, columns=('close', 'rsi_14', 'ema_21'), repeat=20):
+    """A few columns for the whole universe: read_sql_query vs the columnar files."""
+    import shutil
+    import tempfile
+
+    conn = connect(db_path)
+    symbols = market_summary.read_symbols(conn)
+    columns = list(columns)
+    tmp = tempfile.mkdtemp()
+    try:
+        def timed(label, func, repeat=repeat):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                result = func()
+            print(f"  {label:<40}{(time.perf_counter() - start) * 1000 / repeat:>9.2f} ms")
+            return result
+
+        print(f"{len(symbols)} symbols, columns {columns}, format {DEFAULT_FORMAT}")
+        timed("export (all symbols)", lambda: export(conn, symbols, tmp, force=True), 1)
+        timed("export again (nothing changed)", lambda: export(conn, symbols, tmp), 1)
+
+        placeholders = ', '.join('?' for _ in symbols)
+        expected = timed("SQLite: market_data, universe", lambda: pd.read_sql_query(
+            f"SELECT symbol, day, {', '.join(columns)} FROM market_data WHERE symbol IN ({placeholders}) "
+            f"ORDER BY symbol, day", conn, params=symbols))
+        _MAPS.clear()
+        timed("columnar: read_many, universe (cold)", lambda: read_many(sorted(symbols), columns, out_dir=tmp), 1)
+        got = timed("columnar: read_many, universe", lambda: read_many(sorted(symbols), columns, out_dir=tmp))
+        assert np.allclose(got[columns].to_numpy(), expected[columns].to_numpy(dtype='float64'), equal_nan=True)
+
+        last = expected['day'].max()
+        since = from_day(last - 90)
+        timed("SQLite: last 90 days, universe", lambda: pd.read_sql_query(
+            f"SELECT symbol, day, {', '.join(columns)} FROM market_data WHERE symbol IN ({placeholders}) "
+            f"AND day >= ?", conn, params=symbols + [to_day(since)]))
+        timed("columnar: last 90 days, universe", lambda: read_many(symbols, columns, start=since, out_dir=tmp))
+        print(f"  {len(got)} rows; columnar matches SQLite")
+    finally:
+        shutil.rmtree(tmp)
+        conn.close()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'export':
+        conn = connect()
+        export(conn, [arg for arg in sys.argv[2:] if arg != '--force'] or None, force='--force' in sys.argv)
+        conn.close()
+    elif command == 'bench':
+        benchmark()
+    else:
+        print("usage: python columnar_store.py export [SYMBOLS...] [--force] | bench")
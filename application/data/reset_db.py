@@ -1,45 +1,26 @@
 import sqlite3
 import os
+import sys
+
+# The schema itself lives in application/schema.py (versioned migrations)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import schema
 
 # Resolve database path dynamically
 DB_FILE = os.path.join(os.path.dirname(__file__), "historical_data.db")
-TABLE_NAME = "market_data"
-
-# SQL schema for the new table
-TABLE_SCHEMA = f"""
-CREATE TABLE {TABLE_NAME} (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    symbol TEXT NOT NULL,
-    date TEXT NOT NULL,
-    open REAL,
-    high REAL,
-    low REAL,
-    close REAL,
-    volume INTEGER,
-    ma_50 REAL,  -- 50-day moving average
-    ma_200 REAL, -- 200-day moving average
-    rsi_14 REAL, -- RSI (14-period)
-    macd REAL,   -- MACD
-    signal REAL  -- MACD signal line
-);
-"""
 
-def reset_table():
+def reset_database():
     conn = None
     try:
         # Connect to the database
         conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-
-        # Drop the table if it exists
-        cursor.execute(f"DROP TABLE IF EXISTS {TABLE_NAME};")
 
-        # Create a new table
-        cursor.execute(TABLE_SCHEMA)
+        # Drop market data (bars, indicators, legacy market_data) and everything derived from it
+        schema.drop_all(conn)
 
-        # Commit the changes
-        conn.commit()
-        print(f"Table '{TABLE_NAME}' has been reset successfully.")
+        # Recreate the current schema from the migrations
+        schema.migrate(conn)
+        print(f"Database has been reset to schema version {schema.schema_version(conn)}.")
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
     finally:
@@ -47,4 +28,4 @@ def reset_table():
             conn.close()
 
 if __name__ == "__main__":
-    reset_table()
+    reset_database()
@@ -0,0 +1,291 @@
+"""
+features.py
+-----------
+The KNN feature matrix, built in one place for training, serving and backtests.
+
+A symbol's features are FEATURE_COLS for every day that has both a bar and an
+indicator row, as a float32 matrix (missing indicator values -> 0) plus the
+matching epoch days (schema.py). Matrices are cached on disk, one file per
+symbol and feature spec:
+
+  data/feature_cache/{symbol}.{spec_hash}.npz    days, X, meta
+
+spec_hash is a hash of FEATURE_SPEC, so changing the columns or the fill
+value starts new files instead of serving stale ones. The meta records the
+last day in the file and the symbol_summary revision it was built at:
+
+  revision unchanged               the file is current; no market data is read
+  revision moved, no rewrite       new days are appended (one range scan of
+                                   day > last day) and the file is replaced
+  history rewritten / no file      full rebuild from SQLite
+
+A write that overwrites existing indicator days (a full recompute) bumps the
+symbol's rewrite counter (market_summary.rewrites), which forces the rebuild.
+
+preload() additionally keeps matrices resident in the process, checked
+against the same revision before the file is read. The web app calls it
+before gunicorn forks, so every worker shares one copy of the arrays.
+
+  python features.py build [SYMBOLS...]   build or extend the cache
+  python features.py bench                rebuild vs cached vs append timings
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import market_summary
+from schema import migrate
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_PATH = os.path.join(BASE_DIR, 'data', 'historical_data.db')
+CACHE_DIR = os.path.join(BASE_DIR, 'data', 'feature_cache')
+
+# Columns the KNN models are trained on (see train_knn.py)
+FEATURE_COLS = [
+    'close', 'volume',
+    'ema_8', 'ema_13', 'ema_21', 'ema_34', 'ema_55', 'ema_89', 'ema_144', 'ema_200',
+    'rsi_14', 'macd', 'macd_signal'
+]
+
+FEATURE_SPEC = {
+    'columns': FEATURE_COLS,
+    'fill': 0.0,
+    'dtype': 'float32',
+    'rows': 'bars JOIN indicators',
+}
+
+SPEC_HASH = hashlib.sha1(json.dumps(FEATURE_SPEC, sort_keys=True).encode()).hexdigest()[:12]
+
+class FeatureMatrix:
+    """days (int64 epoch days, ascending) and X (float32, one row per day, FEATURE_COLS)."""
+
+    def __init__(self, symbol, days, X):
+        self.symbol = symbol
+        self.days = days
+        self.X = X
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def last_day(self):
+        return int(self.days[-1]) if len(self.days) else None
+
+    @property
+    def dates(self):
+        """'YYYY-MM-DD' strings for each row."""
+        return np.datetime_as_string(self.days.astype('datetime64[D]')).tolist()
+
+    def after(self, day):
+        """The rows with day > 'day' (all rows for None)."""
+        if day is None:
+            return self
+        start = int(np.searchsorted(self.days, day, side='right'))
+        return FeatureMatrix(self.symbol, self.days[start:], self.X[start:])
+
+    def column(self, name):
+        return self.X[:, FEATURE_COLS.index(name)]
+
+    def frame(self):
+        """DataFrame with a datetime 'date' column followed by FEATURE_COLS."""
+        df = pd.DataFrame(self.X, columns=FEATURE_COLS)
+        df.insert(0, 'date', self.days.astype('datetime64[D]').astype('datetime64[ns]'))
+        return df
+
+def empty(symbol):
+    return FeatureMatrix(symbol, np.empty(0, dtype='int64'), np.empty((0, len(FEATURE_COLS)), dtype='float32'))
+
+def read_rows(conn, symbol, after_day=None):
+    """(days, X) straight from SQLite for 'symbol', optionally only days > after_day."""
+    rows = conn.execute(f"""
+        SELECT b.day, {', '.join(('b.' if col in ('close', 'volume') else 'i.') + col for col in FEATURE_COLS)}
+        FROM bars AS b
+        JOIN indicators AS i ON i.symbol = b.symbol AND i.day = b.day
+        WHERE b.symbol = ? AND b.day > ?
+        ORDER BY b.day ASC
+    """, (symbol, -1 if after_day is None else after_day)).fetchall()
+    if not rows:
+        return np.empty(0, dtype='int64'), np.empty((0, len(FEATURE_COLS)), dtype='float32')
+
+    # None (NULL) -> NaN -> fill value
+    data = np.array(rows, dtype='float64')
+    X = np.nan_to_num(data[:, 1:], nan=FEATURE_SPEC['fill']).astype('float32')
+    return data[:, 0].astype('int64'), X
+
+#############################
+# CACHE FILES               #
+#############################
+
+def cache_path(symbol, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"{symbol}.{SPEC_HASH}.npz")
+
+def read_cache(symbol, cache_dir=CACHE_DIR):
+    """(meta, FeatureMatrix) from the cache file, or (None, None)."""
+    path = cache_path(symbol, cache_dir)
+    try:
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            matrix = FeatureMatrix(symbol, data['days'], data['X'])
+    except (OSError, ValueError, KeyError):
+        return None, None
+    if meta.get('spec') != SPEC_HASH:
+        return None, None
+    return meta, matrix
+
+def write_cache(matrix, revision, rewrites, cache_dir=CACHE_DIR):
+    """Replace the symbol's cache file atomically. Returns the meta, or None if it couldn't be written."""
+    meta = {
+        'symbol': matrix.symbol,
+        'spec': SPEC_HASH,
+        'columns': FEATURE_COLS,
+        'rows': len(matrix),
+        'last_day': matrix.last_day,
+        'revision': revision,
+        'rewrites': rewrites,
+    }
+    path = cache_path(matrix.symbol, cache_dir)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp, 'wb') as cache_file:
+            np.savez(cache_file, days=matrix.days, X=matrix.X, meta=np.array(json.dumps(meta)))
+        os.replace(tmp, path)
+    except OSError as e:
+        # A read-only deployment still gets features, just without the cache
+        print(f"{matrix.symbol}: feature cache not written: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+    return meta
+
+#############################
+# LOADING                   #
+#############################
+
+# {(cache_dir, symbol): (revision, FeatureMatrix)}, filled by preload()
+_RESIDENT = {}
+
+def load_features(conn, symbol, cache_dir=CACHE_DIR):
+    """
+    The FeatureMatrix for 'symbol', from the cache when it is current, extended
+    with new days when only appends happened since, rebuilt otherwise.
+    Needs the summary tables (market_summary.ensure_summary_tables).
+    """
+    summary = market_summary.read_summary(conn, symbol)
+    if summary is None:
+        return empty(symbol)
+    revision = summary['revision']
+
+    resident = _RESIDENT.get((cache_dir, symbol))
+    if resident is not None and resident[0] == revision:
+        return resident[1]
+
+    meta, matrix = read_cache(symbol, cache_dir)
+    if meta is not None and meta['revision'] == revision:
+        if resident is not None:
+            _RESIDENT[(cache_dir, symbol)] = (revision, matrix)
+        return matrix
+
+    rewrites = market_summary.rewrites(conn, symbol)
+    if meta is not None and meta['rewrites'] == rewrites:
+        days, X = read_rows(conn, symbol, after_day=meta['last_day'])
+        if len(days):
+            matrix = FeatureMatrix(symbol, np.concatenate([matrix.days, days]), np.concatenate([matrix.X, X]))
+    else:
+        matrix = FeatureMatrix(symbol, *read_rows(conn, symbol))
+
+    write_cache(matrix, revision, rewrites, cache_dir)
+    if resident is not None:
+        _RESIDENT[(cache_dir, symbol)] = (revision, matrix)
+    return matrix
+
+def load_many(conn, symbols, cache_dir=CACHE_DIR):
+    """{symbol: FeatureMatrix} for every symbol with at least one row."""
+    matrices = {}
+    for symbol in symbols:
+        matrix = load_features(conn, symbol, cache_dir)
+        if len(matrix):
+            matrices[symbol] = matrix
+    return matrices
+
+def preload(conn, symbols, cache_dir=CACHE_DIR):
+    """
+    Load 'symbols' and keep their matrices in memory for later load_features
+    calls (replaced when the symbol's revision moves). Returns {symbol: FeatureMatrix}.
+    """
+    matrices = {}
+    for symbol in symbols:
+        # Revision first: a write landing in between leaves the entry stale, not wrong
+        summary = market_summary.read_summary(conn, symbol)
+        matrix = load_features(conn, symbol, cache_dir)
+        if summary is not None and len(matrix):
+            _RESIDENT[(cache_dir, symbol)] = (summary['revision'], matrix)
+            matrices[symbol] = matrix
+    return matrices
+
+def connect(db_path=None):
+    """A writable connection with the schema migrated and the summary tables in place."""
+    conn = sqlite3.connect(db_path or DATABASE_PATH)
+    migrate(conn)
+    market_summary.ensure_summary_tables(conn)
+    return conn
+
+def benchmark(db_path=None):
+    """Full rebuild vs cache hit vs append-one-day for every symbol in the database."""
+    import shutil
+    import tempfile
+
+    conn = connect(db_path)
+    symbols = market_summary.read_symbols(conn)
+    tmp = tempfile.mkdtemp()
+    try:
+        def timed(label, func):
+            start = time.perf_counter()
+            for symbol in symbols:
+                func(symbol)
+            ms = (time.perf_counter() - start) * 1000 / max(len(symbols), 1)
+            print(f"{label:<28} {ms:8.3f} ms/symbol")
+
+        timed("SELECT + fillna (old)", lambda s: pd.read_sql_query(
+            f"SELECT date, {', '.join(FEATURE_COLS)} FROM market_data WHERE symbol = ? ORDER BY day",
+            conn, params=(s,))[FEATURE_COLS].fillna(0))
+        timed("rebuild (cold cache)", lambda s: load_features(conn, s, tmp))
+        timed("cache hit", lambda s: load_features(conn, s, tmp))
+
+        # Pretend each file is a day behind and its revision is stale: the append path
+        for symbol in symbols:
+            meta, matrix = read_cache(symbol, tmp)
+            write_cache(FeatureMatrix(symbol, matrix.days[:-1], matrix.X[:-1]), -1, meta['rewrites'], tmp)
+        timed("append one day", lambda s: load_features(conn, s, tmp))
+
+        for symbol in symbols:
+            cached = load_features(conn, symbol, tmp)
+            days, X = read_rows(conn, symbol)
+            assert np.array_equal(cached.days, days) and np.array_equal(cached.X, X), symbol
+        print(f"{len(symbols)} symbols, spec {SPEC_HASH}: cached matrices match a rebuild")
+    finally:
+        shutil.rmtree(tmp)
+        conn.close()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'build':
+        conn = connect()
+        symbols = sys.argv[2:] or market_summary.read_symbols(conn)
+        start = time.perf_counter()
+        matrices = load_many(conn, symbols)
+        conn.close()
+        rows = sum(len(m) for m in matrices.values())
+        print(f"{len(matrices)} symbols, {rows} rows in {time.perf_counter() - start:.3f}s "
+              f"(spec {SPEC_HASH}, {CACHE_DIR})")
+    elif command == 'bench':
+        benchmark()
+    else:
+        print("usage: python features.py build [SYMBOLS...] | bench")
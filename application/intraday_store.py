@@ -0,0 +1,468 @@
+"""
+intraday_store.py
+-----------------
+Intraday bars (1m / 5m / 15m / 30m / 1h) in files partitioned by interval,
+symbol and month:
+
+  data/intraday/{interval}/{SYMBOL}/{YYYY-MM}.npz   ts, open, high, low, close, volume
+
+'ts' is the bar's start in epoch seconds (UTC); months are New York calendar
+months, so a session never straddles two files. A range read opens only the
+months it overlaps and slices them with searchsorted, so the cost is set by
+the bars asked for, not by how many symbols or years are stored. Daily bars
+stay in SQLite (bars / market_data, schema.py).
+
+Coarser intervals are resampled on the fly, month by month, from the
+coarsest stored interval that divides them (1m -> 5m / 1h / 1d, ...), so a
+month already rolled up by compact() reads its 5m bars while a recent one
+resamples 1m. Buckets are anchored at the 09:30 New York open, so hourly
+bars are 09:30-10:30, ... like the exchange's. '1d' buckets are New York
+calendar dates. The resampling is vectorized (np.maximum.reduceat etc.
+over bucket boundaries).
+
+Retention: compact() rolls fine bars past their RETENTION_MONTHS into the
+next interval up (1m -> 5m -> 1h) and deletes the fine partitions, so
+minute data for hundreds of tickers doesn't grow without bound.
+
+  python intraday_store.py read SYMBOL INTERVAL [START [END]]   print bars (resampled if needed)
+  python intraday_store.py compact                            apply the retention policy
+  python intraday_store.py status                             partitions and bars per interval
+  python intraday_store.py bench                              partitions vs one SQLite table
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INTRADAY_DIR = os.path.join(BASE_DIR, 'data', 'intraday')
+
+MARKET_TZ = 'America/New_York'
+SESSION_OPEN_SECONDS = 9 * 3600 + 30 * 60  # 09:30 local
+
+INTERVAL_SECONDS = {'1m': 60, '5m': 300, '15m': 900, '30m': 1800, '1h': 3600, '1d': 86400}
+STORED_INTERVALS = ['1m', '5m', '15m', '30m', '1h']
+
+# Months of bars kept per stored interval; older ones are rolled up into the
+# target interval (None = dropped) by compact()
+RETENTION_MONTHS = {'1m': 1, '5m': 12, '15m': 12, '30m': 24, '1h': 60}
+ROLLUP = {'1m': '5m', '5m': '1h', '15m': '1h', '30m': '1h', '1h': None}
+
+FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+class Bars:
+    """Sorted, de-duplicated bars of one symbol and interval."""
+
+    __slots__ = ('symbol', 'interval', 'ts', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, symbol, interval, ts, open, high, low, close, volume):
+        self.symbol = symbol
+        self.interval = interval
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.float64)
+
+    @classmethod
+    def empty(cls, symbol, interval):
+        return cls(symbol, interval, *([[]] * 6))
+
+    def __len__(self):
+        return len(self.ts)
+
+    def arrays(self):
+        return {'ts': self.ts, **{field: getattr(self, field) for field in FIELDS}}
+
+    def take(self, index):
+        return Bars(self.symbol, self.interval, *(values[index] for values in self.arrays().values()))
+
+    def between(self, start=None, end=None):
+        """Bars with start <= ts < end (epoch seconds; None = open-ended)."""
+        lo = 0 if start is None else np.searchsorted(self.ts, start, side='left')
+        hi = len(self) if end is None else np.searchsorted(self.ts, end, side='left')
+        return self.take(slice(lo, hi))
+
+    def local_times(self):
+        """Bar starts as New York wall-clock datetime64[s]."""
+        return local_seconds(self.ts).astype('datetime64[s]')
+
+    def dates(self):
+        """'YYYY-MM-DD HH:MM' New York time per bar."""
+        return pd.DatetimeIndex(self.local_times()).strftime('%Y-%m-%d %H:%M').tolist()
+
+    def frame(self):
+        df = pd.DataFrame({field: getattr(self, field) for field in FIELDS})
+        df.insert(0, 'date', self.local_times())
+        return df
+
+def concat(bars_list, symbol, interval):
+    """Merge bars (later ones win on equal ts) into one sorted Bars."""
+    bars_list = [bars for bars in bars_list if len(bars)]
+    if not bars_list:
+        return Bars.empty(symbol, interval)
+    merged = {key: np.concatenate([bars.arrays()[key] for bars in bars_list]) for key in ['ts'] + FIELDS}
+    # Last occurrence of each ts: stable sort, then keep the final row of each run
+    order = np.argsort(merged['ts'], kind='stable')
+    ts = merged['ts'][order]
+    keep = np.append(ts[1:] != ts[:-1], True)
+    return Bars(symbol, interval, *(merged[key][order][keep] for key in ['ts'] + FIELDS))
+
+#############################
+# TIME                      #
+#############################
+
+def local_seconds(ts):
+    """UTC epoch seconds -> New York wall-clock seconds (same scale, DST applied)."""
+    if len(ts) == 0:
+        return np.asarray(ts, dtype=np.int64)
+    utc = pd.DatetimeIndex(np.asarray(ts, dtype='datetime64[s]'), tz='UTC')
+    return utc.tz_convert(MARKET_TZ).tz_localize(None).as_unit('s').asi8
+
+def to_epoch(value):
+    """'YYYY-MM-DD[ HH:MM]' (New York time), datetime or epoch seconds -> epoch seconds."""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize(MARKET_TZ)
+    return int(stamp.tz_convert('UTC').timestamp())
+
+def month_keys(ts):
+    """'YYYY-MM' (New York month) per bar."""
+    return local_seconds(ts).astype('datetime64[s]').astype('datetime64[M]').astype(str)
+
+#############################
+# RESAMPLING                #
+#############################
+
+def bucket_starts(ts, seconds):
+    """
+    Start (UTC epoch seconds) of the 'seconds'-wide bucket each bar falls in:
+    New York dates for a day, else steps from that day's 09:30 open.
+    """
+    local = local_seconds(ts)
+    offset = local - ts
+    midnight = local - local % 86400
+    if seconds >= 86400:
+        return midnight - offset
+    anchor = midnight + SESSION_OPEN_SECONDS
+    return anchor + (local - anchor) // seconds * seconds - offset
+
+def resample(bars, interval):
+    """Aggregate sorted 'bars' into 'interval' bars (OHLC first/max/min/last, volume sum)."""
+    if len(bars) == 0:
+        return Bars.empty(bars.symbol, interval)
+    buckets = bucket_starts(bars.ts, INTERVAL_SECONDS[interval])
+    first = np.flatnonzero(np.append(True, buckets[1:] != buckets[:-1]))
+    last = np.append(first[1:] - 1, len(bars) - 1)
+    return Bars(bars.symbol, interval, buckets[first],
+                bars.open[first],
+                np.maximum.reduceat(bars.high, first),
+                np.minimum.reduceat(bars.low, first),
+                bars.close[last],
+                np.add.reduceat(bars.volume, first))
+
+def month_sources(root, symbol, interval):
+    """
+    {'YYYY-MM': stored interval} to answer 'interval' from, month by month:
+    the coarsest stored interval that divides it. compact() rolls only old
+    months up, so e.g. 5m reads old months from the rolled-up 5m partitions
+    and recent ones from 1m.
+    """
+    width = INTERVAL_SECONDS[interval]
+    sources = {}
+    for stored in STORED_INTERVALS:  # finest first, so coarser ones win
+        if width % INTERVAL_SECONDS[stored] == 0:
+            for month in partitions(root, stored, symbol):
+                sources[month] = stored
+    return sources
+
+#############################
+# PARTITIONS                #
+#############################
+
+def partition_dir(root, interval, symbol):
+    return os.path.join(root, interval, symbol)
+
+def partition_path(root, interval, symbol, month):
+    return os.path.join(partition_dir(root, interval, symbol), f"{month}.npz")
+
+def partitions(root, interval, symbol):
+    """Sorted 'YYYY-MM' months stored for (interval, symbol)."""
+    try:
+        names = os.listdir(partition_dir(root, interval, symbol))
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-4] for name in names if name.endswith('.npz'))
+
+def read_partition(root, interval, symbol, month):
+    path = partition_path(root, interval, symbol, month)
+    try:
+        with np.load(path) as data:
+            return Bars(symbol, interval, data['ts'], *(data[field] for field in FIELDS))
+    except FileNotFoundError:
+        return Bars.empty(symbol, interval)
+
+def write_partition(root, bars, month):
+    """Replace one month file atomically (temp file + os.replace)."""
+    path = partition_path(root, bars.interval, bars.symbol, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as partition_file:
+            np.savez(partition_file, **bars.arrays())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def write_bars(bars, root=INTRADAY_DIR):
+    """
+    Merge 'bars' into their month partitions (re-sent bars replace stored
+    ones). Returns the number of bars that weren't stored before.
+    """
+    if len(bars) == 0:
+        return 0
+    months = month_keys(bars.ts)
+    added = 0
+    for month in np.unique(months):
+        new = bars.take(months == month)
+        stored = read_partition(root, bars.interval, bars.symbol, month)
+        merged = concat([stored, new], bars.symbol, bars.interval)
+        added += len(merged) - len(stored)
+        write_partition(root, merged, month)
+    return added
+
+def months_between(months, start=None, end=None):
+    """The 'YYYY-MM' of 'months' that can hold bars with start <= ts < end."""
+    if start is not None:
+        first = str(month_keys(np.array([start]))[0])
+        months = [month for month in months if month >= first]
+    if end is not None:
+        last = str(month_keys(np.array([end - 1]))[0])
+        months = [month for month in months if month <= last]
+    return months
+
+def read_bars(symbol, interval, start=None, end=None, limit=None, root=INTRADAY_DIR):
+    """
+    'symbol's bars at 'interval' with start <= bar start < end ('YYYY-MM-DD[ HH:MM]'
+    New York time, datetimes or epoch seconds), only the newest 'limit' if
+    given. Each month comes from month_sources(), resampled when its stored
+    interval is finer than 'interval'. Empty if nothing can serve it.
+    """
+    if interval not in INTERVAL_SECONDS:
+        raise ValueError(f"Unknown interval {interval!r}; expected one of {', '.join(INTERVAL_SECONDS)}")
+    start, end = to_epoch(start), to_epoch(end)
+    sources = month_sources(root, symbol, interval)
+    # Widen to whole buckets so the first resampled bar isn't partial
+    lo = start
+    if start is not None:
+        lo = int(bucket_starts(np.array([start]), INTERVAL_SECONDS[interval])[0])
+
+    # Buckets never cross a New York month, so each month resamples on its own
+    # and a 'limit' read can stop at the newest months that fill it
+    parts, count = [], 0
+    months = months_between(sorted(sources), lo, end)
+    for month in (reversed(months) if limit else months):
+        stored = sources[month]
+        part = read_partition(root, stored, symbol, month).between(lo, end)
+        if stored != interval:
+            part = resample(part, interval)
+        parts.append(part.between(start, end))
+        count += len(parts[-1])
+        if limit and count >= limit:
+            break
+    bars = concat(parts, symbol, interval)
+    return bars.take(slice(max(len(bars) - limit, 0), None)) if limit else bars
+
+def version(symbol, interval, root=INTRADAY_DIR):
+    """Changes whenever a partition that can serve (symbol, interval) is written or removed (for ETags)."""
+    sources = month_sources(root, symbol, interval)
+    if not sources:
+        return '0'
+    digest = hashlib.sha1()
+    for month, stored in sorted(sources.items()):
+        mtime = os.stat(partition_path(root, stored, symbol, month)).st_mtime_ns
+        digest.update(f"{stored}/{month}/{mtime};".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def from_frame(symbol, interval, df):
+    """Bars from a provider frame (DatetimeIndex, Open/High/Low/Close/Volume; naive = UTC)."""
+    if df is None or df.empty:
+        return Bars.empty(symbol, interval)
+    index = pd.DatetimeIndex(df.index)
+    index = index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+    df = df.rename(columns=str.lower)
+    bars = Bars(symbol, interval, index.as_unit('s').asi8, *(df[field].to_numpy(dtype=np.float64) for field in FIELDS))
+    return concat([bars.take(np.isfinite(bars.close))], symbol, interval)
+
+def last_ts(symbol, interval, root=INTRADAY_DIR):
+    """Start of the newest stored bar, or None."""
+    months = partitions(root, interval, symbol)
+    if not months:
+        return None
+    bars = read_partition(root, interval, symbol, months[-1])
+    return int(bars.ts[-1]) if len(bars) else None
+
+#############################
+# RETENTION                 #
+#############################
+
+def compact(root=INTRADAY_DIR, now=None, retention=None):
+    """
+    Roll partitions older than each interval's retention into ROLLUP's
+    target interval and delete them. Returns {interval: months removed}.
+    """
+    retention = retention or RETENTION_MONTHS
+    now = pd.Timestamp(now or datetime.now(timezone.utc))
+    now = now.tz_convert(MARKET_TZ) if now.tzinfo else now.tz_localize(MARKET_TZ)
+    removed = {}
+    # Finest first, so 1m rolled into 5m can roll on into 1h in the same pass
+    for interval in STORED_INTERVALS:
+        cutoff = (now.tz_localize(None).to_period('M') - retention[interval]).strftime('%Y-%m')
+        try:
+            symbols = sorted(os.listdir(os.path.join(root, interval)))
+        except FileNotFoundError:
+            continue
+        for symbol in symbols:
+            for month in partitions(root, interval, symbol):
+                if month >= cutoff:
+                    continue
+                target = ROLLUP[interval]
+                if target is not None:
+                    write_bars(resample(read_partition(root, interval, symbol, month), target), root)
+                os.remove(partition_path(root, interval, symbol, month))
+                removed[interval] = removed.get(interval, 0) + 1
+            if not os.listdir(partition_dir(root, interval, symbol)):
+                os.rmdir(partition_dir(root, interval, symbol))
+    for interval, count in removed.items():
+        print(f"Compacted {count} {interval} partitions (older than {retention[interval]} months)"
+              f"{' into ' + ROLLUP[interval] if ROLLUP[interval] else ''}")
+    return removed
+
+def status(root=INTRADAY_DIR):
+    for interval in STORED_INTERVALS:
+        try:
+            symbols = sorted(os.listdir(os.path.join(root, interval)))
+        except FileNotFoundError:
+            continue
+        files = [(symbol, month) for symbol in symbols for month in partitions(root, interval, symbol)]
+        if not files:
+            continue
+        size = sum(os.path.getsize(partition_path(root, interval, s, m)) for s, m in files)
+        months = sorted({month for _, month in files})
+        print(f"{interval:>4}: {len({symbol for symbol, _ in files})} symbols, {len(files)} partitions, "
+              f"{size / 1e6:.1f} MB, {months[0]}..{months[-1]}")
+
+#############################
+# BENCH                     #
+#############################
+
+def synthetic_minutes(symbol, months, seed=0):
+    """Regular-session 1m bars for the trading weekdays of 'months' ('YYYY-MM' list)."""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(f"{months[0]}-01", pd.Period(months[-1]).end_time.normalize())
+    opens = days.tz_localize(MARKET_TZ) + pd.Timedelta(minutes=570)
+    ts = opens.as_unit('s').asi8[:, None] + 60 * np.arange(390)[None, :]
+    ts = ts.ravel()
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.0005, len(ts))))
+    open_ = np.append(close[0], close[:-1])
+    spread = np.abs(rng.normal(0, 0.0003, len(ts))) * close
+    return Bars(symbol, '1m', ts, open_, np.maximum(open_, close) + spread,
+                np.minimum(open_, close) - spread, close, rng.integers(100, 10000, len(ts)))
+
+def benchmark(n_symbols=100, months=('2025-01', '2025-02', '2025-03')):
+    import sqlite3
+    import tempfile
+
+    tmp = tempfile.mkdtemp()
+    try:
+        symbols = [f"S{i:03d}" for i in range(n_symbols)]
+        data = {symbol: synthetic_minutes(symbol, list(months), seed=i) for i, symbol in enumerate(symbols)}
+        total = sum(len(bars) for bars in data.values())
+        print(f"{n_symbols} symbols x {len(months)} months of 1m bars = {total:,} bars")
+
+        def timed(label, func, repeat=1):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                result = func()
+            seconds = (time.perf_counter() - start) / repeat
+            print(f"  {label:<44}{seconds * 1000:>10.1f} ms")
+            return result
+
+        root = os.path.join(tmp, 'intraday')
+        timed("write partitions", lambda: [write_bars(bars, root) for bars in data.values()])
+
+        conn = sqlite3.connect(os.path.join(tmp, 'bars.db'))
+        conn.execute("""
+            CREATE TABLE intraday_bars (symbol TEXT, interval TEXT, ts INTEGER,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (symbol, interval, ts)) WITHOUT ROWID
+        """)
+
+        def write_sqlite():
+            with conn:
+                for bars in data.values():
+                    conn.executemany("INSERT INTO intraday_bars VALUES (?, '1m', ?, ?, ?, ?, ?, ?)",
+                                     zip([bars.symbol] * len(bars), bars.ts.tolist(), bars.open.tolist(),
+                                         bars.high.tolist(), bars.low.tolist(), bars.close.tolist(),
+                                         bars.volume.tolist()))
+        timed("write one SQLite table", write_sqlite)
+
+        symbol = symbols[n_symbols // 2]
+        start, end = to_epoch(f"{months[-1]}-03"), to_epoch(f"{months[-1]}-24")
+        got = timed("read 3 weeks of 1m, partitions", lambda: read_bars(symbol, '1m', start, end, root=root), 20)
+
+        def read_sqlite():
+            rows = conn.execute("""
+                SELECT ts, open, high, low, close, volume FROM intraday_bars
+                WHERE symbol = ? AND interval = '1m' AND ts >= ? AND ts < ? ORDER BY ts
+            """, (symbol, start, end)).fetchall()
+            return Bars(symbol, '1m', *np.array(rows).T)
+        expected = timed("read 3 weeks of 1m, SQLite", read_sqlite, 20)
+        assert np.array_equal(got.ts, expected.ts) and np.allclose(got.close, expected.close)
+
+        hourly = timed("read 3 weeks as 1h (resampled)", lambda: read_bars(symbol, '1h', start, end, root=root), 20)
+        daily = read_bars(symbol, '1d', start, end, root=root)
+        latest = timed("newest 500 5m bars (limit)", lambda: read_bars(symbol, '5m', limit=500, root=root), 20)
+        assert len(latest) == 500 and latest.ts[-1] == resample(data[symbol], '5m').ts[-1]
+        assert hourly.volume.sum() == got.volume.sum() == daily.volume.sum()
+        print(f"  {len(got)} 1m bars -> {len(hourly)} 1h bars -> {len(daily)} 1d bars; "
+              f"first hour {hourly.frame()['date'].iloc[0]}")
+
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(root) for f in fs)
+        conn.close()
+        print(f"  on disk: partitions {size / 1e6:.1f} MB, SQLite {os.path.getsize(os.path.join(tmp, 'bars.db')) / 1e6:.1f} MB")
+
+        # Compact mid-way through the last month: older months move to 5m, the
+        # recent ones stay 1m, and reads must stitch both without losing bars
+        before = {interval: read_bars(symbol, interval, root=root) for interval in ('5m', '1h', '1d')}
+        timed("compact (1m past retention -> 5m)", lambda: compact(root, now=f"{months[-1]}-15"))
+        status(root)
+        for interval, expected in before.items():
+            after = timed(f"read all {interval} after compact", lambda: read_bars(symbol, interval, root=root))
+            assert np.array_equal(after.ts, expected.ts) and after.volume.sum() == expected.volume.sum()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'read' and len(sys.argv) > 3:
+        bars = read_bars(sys.argv[2], sys.argv[3], *sys.argv[4:6])
+        print(bars.frame().to_string(index=False))
+    elif command == 'compact':
+        compact()
+    elif command == 'status':
+        status()
+    elif command == 'bench':
+        benchmark()
+    else:
+        print("usage: python intraday_store.py read SYMBOL INTERVAL [START [END]] | compact | status | bench")
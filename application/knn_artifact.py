@@ -0,0 +1,323 @@
+"""
+knn_artifact.py
+---------------
+On-disk KNN model format and a NumPy predictor for it.
+
+A fitted KNN is just its (scaled) training matrix, the labels and a few
+parameters, so instead of pickling the sklearn estimator (which also
+carries a KD-tree copy of the data and needs sklearn imported to load),
+a model is stored as:
+
+  models/{symbol}_knn.json              metadata: features, scaler params,
+                                        k, metric, classes, training date
+                                        range, metrics, file names
+  models/{symbol}_knn.{version}.X.npy   training matrix (already scaled)
+  models/{symbol}_knn.{version}.y.npy   class index per training row
+
+The .npy files are opened with mmap_mode='r': loading a model reads only
+the small JSON header, the matrix pages are shared by every process that
+maps the same file (gunicorn workers), and the OS loads them on first use.
+The JSON file is written last with an atomic rename, so a reader never
+sees a half-written model; older .npy files are removed afterwards (a
+process still mapping them keeps its view until it reloads).
+
+`python knn_artifact.py convert` rewrites the legacy *_knn.pkl models as
+artifacts; `python knn_artifact.py bench` compares the two formats.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+FORMAT = 'knn-npy-1'
+
+# Elements per (rows x train x features) difference block in predict()
+PREDICT_BLOCK = 4_000_000
+
+class KNNArtifact:
+    """Brute-force KNN over a memory-mapped training matrix (predict() like sklearn's)."""
+
+    def __init__(self, meta, X, y):
+        self.meta = meta
+        self.version = meta['version']
+        self.features = meta['features']
+        self.k = meta['k']
+        self.metric = meta['metric']
+        self.weights = meta.get('weights', 'uniform')
+        self.classes = np.asarray(meta['classes'])
+        self.X = X
+        self.y = y
+        scaler = meta.get('scaler') or {}
+        self._shift = np.asarray(scaler['shift'], dtype=float) if scaler else None
+        self._scale = np.asarray(scaler['scale'], dtype=float) if scaler else None
+
+    @property
+    def nbytes(self):
+        return self.X.nbytes + self.y.nbytes
+
+    def transform(self, X):
+        """Apply the stored scaler: (X - shift) * scale."""
+        X = np.asarray(X, dtype=float)
+        if self._shift is not None:
+            X = (X - self._shift) * self._scale
+        return X
+
+    def kneighbors(self, X):
+        """(distances, indices) of the k nearest training rows for each row of X."""
+        X = self.transform(X)
+        k = min(self.k, len(self.X))
+        all_dist = np.empty((len(X), k))
+        all_ind = np.empty((len(X), k), dtype=np.int64)
+        chunk = max(1, PREDICT_BLOCK // max(self.X.size, 1))
+        for lo in range(0, len(X), chunk):
+            block = X[lo:lo + chunk]
+            dist = self._distances(block)
+            ind = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            part = np.take_along_axis(dist, ind, axis=1)
+            order = np.argsort(part, axis=1, kind='stable')
+            all_ind[lo:lo + len(block)] = np.take_along_axis(ind, order, axis=1)
+            all_dist[lo:lo + len(block)] = np.take_along_axis(part, order, axis=1)
+        if self.metric == 'euclidean':
+            all_dist = np.sqrt(all_dist)
+        return all_dist, all_ind
+
+    def _distances(self, block):
+        # Explicit differences rather than the |a|^2 - 2ab + |b|^2 expansion: unscaled
+        # features (volume ~1e7) would lose the small ones to cancellation
+        diff = block[:, None, :] - self.X[None, :, :]
+        if self.metric == 'euclidean':
+            return np.einsum('ijk,ijk->ij', diff, diff)  # squared; sqrt only on the k kept
+        if self.metric == 'manhattan':
+            return np.abs(diff).sum(axis=2)
+        raise ValueError(f"Unsupported metric: {self.metric}")
+
+    def predict(self, X):
+        """Majority (or distance-weighted) vote; ties go to the smallest class, as in sklearn."""
+        if len(X) == 0:
+            return self.classes[:0]
+        return self.vote(*self.kneighbors(X))
+
+    def vote(self, dist, ind):
+        """Class per row from the (distances, indices) of its neighbours."""
+        votes = np.zeros((len(ind), len(self.classes)))
+        weight = neighbor_weights(dist, self.weights)
+        np.add.at(votes, (np.arange(len(ind))[:, None], self.y[ind]), weight)
+        return self.classes[votes.argmax(axis=1)]
+
+def neighbor_weights(dist, weights='uniform'):
+    """Vote weight of each neighbour: 1, or 1/distance for weights='distance'."""
+    if weights != 'distance':
+        return np.ones(dist.shape)
+    with np.errstate(divide='ignore'):
+        weight = 1.0 / dist
+    # Exact matches win outright
+    exact = np.isinf(weight).any(axis=1)
+    weight[exact] = np.isinf(weight[exact]).astype(float)
+    return weight
+
+#############################
+# READ / WRITE              #
+#############################
+
+def meta_path(model_dir, symbol):
+    return os.path.join(model_dir, f"{symbol}_knn.json")
+
+def exists(model_dir, symbol):
+    return os.path.exists(meta_path(model_dir, symbol))
+
+def load(model_dir, symbol, mmap=True):
+    """Open models/{symbol}_knn.json and map its arrays. Returns a KNNArtifact or None."""
+    path = meta_path(model_dir, symbol)
+    try:
+        with open(path, 'r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+    except FileNotFoundError:
+        return None
+    if meta.get('format') != FORMAT:
+        raise ValueError(f"{path}: unknown model format {meta.get('format')!r}")
+    mode = 'r' if mmap else None
+    X = np.load(os.path.join(model_dir, meta['matrix']), mmap_mode=mode)
+    y = np.load(os.path.join(model_dir, meta['labels']), mmap_mode=mode)
+    return KNNArtifact(meta, X, y)
+
+def artifact_files(model_dir, symbol):
+    """Every file belonging to 'symbol's artifact (any version), JSON header first."""
+    prefix = f"{symbol}_knn."
+    files = [name for name in os.listdir(model_dir)
+             if name.startswith(prefix) and name.endswith('.npy')]
+    return [f"{symbol}_knn.json"] + sorted(files)
+
+def save(model_dir, symbol, X, y, classes, features, k, metric='euclidean', weights='uniform',
+         scaler=None, train_range=None, metrics=None, extra=None):
+    """
+    Write an artifact. X is the training matrix *after* scaling, y the class
+    index (into 'classes') of each row, scaler None or {'kind', 'shift', 'scale'}.
+    'extra' is merged into the metadata (model-specific parameters).
+    Returns the metadata dict (including 'version').
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.int8 if len(classes) < 128 else np.int32)
+    meta = {
+        'format': FORMAT,
+        'symbol': symbol,
+        'features': list(features),
+        'scaler': scaler,
+        'k': int(k),
+        'metric': metric,
+        'weights': weights,
+        'classes': [int(c) for c in classes],
+        'train': train_range or {},
+        'rows': int(len(X)),
+        **(extra or {}),
+    }
+
+    # Content hash: changes whenever the data or any parameter changes
+    digest = hashlib.sha1(json.dumps(meta, sort_keys=True).encode('utf-8'))
+    digest.update(X.tobytes())
+    digest.update(y.tobytes())
+    version = digest.hexdigest()[:16]
+
+    meta['version'] = version
+    meta['matrix'] = f"{symbol}_knn.{version}.X.npy"
+    meta['labels'] = f"{symbol}_knn.{version}.y.npy"
+    meta['metrics'] = metrics or {}
+
+    os.makedirs(model_dir, exist_ok=True)
+    np.save(os.path.join(model_dir, meta['matrix']), X)
+    np.save(os.path.join(model_dir, meta['labels']), y)
+    path = meta_path(model_dir, symbol)
+    with open(path + '.tmp', 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    os.replace(path + '.tmp', path)
+
+    # Drop older versions' arrays and the legacy pickle
+    keep = {meta['matrix'], meta['labels']}
+    for name in artifact_files(model_dir, symbol)[1:]:
+        if name not in keep:
+            os.remove(os.path.join(model_dir, name))
+    legacy = os.path.join(model_dir, f"{symbol}_knn.pkl")
+    if os.path.exists(legacy):
+        os.remove(legacy)
+    return meta
+
+def size_on_disk(model_dir, symbol):
+    return sum(os.path.getsize(os.path.join(model_dir, name)) for name in artifact_files(model_dir, symbol))
+
+#############################
+# SKLEARN INTEROP           #
+#############################
+
+def scaler_params(scaler):
+    """Stored form of a fitted StandardScaler / MinMaxScaler ('passthrough' -> None)."""
+    if scaler is None or scaler == 'passthrough':
+        return None
+    kind = type(scaler).__name__
+    if kind == 'StandardScaler':
+        shift = scaler.mean_ if scaler.with_mean else np.zeros(scaler.n_features_in_)
+        scale = 1.0 / scaler.scale_ if scaler.with_std else np.ones(scaler.n_features_in_)
+        return {'kind': 'standard', 'shift': shift.tolist(), 'scale': scale.tolist()}
+    if kind == 'MinMaxScaler':
+        # sklearn: X * scale_ + min_  ==  (X - (-min_ / scale_)) * scale_
+        return {'kind': 'minmax', 'shift': (-scaler.min_ / scaler.scale_).tolist(),
+                'scale': scaler.scale_.tolist()}
+    raise ValueError(f"Unsupported scaler: {kind}")
+
+def from_sklearn(model):
+    """
+    Pull (X, y, classes, k, metric, weights, scaler) out of a fitted
+    KNeighborsClassifier or Pipeline(scale -> knn).
+    """
+    scaler = None
+    if hasattr(model, 'named_steps'):
+        scaler = scaler_params(model.steps[0][1]) if len(model.steps) > 1 else None
+        model = model.steps[-1][1]
+
+    metric = model.metric
+    if metric == 'minkowski':
+        metric = {1: 'manhattan', 2: 'euclidean'}.get(model.p)
+    if metric not in ('euclidean', 'manhattan'):
+        raise ValueError(f"Unsupported metric: {model.metric} (p={model.p})")
+    return {
+        'X': np.asarray(model._fit_X, dtype=float),
+        'y': np.asarray(model._y),
+        'classes': model.classes_,
+        'k': model.n_neighbors,
+        'metric': metric,
+        'weights': model.weights,
+        'scaler': scaler,
+    }
+
+def convert(model_dir, features):
+    """Rewrite every legacy {symbol}_knn.pkl in model_dir as an artifact."""
+    import pickle
+
+    converted = []
+    for name in sorted(os.listdir(model_dir)):
+        if not name.endswith('_knn.pkl'):
+            continue
+        symbol = name[:-len('_knn.pkl')]
+        with open(os.path.join(model_dir, name), 'rb') as model_file:
+            model = pickle.load(model_file)
+        meta = save(model_dir, symbol, features=features, **from_sklearn(model))
+        print(f"{symbol}: {name} -> {symbol}_knn.json ({meta['rows']} rows, version {meta['version']})")
+        converted.append(symbol)
+    return converted
+
+def benchmark(model_dir, features, rows=250):
+    """Pickle vs artifact: load time, disk size and predictions on random rows."""
+    import pickle
+    import tempfile
+    import shutil
+
+    tmp = tempfile.mkdtemp()
+    try:
+        pickles = {name[:-len('_knn.pkl')]: os.path.join(model_dir, name)
+                   for name in sorted(os.listdir(model_dir)) if name.endswith('_knn.pkl')}
+        for symbol, path in pickles.items():
+            shutil.copy(path, tmp)
+        pickle_bytes = sum(os.path.getsize(p) for p in pickles.values())
+
+        # Unpickling imports sklearn on first use; that is part of a cold start too
+        start = time.perf_counter()
+        models = {}
+        for symbol, path in pickles.items():
+            with open(path, 'rb') as model_file:
+                models[symbol] = pickle.load(model_file)
+        pickle_seconds = time.perf_counter() - start
+
+        convert(tmp, features)
+        artifact_bytes = sum(size_on_disk(tmp, symbol) for symbol in pickles)
+        start = time.perf_counter()
+        artifacts = {symbol: load(tmp, symbol) for symbol in pickles}
+        artifact_seconds = time.perf_counter() - start
+
+        rng = np.random.default_rng(0)
+        agree = total = 0
+        for symbol, model in models.items():
+            X = artifacts[symbol].X
+            sample = X[rng.integers(0, len(X), rows)] * rng.normal(1, 0.02, (rows, X.shape[1]))
+            agree += int((model.predict(sample) == artifacts[symbol].predict(sample)).sum())
+            total += rows
+
+        print(f"{len(pickles)} models")
+        print(f"pickle:   {pickle_bytes / 1024:8.0f} KB  load {pickle_seconds * 1000:8.1f} ms")
+        print(f"artifact: {artifact_bytes / 1024:8.0f} KB  load {artifact_seconds * 1000:8.1f} ms")
+        print(f"predictions agree on {agree}/{total} rows")
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    from features import FEATURE_COLS
+    from signal_store import MODEL_DIR
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'convert':
+        convert(sys.argv[2] if len(sys.argv) > 2 else MODEL_DIR, FEATURE_COLS)
+    elif command == 'bench':
+        benchmark(sys.argv[2] if len(sys.argv) > 2 else MODEL_DIR, FEATURE_COLS)
+    else:
+        print("usage: python knn_artifact.py convert|bench [MODEL_DIR]")
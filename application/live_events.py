@@ -0,0 +1,163 @@
+"""
+live_events.py
+--------------
+Change notifications from the writers to the dashboard's live stream.
+
+Writers and the web server are different processes (the scheduler, the
+pipeline, gunicorn workers), so the pub/sub channel is a table in the same
+database:
+
+  live_events   id (increasing), symbol, kind, first_day, created_at
+
+  kind 'bars'     bars or indicators of 'symbol' were written from first_day on
+  kind 'signals'  KNN predictions of 'symbol' were added from first_day on
+
+publish() runs inside the writer's own transaction, so an event becomes
+visible exactly when the rows it announces do. Events carry no data: the
+stream reads the announced rows from the tables, so a burst of events for a
+symbol collapses into one read of the days it touched.
+
+In the web process one EventHub thread polls the table (an indexed range
+scan of id > last seen, once per POLL_SECONDS) and hands new events to every
+subscribed stream, so the database sees one poll per process however many
+browsers are connected. Events older than RETENTION_SECONDS are pruned by
+the scheduler; a client that reconnects with an older Last-Event-ID simply
+reloads.
+"""
+
+import queue
+import threading
+import time
+
+POLL_SECONDS = 1.0
+RETENTION_SECONDS = 7 * 86400
+
+def ensure_events_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS live_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            first_day INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    conn.commit()
+
+def publish(conn, symbol, kind, first_day):
+    """Record that 'symbol's 'kind' rows changed from 'first_day' on. Does not commit."""
+    conn.execute("INSERT INTO live_events (symbol, kind, first_day, created_at) VALUES (?, ?, ?, ?)",
+                 (symbol, kind, int(first_day), time.time()))
+
+def latest_id(conn):
+    row = conn.execute("SELECT MAX(id) FROM live_events").fetchone()
+    return row[0] or 0
+
+def read_events(conn, after_id, symbols=None, limit=1000):
+    """[(id, symbol, kind, first_day)] newer than 'after_id', oldest first."""
+    query = "SELECT id, symbol, kind, first_day FROM live_events WHERE id > ?"
+    params = [after_id]
+    if symbols:
+        query += f" AND symbol IN ({', '.join('?' for _ in symbols)})"
+        params += list(symbols)
+    return conn.execute(query + " ORDER BY id LIMIT ?", params + [limit]).fetchall()
+
+def read_all_events(conn, after_id, symbols=None, batch=1000):
+    """read_events until exhausted, in batches of 'batch' rows."""
+    events = []
+    while True:
+        chunk = read_events(conn, after_id, symbols, batch)
+        events += chunk
+        if len(chunk) < batch:
+            return events
+        after_id = chunk[-1][0]
+
+def prune(conn, keep_seconds=RETENTION_SECONDS):
+    """Delete events older than 'keep_seconds'. Returns the number removed."""
+    with conn:
+        return conn.execute("DELETE FROM live_events WHERE created_at < ?",
+                            (time.time() - keep_seconds,)).rowcount
+
+def coalesce(events):
+    """{(symbol, kind): earliest first_day} for a batch of events."""
+    changes = {}
+    for _, symbol, kind, first_day in events:
+        key = (symbol, kind)
+        changes[key] = min(first_day, changes.get(key, first_day))
+    return changes
+
+class Subscription:
+    def __init__(self, symbols):
+        self.symbols = set(symbols)
+        self.queue = queue.Queue()
+
+    def get(self, timeout):
+        """The next batch of events for this subscriber, or [] after 'timeout' seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+
+class EventHub:
+    """
+    One polling thread per process fanning live_events out to subscribers.
+    'reader' is a context manager factory yielding a connection (e.g.
+    ConnectionPool.reader); the thread starts with the first subscriber.
+    """
+
+    def __init__(self, reader, poll_seconds=POLL_SECONDS):
+        self.reader = reader
+        self.poll_seconds = poll_seconds
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_id = None
+        self.polls = 0
+
+    def subscribe(self, symbols):
+        """Start receiving events for 'symbols'. Returns (Subscription, id of the last event already published)."""
+        subscription = Subscription(symbols)
+        with self._lock:
+            # Nobody was listening, so nothing was polled: start from now, not
+            # from events the new page has already read from the tables
+            if self.last_id is None or not self._subscribers:
+                with self.reader() as conn:
+                    self.last_id = latest_id(conn)
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='live-events', daemon=True)
+                self._thread.start()
+            return subscription, self.last_id
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "last_id": self.last_id, "polls": self.polls}
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            with self._lock:
+                subscribers = list(self._subscribers)
+                after = self.last_id
+            if not subscribers:
+                continue
+            try:
+                with self.reader() as conn:
+                    events = read_all_events(conn, after)
+            except Exception as e:  # keep the hub alive through a locked/busy database
+                print(f"live events poll failed: {e}")
+                continue
+            self.polls += 1
+            if not events:
+                continue
+            with self._lock:
+                # subscribe() may have moved last_id forward meanwhile
+                self.last_id = max(self.last_id, events[-1][0])
+            for subscription in subscribers:
+                mine = [event for event in events if event[1] in subscription.symbols]
+                if mine:
+                    subscription.queue.put(mine)
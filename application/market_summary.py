@@ -0,0 +1,130 @@
+"""
+market_summary.py
+-----------------
+Small summary tables maintained by the writers so the web API never has to
+scan the bars table (schema.py) for cheap questions.
+
+  symbol_summary  one row per symbol: first/last date, bar count, the latest
+                  bar, and a revision counter bumped on every write to the
+                  symbol (bars or indicators)
+  db_meta         key/value counters; 'bars_generation' is bumped whenever
+                  bars are written, so readers can tell their cached symbol
+                  list is stale with a single primary-key lookup;
+                  'rewrites:{symbol}' is bumped when a write overwrites
+                  existing indicator days (see features.py)
+
+refresh_summary / touch_summary are called by db_writer inside the same
+transaction as the write they describe.
+"""
+
+from schema import from_day
+
+LATEST_BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+def ensure_summary_tables(conn):
+    """Create the summary tables, building them from the bars table the first time."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS symbol_summary (
+            symbol TEXT PRIMARY KEY,
+            first_date TEXT,
+            last_date TEXT,
+            bar_count INTEGER NOT NULL DEFAULT 0,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume INTEGER,
+            revision INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS db_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.commit()
+
+    empty = conn.execute("SELECT 1 FROM symbol_summary LIMIT 1").fetchone() is None
+    if empty and _has_bars(conn):
+        rebuild_summary(conn)
+
+def _has_bars(conn):
+    return conn.execute("""
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bars'
+    """).fetchone() is not None
+
+def rebuild_summary(conn):
+    """Recompute every symbol's row (after a bulk load or a reset)."""
+    with conn:
+        conn.execute("DELETE FROM symbol_summary")
+        symbols = [row[0] for row in conn.execute("SELECT DISTINCT symbol FROM bars")]
+        for symbol in symbols:
+            refresh_summary(conn, symbol)
+    return len(symbols)
+
+def refresh_summary(conn, symbol):
+    """
+    Recompute 'symbol's row from the bars table and bump its revision and the
+    bars generation. Does not commit; call it inside the writer's transaction.
+    """
+    first_day, last_day, bar_count = conn.execute("""
+        SELECT MIN(day), MAX(day), COUNT(*) FROM bars WHERE symbol = ?
+    """, (symbol,)).fetchone()
+
+    if bar_count == 0:
+        conn.execute("DELETE FROM symbol_summary WHERE symbol = ?", (symbol,))
+    else:
+        latest = conn.execute(f"""
+            SELECT {', '.join(LATEST_BAR_COLUMNS)} FROM bars WHERE symbol = ? AND day = ?
+        """, (symbol, last_day)).fetchone()
+        conn.execute("""
+            INSERT INTO symbol_summary (symbol, first_date, last_date, bar_count,
+                                        open, high, low, close, volume, revision)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+            ON CONFLICT(symbol) DO UPDATE SET
+                first_date = excluded.first_date,
+                last_date = excluded.last_date,
+                bar_count = excluded.bar_count,
+                open = excluded.open,
+                high = excluded.high,
+                low = excluded.low,
+                close = excluded.close,
+                volume = excluded.volume,
+                revision = symbol_summary.revision + 1
+        """, (symbol, from_day(first_day), from_day(last_day), bar_count, *latest))
+    _bump(conn, 'bars_generation')
+
+def touch_summary(conn, symbol, rewrite=False):
+    """
+    Bump 'symbol's revision after a write that didn't add bars (indicator updates).
+    rewrite=True means existing days were overwritten, not just appended to.
+    """
+    conn.execute("UPDATE symbol_summary SET revision = revision + 1 WHERE symbol = ?", (symbol,))
+    if rewrite:
+        _bump(conn, f'rewrites:{symbol}')
+
+def _bump(conn, key):
+    conn.execute("""
+        INSERT INTO db_meta (key, value) VALUES (?, 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """, (key,))
+
+def bars_generation(conn):
+    row = conn.execute("SELECT value FROM db_meta WHERE key = 'bars_generation'").fetchone()
+    return row[0] if row else 0
+
+def rewrites(conn, symbol):
+    row = conn.execute("SELECT value FROM db_meta WHERE key = ?", (f'rewrites:{symbol}',)).fetchone()
+    return row[0] if row else 0
+
+def read_symbols(conn):
+    return [row[0] for row in conn.execute("SELECT symbol FROM symbol_summary ORDER BY symbol ASC")]
+
+def read_summary(conn, symbol):
+    """The summary row for 'symbol' as a dict, or None if it has no bars."""
+    cursor = conn.execute("SELECT * FROM symbol_summary WHERE symbol = ?", (symbol,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([col[0] for col in cursor.description], row))
@@ -0,0 +1,219 @@
+"""
+pooled_knn.py
+-------------
+One nearest-neighbour index shared by every ticker.
+
+The per-ticker models each see ~200 rows of their own history in raw price
+units, so they can't learn from each other. The pooled model puts every
+ticker's rows into one index, which needs features that mean the same thing
+for a $20 and a $2000 stock:
+
+  ema_N              ema_N / close - 1
+  macd, macd_signal  divided by close
+  rsi_14             / 100
+  volume             z-score of log(1 + volume) for that ticker
+  close              dropped (the ratios above carry it)
+
+The normalized rows are then standardized across the pool and stored as a
+knn_artifact ('pooled_knn.json' + mmap'd arrays). Queries go through a
+scipy cKDTree built over the mapped matrix when the model is loaded;
+eps > 0 makes the search (1 + eps)-approximate, which prunes more of the tree.
+
+  python pooled_knn.py build          train on everything in market_data
+  python pooled_knn.py bench          accuracy + latency vs the per-ticker KNNs
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+import features
+import knn_artifact
+from features import FEATURE_COLS
+from schema import to_day
+from signal_store import MODEL_DIR
+
+DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'historical_data.db')
+
+POOLED_NAME = 'pooled'
+
+EMA_COLS = [col for col in FEATURE_COLS if col.startswith('ema_')]
+POOLED_FEATURES = EMA_COLS + ['macd', 'macd_signal', 'rsi_14', 'volume']
+
+def volume_stats(df):
+    """{symbol: [mean, std]} of log(1 + volume), from a frame with symbol + volume."""
+    logv = np.log1p(df['volume'].astype(float))
+    stats = logv.groupby(df['symbol']).agg(['mean', 'std']).fillna(1.0)
+    stats['std'] = stats['std'].replace(0.0, 1.0)
+    return {symbol: [float(row['mean']), float(row['std'])] for symbol, row in stats.iterrows()}
+
+def normalize(df, stats):
+    """Ticker-independent features for rows with symbol + FEATURE_COLS (NaN -> 0)."""
+    close = df['close'].astype(float)
+    out = pd.DataFrame(index=df.index)
+    for col in EMA_COLS:
+        out[col] = df[col] / close - 1.0
+    out['macd'] = df['macd'] / close
+    out['macd_signal'] = df['macd_signal'] / close
+    out['rsi_14'] = df['rsi_14'] / 100.0
+
+    # Symbols the model hasn't seen use the pooled volume stats
+    fallback = stats.get('*', [0.0, 1.0])
+    mean = df['symbol'].map(lambda s: stats.get(s, fallback)[0])
+    std = df['symbol'].map(lambda s: stats.get(s, fallback)[1])
+    out['volume'] = (np.log1p(df['volume'].astype(float)) - mean) / std
+    return out[POOLED_FEATURES].replace([np.inf, -np.inf], np.nan).fillna(0.0)
+
+class PooledKNN:
+    """A pooled artifact plus the cKDTree over its matrix."""
+
+    def __init__(self, artifact, eps=0.0):
+        self.artifact = artifact
+        self.version = artifact.version
+        self.volume_stats = artifact.meta['volume_stats']
+        self.eps = eps
+        self._tree = None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            # Built once per process; the data stays in the mapped .npy
+            self._tree = cKDTree(self.artifact.X, balanced_tree=False, copy_data=False)
+        return self._tree
+
+    def predict_frame(self, df, eps=None):
+        """Predictions for rows with symbol + FEATURE_COLS."""
+        if df.empty:
+            return self.artifact.classes[:0]
+        Z = self.artifact.transform(normalize(df, self.volume_stats).to_numpy())
+        k = min(self.artifact.k, len(self.artifact.X))
+        dist, ind = self.tree.query(Z, k=k, eps=self.eps if eps is None else eps, workers=-1)
+        if k == 1:
+            dist, ind = dist[:, None], ind[:, None]
+        return self.artifact.vote(dist, ind)
+
+    def predict_many(self, symbols, dates=None, db_path=None, eps=None):
+        """
+        Predict every stored (symbol, date) for 'symbols' (and 'dates', if given:
+        'YYYY-MM-DD' strings) in one batched tree search.
+        Returns a DataFrame of symbol, date, close, prediction.
+        """
+        conn = features.connect(db_path or DATABASE_PATH)
+        df = load_rows(conn, symbols, dates)
+        conn.close()
+        df['prediction'] = self.predict_frame(df, eps)
+        return df[['symbol', 'date', 'close', 'prediction']]
+
+def load(model_dir=MODEL_DIR, eps=0.0):
+    artifact = knn_artifact.load(model_dir, POOLED_NAME)
+    return PooledKNN(artifact, eps) if artifact is not None else None
+
+def load_rows(conn, symbols, dates=None):
+    """symbol, date, FEATURE_COLS for 'symbols' (optionally only 'dates'), ordered by symbol, day."""
+    days = np.array(sorted(to_day(d) for d in dates), dtype='int64') if dates is not None else None
+    frames = []
+    for symbol, matrix in features.load_many(conn, symbols).items():
+        if days is not None:
+            keep = np.isin(matrix.days, days)
+            matrix = features.FeatureMatrix(symbol, matrix.days[keep], matrix.X[keep])
+        df = matrix.frame()
+        df['date'] = matrix.dates
+        df.insert(0, 'symbol', symbol)
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=['symbol', 'date'] + FEATURE_COLS)
+    return pd.concat(frames, ignore_index=True)
+
+def build(train, k=15, model_dir=MODEL_DIR, metrics=None):
+    """
+    Fit the pooled model on labeled rows (symbol, date, FEATURE_COLS, label; see
+    train_knn.add_labels) and save it as models/pooled_knn.json. Returns a PooledKNN.
+    """
+    stats = volume_stats(train)
+    logv = np.log1p(train['volume'].astype(float))
+    stats['*'] = [float(logv.mean()), float(logv.std() or 1.0)]
+
+    Z = normalize(train, stats).to_numpy()
+    mean = Z.mean(axis=0)
+    std = Z.std(axis=0)
+    std[std == 0] = 1.0
+    classes, y = np.unique(train['label'].to_numpy(), return_inverse=True)
+
+    knn_artifact.save(
+        model_dir, POOLED_NAME, (Z - mean) / std, y, classes, POOLED_FEATURES, k,
+        scaler={'kind': 'standard', 'shift': mean.tolist(), 'scale': (1.0 / std).tolist()},
+        train_range={'first_date': str(train['date'].min())[:10], 'last_date': str(train['date'].max())[:10]},
+        metrics=metrics, extra={'volume_stats': stats, 'symbols': sorted(train['symbol'].unique())})
+    return load(model_dir)
+
+def labeled_pool(symbols=None):
+    """All tickers' labeled rows in one frame (symbol, date, FEATURE_COLS, label)."""
+    import train_knn  # sklearn-side module; only needed to train
+
+    symbols = symbols or train_knn.load_tickers()
+    panel = train_knn.load_panel(symbols)
+    frames = [df.assign(symbol=symbol) for symbol, df in panel.items()]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def benchmark(k=15, test_fraction=0.2, eps_values=(0.0, 0.5, 2.0), model_dir=None):
+    """
+    Walk-forward comparison on market_data: everything before the cutoff date
+    trains, everything after is the test set.
+      per-ticker  one KNeighborsClassifier(5) per symbol on raw features (train_knn's old default)
+      pooled      one index over every symbol, brute force and cKDTree at several eps
+    """
+    import tempfile
+    from sklearn.neighbors import KNeighborsClassifier
+
+    pool = labeled_pool()
+    cutoff = pool['date'].quantile(1 - test_fraction)
+    train = pool[pool['date'] < cutoff]
+    test = pool[pool['date'] >= cutoff]
+    print(f"{pool['symbol'].nunique()} symbols, {len(train)} train rows, {len(test)} test rows "
+          f"(cutoff {cutoff:%Y-%m-%d})")
+
+    def report(label, predictions, seconds):
+        accuracy = float((np.asarray(predictions) == test['label'].to_numpy()).mean())
+        print(f"{label:<26} accuracy {accuracy * 100:5.1f}%  {seconds * 1e6 / len(test):8.1f} us/row")
+
+    # Current setup: one small KNN per ticker
+    start = time.perf_counter()
+    predictions = pd.Series(0, index=test.index)
+    for symbol, rows in train.groupby('symbol'):
+        held_out = test[test['symbol'] == symbol]
+        if len(rows) < 5 or held_out.empty:
+            continue
+        model = KNeighborsClassifier(n_neighbors=5).fit(rows[FEATURE_COLS].fillna(0), rows['label'])
+        predictions[held_out.index] = model.predict(held_out[FEATURE_COLS].fillna(0))
+    report("per-ticker k=5 fit+pred", predictions, time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pooled = build(train, k=k, model_dir=model_dir or tmp)
+
+        start = time.perf_counter()
+        exact = pooled.artifact.predict(normalize(test, pooled.volume_stats).to_numpy())
+        report(f"pooled k={k} brute", exact, time.perf_counter() - start)
+
+        pooled.tree  # build the tree outside the timings
+        for eps in eps_values:
+            start = time.perf_counter()
+            approx = pooled.predict_frame(test, eps=eps)
+            label = f"pooled k={k} tree eps={eps}"
+            report(label, approx, time.perf_counter() - start)
+            print(f"{'':<26} agrees with brute force on {(approx == exact).mean() * 100:5.1f}% of rows")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'build':
+        pool = labeled_pool(sys.argv[2:] or None)
+        model = build(pool)
+        print(f"Pooled model {model.version}: {len(model.artifact.X)} rows, "
+              f"{len(model.volume_stats) - 1} symbols")
+    elif command == 'bench':
+        benchmark()
+    else:
+        print("usage: python pooled_knn.py build [SYMBOLS...] | bench")
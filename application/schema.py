@@ -0,0 +1,238 @@
+"""
+schema.py
+---------
+Versioned storage schema for historical_data.db.
+
+The schema version lives in PRAGMA user_version. migrate(conn) applies each
+pending migration in its own transaction; when the database is current it
+returns after reading that single pragma, so callers can run it on every
+connect.
+
+Version 1 layout:
+
+  bars        raw OHLCV          PRIMARY KEY (symbol, day) WITHOUT ROWID
+  indicators  derived columns    PRIMARY KEY (symbol, day) WITHOUT ROWID
+  market_data VIEW joining the two, with 'date' as 'YYYY-MM-DD' text
+
+'day' is the date as an integer count of days since 1970-01-01. Both tables
+are clustered on (symbol, day), so `WHERE symbol = ? ORDER BY day` is a
+range scan of contiguous pages, with no separate index to maintain. Readers
+can keep selecting from market_data; filter and sort on 'day' to get that
+range scan.
+
+`python schema.py [DB_PATH]` migrates a database (and VACUUMs it if
+anything changed); `python schema.py status [DB_PATH]` prints its version.
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_PATH = os.path.join(BASE_DIR, 'data', 'historical_data.db')
+
+EPOCH = date(1970, 1, 1)
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Indicator columns as of version 1. Indicators registered later add their
+# columns through ensure_indicator_columns (scripts/data_fetch.py).
+V1_INDICATOR_COLUMNS = [
+    'ma_50', 'ma_200', 'rsi_14', 'macd', 'macd_signal',
+    'bb_upper', 'bb_mid', 'bb_lower',
+    'ema_8', 'ema_13', 'ema_21', 'ema_34', 'ema_55', 'ema_89', 'ema_144', 'ema_200',
+    'rsi_14_wilder', 'vwap_20',
+]
+
+# Every other table the application creates in this database (dropped by
+# reset): data derived from market data plus the job, event and sentiment
+# tables. A module that adds a table lists it here.
+DERIVED_TABLES = [
+    'indicator_state', 'signals', 'symbol_summary', 'db_meta',
+    'job_metrics',                                                  # scripts/scheduler.py
+    'live_events',                                                  # live_events.py
+    'sentiment_items', 'sentiment_watermarks', 'sentiment_daily',  # sentiment_store.py
+    'sentiment_score_cache',                                        # sentiment_score.py
+]
+
+#############################
+# DATES                     #
+#############################
+
+def to_day(value):
+    """'YYYY-MM-DD' (or a date/datetime) -> days since 1970-01-01."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    elif hasattr(value, 'date'):
+        value = value.date()
+    return (value - EPOCH).days
+
+def from_day(day):
+    """Days since 1970-01-01 -> 'YYYY-MM-DD'."""
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+def to_days(dates):
+    """Vectorized to_day for a list of 'YYYY-MM-DD' strings or a datetime64 array/Series."""
+    return np.asarray(dates, dtype='datetime64[D]').astype('int64')
+
+#############################
+# MIGRATIONS                #
+#############################
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def _object_type(conn, name):
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+def create_market_data_view(conn):
+    """(Re)create the market_data view over bars + every column of indicators."""
+    indicator_cols = [col for col in _table_columns(conn, 'indicators') if col not in ('symbol', 'day')]
+    select = ',\n               '.join([f"b.{col} AS {col}" for col in BAR_COLUMNS] +
+                                      [f"i.{col} AS {col}" for col in indicator_cols])
+    conn.execute("DROP VIEW IF EXISTS market_data")
+    conn.execute(f"""
+        CREATE VIEW market_data AS
+        SELECT b.symbol AS symbol,
+               b.day AS day,
+               date(b.day * 86400, 'unixepoch') AS date,
+               {select}
+        FROM bars AS b
+        LEFT JOIN indicators AS i ON i.symbol = b.symbol AND i.day = b.day
+    """)
+
+def migrate_v1(conn):
+    """
+    Split market_data into clustered bars/indicators tables keyed on epoch days.
+    A legacy market_data table is copied over (the last row wins for duplicate
+    (symbol, date) pairs, matching what the UPDATE-by-date writers produced) and dropped.
+    """
+    conn.execute("""
+        CREATE TABLE bars (
+            symbol TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume INTEGER,
+            PRIMARY KEY (symbol, day)
+        ) WITHOUT ROWID
+    """)
+    col_defs = ',\n            '.join(f"{col} REAL" for col in V1_INDICATOR_COLUMNS)
+    conn.execute(f"""
+        CREATE TABLE indicators (
+            symbol TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            {col_defs},
+            PRIMARY KEY (symbol, day)
+        ) WITHOUT ROWID
+    """)
+
+    if _object_type(conn, 'market_data') == 'table':
+        legacy = set(_table_columns(conn, 'market_data'))
+        day_expr = "CAST(julianday(substr(date, 1, 10)) - 2440587.5 AS INTEGER)"
+        source = "FROM market_data WHERE symbol IS NOT NULL AND date IS NOT NULL ORDER BY rowid"
+        conn.execute(f"""
+            INSERT OR REPLACE INTO bars (symbol, day, {', '.join(BAR_COLUMNS)})
+            SELECT symbol, {day_expr}, {', '.join(BAR_COLUMNS)} {source}
+        """)
+        carried = [col for col in V1_INDICATOR_COLUMNS if col in legacy]
+        if carried:
+            conn.execute(f"""
+                INSERT OR REPLACE INTO indicators (symbol, day, {', '.join(carried)})
+                SELECT symbol, {day_expr}, {', '.join(carried)} {source}
+            """)
+        conn.execute("DROP TABLE market_data")
+
+        # Row counts changed (duplicates are gone): rebuild the derived bookkeeping
+        for table in ('indicator_state', 'symbol_summary'):
+            if _object_type(conn, table) == 'table':
+                conn.execute(f"DELETE FROM {table}")
+
+    create_market_data_view(conn)
+
+MIGRATIONS = [
+    (1, migrate_v1),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Bring the database up to LATEST_VERSION. Returns the versions applied."""
+    if schema_version(conn) >= LATEST_VERSION:
+        return []
+
+    applied = []
+    for version, step in MIGRATIONS:
+        conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check inside the write lock: another process may have migrated meanwhile
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"Applied schema migration {version} ({step.__name__})")
+    return applied
+
+def ensure_indicator_columns(conn, columns):
+    """
+    Add any [(column, sql_type)] missing from the indicators table (one PRAGMA
+    when nothing is missing) and refresh the market_data view to include them.
+    Returns the columns added.
+    """
+    existing = set(_table_columns(conn, 'indicators'))
+    missing = [(col, sql_type) for col, sql_type in columns if col not in existing]
+    if missing:
+        with conn:
+            for col, sql_type in missing:
+                conn.execute(f"ALTER TABLE indicators ADD COLUMN {col} {sql_type}")
+            create_market_data_view(conn)
+    return [col for col, _ in missing]
+
+def drop_all(conn):
+    """Drop the market data and everything derived from it, back to version 0."""
+    with conn:
+        if _object_type(conn, 'market_data') == 'view':
+            conn.execute("DROP VIEW market_data")
+        for table in ['market_data', 'bars', 'indicators'] + DERIVED_TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute("PRAGMA user_version = 0")
+
+def status(conn):
+    version = schema_version(conn)
+    print(f"Schema version {version} (latest {LATEST_VERSION})")
+    if _object_type(conn, 'bars') == 'table':
+        symbols, rows = conn.execute("SELECT COUNT(DISTINCT symbol), COUNT(*) FROM bars").fetchone()
+        print(f"bars: {rows} rows, {symbols} symbols")
+    return version
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    command = args.pop(0) if args and args[0] in ('migrate', 'status') else 'migrate'
+    db_path = args[0] if args else DATABASE_PATH
+
+    conn = sqlite3.connect(db_path)
+    if command == 'status':
+        status(conn)
+    else:
+        before = os.path.getsize(db_path)
+        if migrate(conn):
+            conn.execute("VACUUM")
+            print(f"{db_path}: {before / 1024:,.0f} KB -> {os.path.getsize(db_path) / 1024:,.0f} KB")
+        status(conn)
+    conn.close()
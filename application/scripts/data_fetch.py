@@ -1,246 +1,384 @@
 import os
+import sys
 import csv
+import json
 import sqlite3
+import numpy as np
 import pandas as pd
-import yfinance as yf
+import db_writer
+import indicators
+import providers
 from datetime import datetime
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Shared modules (schema, ...) live in application/
+sys.path.append(os.path.join(BASE_DIR, '..'))
+import intraday_store
+import schema
 # Adjust path if your CSV is in application/tickers.csv
 TICKERS_CSV = os.path.join(BASE_DIR, '..', 'tickers.csv')
 
 DATABASE_PATH = os.path.join(BASE_DIR, '..', 'data', 'historical_data.db')
 
-def ensure_indicator_columns():
+def ensure_indicator_columns(conn=None):
     """
-    Add columns for technical indicators if they don't already exist.
-    This modifies the existing market_data table.
+    Add columns for registered indicators that the indicators table doesn't have yet
+    (e.g. one registered after the last schema migration). A single PRAGMA when
+    nothing is missing.
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    own_conn = conn is None
+    if own_conn:
+        conn = db_writer.connect(DATABASE_PATH)
 
-    # Basic columns for MAs, RSI, MACD, Bollinger
-    base_columns = [
-        ('ma_50', 'REAL'),
-        ('ma_200', 'REAL'),
-        ('rsi_14', 'REAL'),
-        ('macd', 'REAL'),
-        ('macd_signal', 'REAL'),
-        ('bb_upper', 'REAL'),
-        ('bb_mid', 'REAL'),
-        ('bb_lower', 'REAL')
-    ]
-
-    # Additional columns for multi-EMA ribbon
-    ema_columns = [
-        ('ema_8',   'REAL'),
-        ('ema_13',  'REAL'),
-        ('ema_21',  'REAL'),
-        ('ema_34',  'REAL'),
-        ('ema_55',  'REAL'),
-        ('ema_89',  'REAL'),
-        ('ema_144', 'REAL'),
-        ('ema_200', 'REAL')
-    ]
-
-    columns = base_columns + ema_columns
-
-    for col_name, col_type in columns:
-        try:
-            cursor.execute(f"ALTER TABLE market_data ADD COLUMN {col_name} {col_type}")
-        except sqlite3.OperationalError:
-            # Column likely exists already
-            pass
+    # One column per registered indicator output (see indicators.py)
+    added = schema.ensure_indicator_columns(conn, indicators.indicator_columns())
+    if added:
+        print(f"Added indicator columns: {', '.join(added)}")
 
-    conn.commit()
-    conn.close()
+    if own_conn:
+        conn.close()
 
-def update_stock_data(symbol):
+def update_stock_data(symbol, provider=None):
     """
     Fetch daily data for 'symbol' and insert into market_data table (if not already present).
     Then compute indicators (MA, RSI, MACD, Bollinger, multi-EMA) and update the rows.
+    Only dates after the last stored one are requested (a year of history for new symbols).
     """
-    # 1) Fetch daily historical data, e.g. 1 year
-    #    If you want more data for the long-term (say 2 or 5 years), adjust 'period'
-    data = yf.Ticker(symbol).history(period='1y', interval='1d')
+    provider = provider or providers.YFinanceProvider()
+    # 1) Connecting creates/migrates the tables (see schema.py)
+    conn = db_writer.connect(DATABASE_PATH)
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    # 2) Fetch the daily bars we don't have yet
+    start = providers.get_start_dates(conn, [symbol])[symbol]
+    data = provider.fetch_symbol(symbol, start)
 
-    # 2) Create the table if it doesn't exist yet (without indicator columns)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS market_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT,
-            date TEXT,
-            open REAL,
-            high REAL,
-            low REAL,
-            close REAL,
-            volume INTEGER,
-            UNIQUE(symbol, date)
-        )
-    """)
-
-    # 3) Insert or IGNORE daily rows
-    for index, row in data.iterrows():
-        date_str = index.strftime('%Y-%m-%d')  # daily date
-        volume_val = int(row['Volume']) if not pd.isna(row['Volume']) else 0
-
-        cursor.execute("""
-            INSERT OR IGNORE INTO market_data (symbol, date, open, high, low, close, volume)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            symbol,
-            date_str,
-            row['Open'],
-            row['High'],
-            row['Low'],
-            row['Close'],
-            volume_val
-        ))
-    conn.commit()
+    # 3) Insert or IGNORE daily rows (one executemany, one transaction)
+    db_writer.bulk_insert_bars(conn, symbol, data)
     conn.close()
 
-    # 4) Now compute and update indicators
-    compute_and_update_indicators(symbol)
+    # 4) Now compute and update indicators (only the new dates, if we have state)
+    compute_and_update_indicators(symbol, incremental=True)
+
+# How far back yfinance serves each intraday interval
+INTRADAY_PERIODS = {'1m': '7d', '5m': '60d', '15m': '60d', '30m': '60d', '1h': '730d'}
+
+def update_intraday_data(symbols, interval='5m', provider=None):
+    """
+    Fetch 'interval' bars for 'symbols' into the partitioned intraday store
+    (intraday_store.py; daily bars keep going to SQLite through
+    update_stock_data). Each symbol is fetched from the day of its newest
+    stored bar, or as far back as yfinance serves the interval.
+    Returns {symbol: bars added}.
+    """
+    provider = provider or providers.YFinanceProvider(interval=interval,
+                                                      default_period=INTRADAY_PERIODS[interval])
+    starts = {}
+    for symbol in symbols:
+        last = intraday_store.last_ts(symbol, interval)
+        starts[symbol] = None if last is None else pd.Timestamp(last, unit='s', tz='UTC').tz_convert(
+            intraday_store.MARKET_TZ).date()
+
+    added = {}
+    for symbol, df in provider.fetch(starts).items():
+        added[symbol] = intraday_store.write_bars(intraday_store.from_frame(symbol, interval, df))
+    print(f"Intraday {interval}: {sum(added.values())} new bars for {len(added)} symbols")
+    return added
+
+INDICATOR_COLUMNS = [col for col, _ in indicators.indicator_columns()]
+
+# Longest rolling window (ma_200) minus the current bar
+STATE_TAIL_LENGTH = indicators.max_lookback() - 1
+
+def compute_indicators(df):
+    """
+    Compute every registered indicator on a date-sorted DataFrame with the price columns.
+    Returns the same DataFrame with the indicator columns (plus ema_12/ema_26) added.
+    """
+    inputs = {field: df[field] for field in indicators.input_fields()}
+    for col, values in indicators.compute_panel(inputs).items():
+        df[col] = values
+    return df
 
-def compute_and_update_indicators(symbol):
+def compute_and_update_indicators(symbol, incremental=False):
     """
     Loads daily rows for 'symbol' from the DB into a DataFrame,
     computes indicators, then updates each row in the DB.
+
+    With incremental=True, only dates after the last processed bar are computed,
+    continuing from the state saved in the indicator_state table. Falls back to
+    the full recompute when there is no state yet or older rows were backfilled.
     """
+    conn = db_writer.connect(DATABASE_PATH)
+
     # Ensure columns for indicators & EMAs exist
-    ensure_indicator_columns()
+    ensure_indicator_columns(conn)
+    ensure_indicator_state_table(conn)
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    if incremental and update_indicators_incremental(symbol, conn):
+        conn.close()
+        return
 
     # 1) Load data from DB into a DataFrame
-    df = pd.read_sql_query(f"""
-        SELECT *
-        FROM market_data
-        WHERE symbol='{symbol}'
-        ORDER BY date ASC
-    """, conn)
-
+    df = load_price_history(conn, symbol)
     if df.empty:
         conn.close()
         return  # No data to process
 
-    # Convert 'date' to datetime, in case it’s string
-    df['date'] = pd.to_datetime(df['date'])
-
-    # 2) Sort and compute indicators in pandas
-    df.sort_values('date', inplace=True)
-
-    # --- 50 & 200 Moving Averages ---
-    df['ma_50']  = df['close'].rolling(window=50).mean()
-    df['ma_200'] = df['close'].rolling(window=200).mean()
-
-    # --- RSI (14) ---
-    df['rsi_14'] = compute_rsi(df['close'], window=14)
-
-    # --- MACD (12,26,9) ---
-    df['ema_12'] = df['close'].ewm(span=12, adjust=False).mean()
-    df['ema_26'] = df['close'].ewm(span=26, adjust=False).mean()
-    df['macd'] = df['ema_12'] - df['ema_26']
-    df['macd_signal'] = df['macd'].ewm(span=9, adjust=False).mean()
-
-    # --- Additional EMAs for the "ribbon" ---
-    df['ema_8']   = df['close'].ewm(span=8,   adjust=False).mean()
-    df['ema_13']  = df['close'].ewm(span=13,  adjust=False).mean()
-    df['ema_21']  = df['close'].ewm(span=21,  adjust=False).mean()
-    df['ema_34']  = df['close'].ewm(span=34,  adjust=False).mean()
-    df['ema_55']  = df['close'].ewm(span=55,  adjust=False).mean()
-    df['ema_89']  = df['close'].ewm(span=89,  adjust=False).mean()
-    df['ema_144'] = df['close'].ewm(span=144, adjust=False).mean()
-    df['ema_200'] = df['close'].ewm(span=200, adjust=False).mean()  # you also have an ma_200; this is an EMA_200
-
-    # --- Bollinger Bands (20, 2 std) ---
-    df['bb_mid'] = df['close'].rolling(window=20).mean()
-    df['bb_std'] = df['close'].rolling(window=20).std()
-    df['bb_upper'] = df['bb_mid'] + (2 * df['bb_std'])
-    df['bb_lower'] = df['bb_mid'] - (2 * df['bb_std'])
-
-    # 3) Update each row in the DB with indicator values
-    for idx, row in df.iterrows():
-        date_str = row['date'].strftime('%Y-%m-%d')
-        
-        # Convert to float or None if NaN (some early rows might not have enough data for a 50/200/EMA_200)
-        values = {
-            'ma_50':       float(row['ma_50'])       if pd.notna(row['ma_50'])       else None,
-            'ma_200':      float(row['ma_200'])      if pd.notna(row['ma_200'])      else None,
-            'rsi_14':      float(row['rsi_14'])      if pd.notna(row['rsi_14'])      else None,
-            'macd':        float(row['macd'])        if pd.notna(row['macd'])        else None,
-            'macd_signal': float(row['macd_signal']) if pd.notna(row['macd_signal']) else None,
-            'bb_upper':    float(row['bb_upper'])    if pd.notna(row['bb_upper'])    else None,
-            'bb_mid':      float(row['bb_mid'])      if pd.notna(row['bb_mid'])      else None,
-            'bb_lower':    float(row['bb_lower'])    if pd.notna(row['bb_lower'])    else None,
-            'ema_8':       float(row['ema_8'])       if pd.notna(row['ema_8'])       else None,
-            'ema_13':      float(row['ema_13'])      if pd.notna(row['ema_13'])      else None,
-            'ema_21':      float(row['ema_21'])      if pd.notna(row['ema_21'])      else None,
-            'ema_34':      float(row['ema_34'])      if pd.notna(row['ema_34'])      else None,
-            'ema_55':      float(row['ema_55'])      if pd.notna(row['ema_55'])      else None,
-            'ema_89':      float(row['ema_89'])      if pd.notna(row['ema_89'])      else None,
-            'ema_144':     float(row['ema_144'])     if pd.notna(row['ema_144'])     else None,
-            'ema_200':     float(row['ema_200'])     if pd.notna(row['ema_200'])     else None,
-        }
-
-        cursor.execute(f"""
-            UPDATE market_data
-            SET 
-                ma_50       = :ma_50,
-                ma_200      = :ma_200,
-                rsi_14      = :rsi_14,
-                macd        = :macd,
-                macd_signal = :macd_signal,
-                bb_upper    = :bb_upper,
-                bb_mid      = :bb_mid,
-                bb_lower    = :bb_lower,
-                ema_8       = :ema_8,
-                ema_13      = :ema_13,
-                ema_21      = :ema_21,
-                ema_34      = :ema_34,
-                ema_55      = :ema_55,
-                ema_89      = :ema_89,
-                ema_144     = :ema_144,
-                ema_200     = :ema_200
-            WHERE symbol = '{symbol}' AND date = '{date_str}'
-        """, values)
+    # 2) Compute indicators in pandas
+    compute_indicators(df)
+
+    # 3) Write them back and remember where we stopped
+    store_indicators(conn, symbol, df)
+    conn.close()
+
+def load_price_history(conn, symbol):
+    """Load the date-sorted rows for 'symbol' that the indicator math needs."""
+    fields = ', '.join(indicators.input_fields())
+    df = pd.read_sql_query(f"""
+        SELECT day, {fields}
+        FROM bars
+        WHERE symbol = ?
+        ORDER BY day ASC
+    """, conn, params=(symbol,))
+    return with_dates(df)
+
+def with_dates(df):
+    """Replace the epoch 'day' column of a bars query with a datetime 'date' column."""
+    df.insert(0, 'date', pd.to_datetime(df.pop('day'), unit='D'))
+    return df
+
+def store_indicators(conn, symbol, df):
+    """Write a fully computed indicator frame and save the incremental state."""
+    # Merge the indicator values into the DB in one UPDATE
+    db_writer.bulk_update_indicators(conn, symbol, df, INDICATOR_COLUMNS)
+
+    # Remember where we stopped so the next run can go incremental
+    save_indicator_state(conn.cursor(), symbol, build_indicator_state(df))
+    conn.commit()
+
+def ensure_indicator_state_table(conn=None):
+    """
+    Per-symbol state for incremental indicator updates:
+    the last processed date, the price tail for the rolling windows
+    and the last value of every EMA (stored as JSON).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS indicator_state (
+            symbol TEXT PRIMARY KEY,
+            last_date TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            state TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+    if own_conn:
+        conn.close()
+
+def build_indicator_state(df):
+    """Build the carry-over state from a DataFrame that went through compute_indicators."""
+    last = df.iloc[-1]
+    return {
+        'last_date': last['date'].strftime('%Y-%m-%d'),
+        'row_count': len(df),
+        'tail': {field: [float(v) for v in df[field].iloc[-STATE_TAIL_LENGTH:]]
+                 for field in indicators.input_fields()},
+        # Streaming updaters (streaming.py) for the EWM-style indicators, warmed on the full history
+        'streams': {ind.name: ind.stream().warm(df[ind.inputs[0]].to_numpy(dtype=float)).to_state()
+                    for ind in indicators.INDICATORS.values() if ind.recursive},
+    }
+
+def load_indicator_state(cursor, symbol):
+    cursor.execute("SELECT state FROM indicator_state WHERE symbol = ?", (symbol,))
+    row = cursor.fetchone()
+    return json.loads(row[0]) if row else None
+
+def save_indicator_state(cursor, symbol, state):
+    cursor.execute("""
+        INSERT OR REPLACE INTO indicator_state (symbol, last_date, row_count, state)
+        VALUES (?, ?, ?, ?)
+    """, (symbol, state['last_date'], state['row_count'], json.dumps(state)))
+
+def update_indicators_incremental(symbol, conn):
+    """
+    Compute indicators only for rows dated after the saved state and write just those rows.
+    Returns False if the caller should do a full recompute instead.
+    """
+    cursor = conn.cursor()
+
+    state = load_indicator_state(cursor, symbol)
+    if state is None:
+        return False
+
+    # State saved before an indicator or input was registered: full recompute
+    recursive = [ind for ind in indicators.INDICATORS.values() if ind.recursive]
+    if ('tail' not in state or set(state['tail']) != set(indicators.input_fields())
+            or set(state.get('streams', {})) != {ind.name for ind in recursive}):
+        return False
+
+    # Rows inserted *before* last_date (a backfill) invalidate the carried state
+    last_day = schema.to_day(state['last_date'])
+    cursor.execute("SELECT COUNT(*) FROM bars WHERE symbol = ? AND day <= ?", (symbol, last_day))
+    if cursor.fetchone()[0] != state['row_count']:
+        return False
+
+    fields = indicators.input_fields()
+    new_rows = pd.read_sql_query(f"""
+        SELECT day, {', '.join(fields)}
+        FROM bars
+        WHERE symbol = ? AND day > ?
+        ORDER BY day ASC
+    """, conn, params=(symbol, last_day))
+
+    if new_rows.empty:
+        return True  # Nothing new since the last run
+
+    new_rows = with_dates(new_rows)
+    n = len(new_rows)
+
+    # Windowed indicators: recompute over the saved tail + the new bars
+    frame = pd.concat([pd.DataFrame(state['tail']), new_rows[fields]], ignore_index=True)
+    inputs = {field: frame[field] for field in fields}
+    windowed = [ind.name for ind in indicators.INDICATORS.values() if not ind.recursive]
+    for col, values in indicators.compute_panel(inputs, windowed).items():
+        new_rows[col] = values.iloc[-n:].to_numpy()
+
+    # EWM-style indicators: resume each streaming updater and feed it the new bars
+    for ind in recursive:
+        updater = ind.stream().load(state['streams'][ind.name])
+        outputs = [updater.update(float(x)) for x in new_rows[ind.inputs[0]]]
+        if len(ind.columns) == 1:
+            new_rows[ind.columns[0]] = outputs
+        else:
+            for col, values in zip(ind.columns, zip(*outputs)):
+                new_rows[col] = values
+        state['streams'][ind.name] = updater.to_state()
+
+    db_writer.bulk_update_indicators(conn, symbol, new_rows, INDICATOR_COLUMNS)
+
+    # Roll the rest of the state forward
+    last = new_rows.iloc[-1]
+    state['last_date'] = last['date'].strftime('%Y-%m-%d')
+    state['row_count'] += n
+    state['tail'] = {field: [float(v) for v in frame[field].iloc[-STATE_TAIL_LENGTH:]]
+                     for field in fields}
+    save_indicator_state(cursor, symbol, state)
 
     conn.commit()
+    return True
+
+def verify_incremental_indicators(symbol, tolerance=1e-9):
+    """
+    Correctness check: recompute every indicator from scratch in memory and
+    compare with what is stored in market_data (e.g. after incremental runs).
+    Returns True if all columns agree within 'tolerance' (relative).
+    """
+    conn = db_writer.connect(DATABASE_PATH)
+    stored = pd.read_sql_query("""
+        SELECT *
+        FROM market_data
+        WHERE symbol = ?
+        ORDER BY day ASC
+    """, conn, params=(symbol,))
     conn.close()
 
-def compute_rsi(series, window=14):
+    if stored.empty:
+        print(f"No data for {symbol}.")
+        return True
+
+    stored['date'] = pd.to_datetime(stored['date'])
+    expected = compute_indicators(stored[['date'] + indicators.input_fields()].copy())
+
+    ok = True
+    for col in INDICATOR_COLUMNS:
+        a = stored[col].to_numpy(dtype=float)
+        b = expected[col].to_numpy(dtype=float)
+        if not np.allclose(a, b, rtol=tolerance, atol=tolerance, equal_nan=True):
+            diff = np.nanmax(np.abs(a - b))
+            print(f"{symbol}: {col} differs from full recompute (max abs diff {diff:.3e})")
+            ok = False
+    if ok:
+        print(f"{symbol}: incremental indicators match the full recompute.")
+    return ok
+
+def recompute_all_indicators(symbols=None):
     """
-    Basic RSI calculation (14-day).
-    RSI = 100 - (100 / (1 + RS)), where RS = avg_gain / avg_loss.
-    This is a simplified approach, not exactly Wilder's smoothing.
+    Full recompute for many symbols at once: one query, one vectorized panel
+    pass (see indicators.compute_panel), then a bulk write + state per symbol.
+    Handy after a backfill or when a new indicator is registered.
     """
-    delta = series.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+    conn = db_writer.connect(DATABASE_PATH)
+    ensure_indicator_columns(conn)
+    ensure_indicator_state_table(conn)
+
+    fields = indicators.input_fields()
+    df = pd.read_sql_query(f"""
+        SELECT symbol, day, {', '.join(fields)}
+        FROM bars
+        ORDER BY symbol, day
+    """, conn)
+    if symbols:
+        df = df[df['symbol'].isin(symbols)]
+    if df.empty:
+        conn.close()
+        return
+
+    # Align on each symbol's own row number, not the date: a symbol missing a
+    # day must get the same windows as compute_indicators gives it
+    df = with_dates(df)
+    df['row'] = df.groupby('symbol').cumcount()
+    panels = indicators.build_panels(df, fields, index='row')
+    results = indicators.compute_panel(panels)
+    long = indicators.panels_to_long(results, list(results))
+    long = df.merge(long, on=['symbol', 'row'], how='left')
+
+    for symbol, rows in long.groupby('symbol'):
+        rows = rows.sort_values('row').drop(columns='row').reset_index(drop=True)
+        store_indicators(conn, symbol, rows)
+    conn.close()
 
-def update_multiple_stocks():
-    """Loop through tickers.csv and call update_stock_data for each symbol."""
+def load_tickers():
+    """Return the symbols listed in tickers.csv (empty list if the file is missing)."""
     if not os.path.exists(TICKERS_CSV):
         print(f"ERROR: {TICKERS_CSV} does not exist.")
-        return
+        return []
 
     with open(TICKERS_CSV, 'r', newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
-        for row in reader:
-            symbol = row['Symbol'].strip()
-            if symbol:
-                print(f"Fetching + computing indicators for: {symbol}")
-                update_stock_data(symbol)
+        return [row['Symbol'].strip() for row in reader if row['Symbol'].strip()]
+
+def update_multiple_stocks(provider=None):
+    """
+    Fetch + compute indicators for every symbol in tickers.csv.
+    Runs through the concurrent pipeline (see pipeline.py); 'provider' lets
+    callers swap yfinance for another source (see providers.py).
+    """
+    from pipeline import run_pipeline  # pipeline imports this module
+
+    symbols = load_tickers()
+    if not symbols:
+        return
+
+    print(f"Fetching + computing indicators for: {', '.join(symbols)}")
+    run_pipeline(symbols, provider=provider)
     print("Done updating multiple stocks.")
 
 if __name__ == "__main__":
     # You can call update_multiple_stocks() to process everything in tickers.csv
     # or call update_stock_data('TSLA') for a single ticker.
+    # `python data_fetch.py verify AAPL MSFT` checks stored indicators against a full recompute.
+    # `python data_fetch.py recompute [SYMBOLS...]` recomputes everything in one panel pass.
+    # `python data_fetch.py intraday 5m [SYMBOLS...]` fetches intraday bars (see intraday_store.py).
+    if len(sys.argv) > 1 and sys.argv[1] == 'verify':
+        results = [verify_incremental_indicators(sym) for sym in sys.argv[2:]]
+        sys.exit(0 if all(results) else 1)
+    if len(sys.argv) > 1 and sys.argv[1] == 'recompute':
+        recompute_all_indicators(sys.argv[2:] or None)
+        sys.exit(0)
+    if len(sys.argv) > 2 and sys.argv[1] == 'intraday':
+        update_intraday_data(sys.argv[3:] or load_tickers(), interval=sys.argv[2])
+        sys.exit(0)
     update_multiple_stocks()
@@ -0,0 +1,118 @@
+"""
+db_writer.py
+------------
+Bulk write path for the bars and indicators tables (see schema.py).
+
+Rows go in through executemany over NumPy arrays (no per-row iterrows):
+bars with INSERT OR IGNORE, indicators as an upsert on (symbol, day), each
+inside one transaction per symbol. Every write reports rows/second.
+The same transaction refreshes the symbol's row in the summary tables
+(market_summary.py) that the web API reads, and publishes a live_events
+row (live_events.py) for the dashboard's live stream.
+"""
+
+import os
+import sys
+import sqlite3
+import time
+
+# Shared modules (schema, market_summary, ...) live in application/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import live_events
+import market_summary
+import schema
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_PATH = os.path.join(BASE_DIR, '..', 'data', 'historical_data.db')
+
+# Pragmas tuned for a single writer doing large batches
+WRITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MB
+]
+
+def connect(db_path=None):
+    """Open a connection with the write pragmas applied, the schema migrated and the summary tables in place."""
+    conn = sqlite3.connect(db_path or DATABASE_PATH)
+    for pragma in WRITE_PRAGMAS:
+        conn.execute(pragma)
+    schema.migrate(conn)
+    market_summary.ensure_summary_tables(conn)
+    live_events.ensure_events_table(conn)
+    return conn
+
+def report(label, rows, seconds):
+    """Print rows/second for a write and return the rate."""
+    rate = rows / seconds if seconds > 0 else float('inf')
+    print(f"{label}: {rows} rows in {seconds:.3f}s ({rate:,.0f} rows/s)")
+    return rate
+
+def bulk_insert_bars(conn, symbol, data):
+    """
+    INSERT OR IGNORE the OHLCV rows of a yfinance-style DataFrame
+    (DatetimeIndex + Open/High/Low/Close/Volume columns) in one transaction.
+    Returns the number of rows sent.
+    """
+    if data is None or data.empty:
+        return 0
+
+    start = time.perf_counter()
+    days = schema.to_days(data.index.strftime('%Y-%m-%d')).tolist()
+    volume = data['Volume'].fillna(0).to_numpy(dtype='int64').tolist()
+    rows = list(zip(
+        [symbol] * len(days),
+        days,
+        data['Open'].to_numpy(dtype=float).tolist(),
+        data['High'].to_numpy(dtype=float).tolist(),
+        data['Low'].to_numpy(dtype=float).tolist(),
+        data['Close'].to_numpy(dtype=float).tolist(),
+        volume,
+    ))
+
+    with conn:
+        before = conn.total_changes
+        conn.executemany("""
+            INSERT OR IGNORE INTO bars (symbol, day, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        if conn.total_changes > before:
+            live_events.publish(conn, symbol, 'bars', min(days))
+        market_summary.refresh_summary(conn, symbol)
+
+    report(f"{symbol} bars", len(rows), time.perf_counter() - start)
+    return len(rows)
+
+def bulk_update_indicators(conn, symbol, df, columns):
+    """
+    Write 'columns' of df (which has a datetime 'date' column) into the indicators table.
+
+    One upsert per row on the (symbol, day) primary key: rows are appended in
+    key order to the clustered table, and existing days are overwritten
+    (recorded as a rewrite in the summary, so cached feature matrices are rebuilt).
+    NaN is stored as NULL by SQLite, so the arrays can be bound as-is.
+    """
+    if df.empty:
+        return 0
+
+    start = time.perf_counter()
+    days = schema.to_days(df['date'].to_numpy()).tolist()
+    values = df[columns].to_numpy(dtype=float).tolist()
+    rows = [[symbol, d] + v for d, v in zip(days, values)]
+
+    placeholders = ', '.join('?' for _ in range(len(columns) + 2))
+    assignments = ', '.join(f"{col} = excluded.{col}" for col in columns)
+
+    with conn:
+        last_day = conn.execute("SELECT MAX(day) FROM indicators WHERE symbol = ?", (symbol,)).fetchone()[0]
+        conn.executemany(f"""
+            INSERT INTO indicators (symbol, day, {', '.join(columns)})
+            VALUES ({placeholders})
+            ON CONFLICT(symbol, day) DO UPDATE SET {assignments}
+        """, rows)
+        market_summary.touch_summary(conn, symbol, rewrite=last_day is not None and min(days) <= last_day)
+        live_events.publish(conn, symbol, 'bars', min(days))
+
+    report(f"{symbol} indicators", len(rows), time.perf_counter() - start)
+    return len(rows)
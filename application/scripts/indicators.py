@@ -0,0 +1,236 @@
+"""
+indicators.py
+-------------
+Declarative indicator registry and a vectorized panel engine.
+
+Each indicator is a function registered with @register_indicator. It gets
+a dict of input panels ({'close': ..., 'volume': ...}) and returns a dict of
+output columns. The panels can be 2-D (dates x symbols) DataFrames, which
+computes every symbol in one vectorized pass, or plain Series for a single
+symbol -- the functions only use pandas ops that work on both.
+
+Adding an indicator is one registered function: ensure_indicator_columns
+adds its column(s) to the indicators table (schema.py) and the incremental updater handles it
+from its 'lookback' (how many trailing bars it needs) or, for EWM-style
+indicators, from its streaming.py updater.
+
+Note: panels aligned on date give a symbol with a missing bar in the middle
+of its history NaN windows around the gap. Aligning on each symbol's own row
+number (build_panels(..., index='row')) gives the same windows as a
+per-symbol frame (compute_indicators in data_fetch); that is what
+recompute_all_indicators stores.
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import streaming
+
+INDICATORS = {}
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+class Indicator:
+    """A registered indicator: its stored columns, the inputs it reads and how far back it looks."""
+
+    def __init__(self, name, func, columns, inputs, lookback, stream, sql_type):
+        self.name = name
+        self.func = func
+        self.columns = columns
+        self.inputs = inputs
+        self.lookback = lookback
+        self.stream = stream
+        self.sql_type = sql_type
+
+    @property
+    def recursive(self):
+        return self.stream is not None
+
+    def compute(self, panels):
+        return self.func(panels)
+
+def register_indicator(name, columns, inputs=('close',), lookback=1, stream=None, sql_type='REAL'):
+    """
+    Decorator that adds an indicator to the registry.
+
+    columns:  market_data columns the indicator stores
+    inputs:   price fields it reads
+    lookback: trailing bars needed to compute the newest value (window length)
+    stream:   for EWM-style indicators whose value depends on all history, a
+              factory for the streaming.py updater that continues them bar by bar
+              (update(inputs[0]) returns one value per column)
+    """
+    def decorator(func):
+        INDICATORS[name] = Indicator(name, func, list(columns), tuple(inputs),
+                                     lookback, stream, sql_type)
+        return func
+    return decorator
+
+def indicator_columns():
+    """[(column, sql_type)] for every stored indicator column, in registry order."""
+    return [(col, ind.sql_type) for ind in INDICATORS.values() for col in ind.columns]
+
+def input_fields():
+    """Price fields any registered indicator reads."""
+    needed = {field for ind in INDICATORS.values() for field in ind.inputs}
+    return [field for field in PRICE_FIELDS if field in needed]
+
+def max_lookback():
+    return max(ind.lookback for ind in INDICATORS.values())
+
+def compute_panel(panels, names=None):
+    """
+    Run the registered indicators (or just 'names') over the input panels.
+    Returns {column: panel}, including helper columns such as ema_12/ema_26.
+    """
+    results = {}
+    for name in names or INDICATORS:
+        results.update(INDICATORS[name].compute(panels))
+    return results
+
+#############################
+# BUILT-IN INDICATORS       #
+#############################
+
+EMA_RIBBON = [8, 13, 21, 34, 55, 89, 144, 200]
+
+@register_indicator('moving_averages', columns=['ma_50', 'ma_200'], lookback=200)
+def moving_averages(p):
+    close = p['close']
+    return {
+        'ma_50': close.rolling(window=50).mean(),
+        'ma_200': close.rolling(window=200).mean(),
+    }
+
+@register_indicator('rsi', columns=['rsi_14'], lookback=15)
+def rsi(p):
+    return {'rsi_14': compute_rsi(p['close'], window=14)}
+
+@register_indicator('macd', columns=['macd', 'macd_signal'], stream=lambda: streaming.MACD(12, 26, 9))
+def macd(p):
+    close = p['close']
+    ema_12 = close.ewm(span=12, adjust=False).mean()
+    ema_26 = close.ewm(span=26, adjust=False).mean()
+    line = ema_12 - ema_26
+    return {
+        'ema_12': ema_12,
+        'ema_26': ema_26,
+        'macd': line,
+        'macd_signal': line.ewm(span=9, adjust=False).mean(),
+    }
+
+@register_indicator('bollinger', columns=['bb_upper', 'bb_mid', 'bb_lower'], lookback=20)
+def bollinger(p):
+    close = p['close']
+    mid = close.rolling(window=20).mean()
+    std = close.rolling(window=20).std()
+    return {
+        'bb_upper': mid + (2 * std),
+        'bb_mid': mid,
+        'bb_lower': mid - (2 * std),
+    }
+
+@register_indicator('ema_ribbon', columns=[f'ema_{span}' for span in EMA_RIBBON],
+                    stream=lambda: streaming.Ribbon(EMA_RIBBON))
+def ema_ribbon(p):
+    close = p['close']
+    return {f'ema_{span}': close.ewm(span=span, adjust=False).mean() for span in EMA_RIBBON}
+
+@register_indicator('rsi_wilder', columns=['rsi_14_wilder'], stream=lambda: streaming.WilderRSI(14))
+def rsi_wilder(p):
+    return {'rsi_14_wilder': compute_wilder_rsi(p['close'], window=14)}
+
+@register_indicator('vwap', columns=['vwap_20'], inputs=('high', 'low', 'close', 'volume'), lookback=20)
+def vwap(p):
+    """Rolling 20-bar volume-weighted average of the typical price."""
+    typical = (p['high'] + p['low'] + p['close']) / 3
+    volume = p['volume'].astype(float)
+    return {'vwap_20': (typical * volume).rolling(window=20).sum() / volume.rolling(window=20).sum()}
+
+def compute_rsi(series, window=14):
+    """
+    Basic RSI calculation (14-day).
+    RSI = 100 - (100 / (1 + RS)), where RS = avg_gain / avg_loss.
+    This is a simplified approach, not exactly Wilder's smoothing
+    (see compute_wilder_rsi, stored as rsi_14_wilder). Kept as-is because
+    the trained KNN models use rsi_14 as a feature.
+    """
+    delta = series.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
+    rs = gain / loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi
+
+def compute_wilder_rsi(values, window=14):
+    """
+    Standard RSI with Wilder's smoothing (what charting packages show).
+    Works on a Series or, column by column, on a dates x symbols DataFrame.
+    """
+    avg_gain, avg_loss = streaming.wilder_averages(values, window)
+    rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi
+
+#############################
+# PANEL HELPERS             #
+#############################
+
+def build_panels(df, fields=None, index='date'):
+    """
+    Pivot long rows (symbol, date, open, ..., volume) into {field: dates x symbols}.
+    With index='row', rows are aligned on a 'row' column holding each symbol's
+    own 0-based position, so gaps in one symbol's dates don't reach its windows.
+    """
+    fields = fields or input_fields()
+    wide = df.pivot_table(index=index, columns='symbol', values=fields, aggfunc='last')
+    return {field: wide[field].sort_index() for field in fields}
+
+def panels_to_long(results, columns):
+    """Stack {column: index x symbols} back to long rows (symbol, index, columns...)."""
+    index = results[columns[0]].index.name or 'date'
+    stacked = pd.concat({col: results[col] for col in columns}, axis=1)
+    long = stacked.stack(level=1, future_stack=True).reset_index()
+    long.columns = [index, 'symbol'] + list(columns)
+    return long.sort_values(['symbol', index]).reset_index(drop=True)
+
+def benchmark(n_symbols=300, days=2520):
+    """Per-symbol loop (one Series at a time) vs one panel pass over n_symbols."""
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    symbols = [f"SYM{i:03d}" for i in range(n_symbols)]
+    close = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.02, (days, n_symbols)), axis=0)),
+                         index=index, columns=symbols)
+    panels = {
+        'close': close,
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'volume': pd.DataFrame(rng.integers(1_000_000, 10_000_000, (days, n_symbols)),
+                               index=index, columns=symbols),
+    }
+
+    start = time.perf_counter()
+    per_symbol = {sym: compute_panel({f: panel[sym] for f, panel in panels.items()}) for sym in symbols}
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    panel = compute_panel(panels)
+    panel_seconds = time.perf_counter() - start
+
+    for col, _ in indicator_columns():
+        expected = pd.concat({sym: per_symbol[sym][col] for sym in symbols}, axis=1)
+        assert np.allclose(panel[col].to_numpy(), expected.to_numpy(), equal_nan=True), col
+
+    print(f"{n_symbols} symbols x {days} bars: per-symbol loop {loop_seconds:.2f}s, "
+          f"panel {panel_seconds:.2f}s ({loop_seconds / panel_seconds:.1f}x)")
+
+if __name__ == "__main__":
+    # `python indicators.py bench` compares the per-symbol loop with the panel engine
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        benchmark()
+    else:
+        for ind in INDICATORS.values():
+            print(f"{ind.name:<16} {', '.join(ind.columns)}")
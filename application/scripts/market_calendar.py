@@ -0,0 +1,124 @@
+"""
+market_calendar.py
+------------------
+NYSE/Nasdaq trading sessions, so the scheduler only fetches when a new
+daily bar can exist.
+
+Regular hours are 9:30-16:00 America/New_York on weekdays, except the
+exchange holidays below; the day before Independence Day, the day after
+Thanksgiving and Christmas Eve close at 13:00. Holidays on a Saturday are
+observed the Friday before (except New Year's Day, which then isn't
+observed), on a Sunday the Monday after.
+
+`python market_calendar.py [YEAR]` prints the year's holidays and early closes.
+"""
+
+import sys
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+EXCHANGE_TZ = ZoneInfo('America/New_York')
+OPEN = time(9, 30)
+CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th (1-based; -1 = last) 'weekday' (Mon=0) of the month."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year):
+    # Anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+def _observed(day):
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+def holidays(year):
+    """{date: name} of the exchange holidays in 'year'."""
+    days = {
+        _nth_weekday(year, 1, 0, 3): "Martin Luther King Jr. Day",
+        _nth_weekday(year, 2, 0, 3): "Washington's Birthday",
+        _easter(year) - timedelta(days=2): "Good Friday",
+        _nth_weekday(year, 5, 0, -1): "Memorial Day",
+        _observed(date(year, 7, 4)): "Independence Day",
+        _nth_weekday(year, 9, 0, 1): "Labor Day",
+        _nth_weekday(year, 11, 3, 4): "Thanksgiving Day",
+        _observed(date(year, 12, 25)): "Christmas Day",
+    }
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days[_observed(new_year)] = "New Year's Day"
+    if year >= 2022:
+        days[_observed(date(year, 6, 19))] = "Juneteenth"
+    return dict(sorted(days.items()))
+
+def early_closes(year):
+    """Days in 'year' the market closes at 13:00."""
+    candidates = [date(year, 7, 3), _nth_weekday(year, 11, 3, 4) + timedelta(days=1), date(year, 12, 24)]
+    closed = holidays(year)
+    return {day for day in candidates if day.weekday() < 5 and day not in closed}
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+def session(day):
+    """(open, close) of 'day' as aware datetimes, or None if the market is closed all day."""
+    if not is_trading_day(day):
+        return None
+    close = EARLY_CLOSE if day in early_closes(day.year) else CLOSE
+    return (datetime.combine(day, OPEN, EXCHANGE_TZ), datetime.combine(day, close, EXCHANGE_TZ))
+
+def now():
+    return datetime.now(timezone.utc)
+
+def is_open(at=None):
+    at = (at or now()).astimezone(EXCHANGE_TZ)
+    hours = session(at.date())
+    return hours is not None and hours[0] <= at < hours[1]
+
+def last_close(at=None):
+    """The most recent session close at or before 'at'."""
+    at = (at or now()).astimezone(EXCHANGE_TZ)
+    day = at.date()
+    while True:
+        hours = session(day)
+        if hours is not None and hours[1] <= at:
+            return hours[1]
+        day -= timedelta(days=1)
+
+def next_close(after=None):
+    """The first session close strictly after 'after'."""
+    after = (after or now()).astimezone(EXCHANGE_TZ)
+    day = after.date()
+    while True:
+        hours = session(day)
+        if hours is not None and hours[1] > after:
+            return hours[1]
+        day += timedelta(days=1)
+
+if __name__ == "__main__":
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else date.today().year
+    for day, name in holidays(year).items():
+        print(f"{day:%Y-%m-%d} {day:%a}  closed       {name}")
+    for day in sorted(early_closes(year)):
+        print(f"{day:%Y-%m-%d} {day:%a}  13:00 close")
+    print(f"Market {'open' if is_open() else 'closed'}; last close {last_close():%Y-%m-%d %H:%M %Z}, "
+          f"next close {next_close():%Y-%m-%d %H:%M %Z}")
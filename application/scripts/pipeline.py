@@ -0,0 +1,275 @@
+"""
+pipeline.py
+-----------
+Concurrent multi-ticker update engine used by update_multiple_stocks.
+
+    fetch (thread pool) --> writer (one thread, the only SQLite connection)
+                               |   incremental indicators run inline here
+                               v
+                  indicators (process pool, full recomputes) --> back to writer
+
+After a symbol's indicators are written, the writer extends its stored KNN
+predictions (signal_store.py) to the new bars.
+
+Network fetches overlap each other, the CPU-heavy full recomputes run in
+worker processes, and every write goes through a single connection so the
+database never sees lock contention. The market-data provider is
+injectable (see providers.py), so the engine can be benchmarked offline
+with StubSource.
+"""
+
+import os
+import sys
+import queue
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_fetch
+import db_writer
+import providers
+
+# Shared modules (signal_store, ...) live in application/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import signal_store
+
+class StageStats:
+    """Item count, rows written, busy time and peak queue depth for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.rows = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.queued = 0
+        self.max_queue = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, n=1):
+        with self._lock:
+            self.queued += n
+            self.max_queue = max(self.max_queue, self.queued)
+
+    def dequeue(self):
+        with self._lock:
+            self.queued -= 1
+
+    def record(self, seconds, error=False, rows=0):
+        with self._lock:
+            self.items += 1
+            self.rows += rows
+            self.seconds += seconds
+            if error:
+                self.errors += 1
+
+    def summary(self):
+        avg_ms = (self.seconds / self.items * 1000) if self.items else 0.0
+        return (f"{self.name:<18}{self.items:>7}{self.errors:>8}"
+                f"{self.seconds:>10.2f}{avg_ms:>10.1f}{self.max_queue:>11}{self.rows:>9}")
+
+def timed_compute(df):
+    """Process-pool entry point: compute indicators and report how long it took."""
+    start = time.perf_counter()
+    data_fetch.compute_indicators(df)
+    return df, time.perf_counter() - start
+
+def run_pipeline(symbols, provider=None, db_path=None, fetch_workers=8, compute_workers=None,
+                 refresh_signals=True):
+    """
+    Fetch, store and compute indicators for every symbol.
+
+    provider:        a providers.MarketDataProvider (default: YFinanceProvider); each
+                     fetch task asks it for up to provider.batch_size symbols, starting
+                     after the last date already stored for each
+    fetch_workers:   size of the network thread pool
+    compute_workers: size of the indicator process pool; 0 computes inline in the writer
+    refresh_signals: extend each symbol's stored predictions after its indicators
+                     (the scheduler runs that as its own job instead)
+    Returns a dict of StageStats keyed by stage name.
+    """
+    provider = provider or providers.YFinanceProvider()
+    stages = ['fetch', 'write_bars', 'indicators', 'write_indicators']
+    stats = {name: StageStats(name) for name in stages}
+    write_queue = queue.Queue()
+    started = time.perf_counter()
+
+    conn = db_writer.connect(db_path or data_fetch.DATABASE_PATH)
+    data_fetch.ensure_indicator_columns(conn)
+    data_fetch.ensure_indicator_state_table(conn)
+    signal_store.ensure_signals_table(conn)
+    starts = providers.get_start_dates(conn, symbols)
+
+    def fetch_batch(batch):
+        stats['fetch'].dequeue()
+        start = time.perf_counter()
+        try:
+            frames = provider.fetch({symbol: starts[symbol] for symbol in batch})
+        except Exception as e:
+            stats['fetch'].record(time.perf_counter() - start, error=True)
+            print(f"{', '.join(batch)}: fetch failed: {e}")
+            for symbol in batch:
+                write_queue.put(('error', symbol, None))
+            return
+        stats['fetch'].record(time.perf_counter() - start)
+        for symbol in batch:
+            stats['write_bars'].enqueue()
+            write_queue.put(('bars', symbol, frames.get(symbol, providers.empty_frame())))
+
+    compute_pool = ProcessPoolExecutor(max_workers=compute_workers) if compute_workers != 0 else None
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers)
+    size = max(1, provider.batch_size)
+    batches = [symbols[i:i + size] for i in range(0, len(symbols), size)]
+    stats['fetch'].enqueue(len(batches))
+    for batch in batches:
+        fetch_pool.submit(fetch_batch, batch)
+
+    def on_computed(symbol):
+        def callback(future):
+            stats['indicators'].dequeue()
+            try:
+                df, seconds = future.result()
+                stats['indicators'].record(seconds)
+            except Exception as e:
+                stats['indicators'].record(0.0, error=True)
+                print(f"{symbol}: indicator compute failed: {e}")
+                write_queue.put(('error', symbol, None))
+                return
+            stats['write_indicators'].enqueue()
+            write_queue.put(('indicators', symbol, df))
+        return callback
+
+    # The writer loop: this thread owns the only connection. A symbol that fails
+    # here (locked database, corrupt model, ...) is recorded and skipped.
+    pending = len(symbols)
+    try:
+        while pending:
+            kind, symbol, payload = write_queue.get()
+
+            if kind == 'error':
+                pending -= 1
+                continue
+
+            stage = 'write_bars' if kind == 'bars' else 'write_indicators'
+            stats[stage].dequeue()
+            start = time.perf_counter()
+            try:
+                if kind == 'bars':
+                    rows = db_writer.bulk_insert_bars(conn, symbol, payload)
+                    done = data_fetch.update_indicators_incremental(symbol, conn)
+                    history = None if done else data_fetch.load_price_history(conn, symbol)
+                    if done and refresh_signals:
+                        signal_store.refresh_signals_for_symbol(conn, symbol)
+                    stats['write_bars'].record(time.perf_counter() - start, rows=rows)
+
+                    stage = 'indicators'
+                    if done or history.empty:
+                        pending -= 1
+                    elif compute_pool is None:
+                        df, seconds = timed_compute(history)
+                        stats['indicators'].record(seconds)
+                        stats['write_indicators'].enqueue()
+                        write_queue.put(('indicators', symbol, df))
+                    else:
+                        stats['indicators'].enqueue()
+                        future = compute_pool.submit(timed_compute, history)
+                        future.add_done_callback(on_computed(symbol))
+
+                else:
+                    data_fetch.store_indicators(conn, symbol, payload)
+                    if refresh_signals:
+                        signal_store.refresh_signals_for_symbol(conn, symbol)
+                    stats['write_indicators'].record(time.perf_counter() - start, rows=len(payload))
+                    pending -= 1
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                stats[stage].record(time.perf_counter() - start, error=True)
+                print(f"{symbol}: {stage} failed: {e}")
+                pending -= 1
+    finally:
+        fetch_pool.shutdown(wait=True)
+        if compute_pool is not None:
+            compute_pool.shutdown(wait=True)
+        conn.close()
+
+    print_stats(stats, time.perf_counter() - started, provider)
+    return stats
+
+def print_stats(stats, wall_seconds, provider):
+    print(f"{'stage':<18}{'items':>7}{'errors':>8}{'busy(s)':>10}{'avg(ms)':>10}{'max queue':>11}{'rows':>9}")
+    for stage in stats.values():
+        print(stage.summary())
+    print(f"Pipeline wall time: {wall_seconds:.2f}s, provider requests so far: {provider.requests}")
+
+class StubSource(providers.MarketDataProvider):
+    """
+    Offline stand-in for yfinance: sleeps 'latency' seconds per request and
+    returns a deterministic random-walk history of 'days' daily bars per
+    symbol, trimmed to each requested start date.
+    """
+
+    def __init__(self, latency=0.5, days=252, batch_size=50):
+        super().__init__()
+        self.latency = latency
+        self.days = days
+        self.batch_size = batch_size
+
+    def fetch(self, starts):
+        self.requests += 1
+        time.sleep(self.latency)
+        return {symbol: self.bars(symbol, start) for symbol, start in starts.items()}
+
+    def bars(self, symbol, start=None):
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+        index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=self.days)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, self.days)))
+        df = pd.DataFrame({
+            'Open': close * (1 + rng.normal(0, 0.005, self.days)),
+            'High': close * 1.01,
+            'Low': close * 0.99,
+            'Close': close,
+            'Volume': rng.integers(1_000_000, 10_000_000, self.days),
+        }, index=index)
+        return df if start is None else df[df.index >= pd.Timestamp(start)]
+
+def benchmark(n_symbols=40, latency=0.5, days=252):
+    """
+    Compare the old serial path (one request per symbol, inline compute) with
+    the pipeline on a temp DB, then run a second, incremental tick.
+    """
+    symbols = [f"SYM{i:03d}" for i in range(n_symbols)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("== Serial ==")
+        start = time.perf_counter()
+        run_pipeline(symbols, provider=StubSource(latency, days, batch_size=1),
+                     db_path=os.path.join(tmp, 'serial.db'), fetch_workers=1, compute_workers=0)
+        serial = time.perf_counter() - start
+
+        print("== Pipelined ==")
+        source = StubSource(latency, days)
+        db_path = os.path.join(tmp, 'pipeline.db')
+        start = time.perf_counter()
+        run_pipeline(symbols, provider=source, db_path=db_path)
+        pipelined = time.perf_counter() - start
+
+        print("== Next tick (incremental) ==")
+        start = time.perf_counter()
+        run_pipeline(symbols, provider=source, db_path=db_path)
+        tick = time.perf_counter() - start
+
+    print(f"Serial {serial:.2f}s vs pipelined {pipelined:.2f}s ({serial / pipelined:.1f}x), "
+          f"next tick {tick:.2f}s")
+
+if __name__ == "__main__":
+    # `python pipeline.py bench` runs the offline benchmark against StubSource
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        benchmark()
+    else:
+        data_fetch.update_multiple_stocks()
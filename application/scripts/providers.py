@@ -0,0 +1,149 @@
+"""
+providers.py
+------------
+Market-data providers.
+
+A provider takes {symbol: start_date} (start_date None = no history yet)
+and returns {symbol: DataFrame} in the yfinance layout: a DatetimeIndex
+and Open/High/Low/Close/Volume columns. Only bars on or after start_date
+are requested, so a scheduler tick after a full backfill asks for a day
+or two per symbol, many symbols per request.
+
+  YFinanceProvider - batched yf.download calls
+  ReplayProvider   - CSV files on disk, for offline runs and tests
+"""
+
+import os
+from datetime import date, timedelta
+
+import pandas as pd
+import yfinance as yf
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def get_start_dates(conn, symbols):
+    """
+    Return {symbol: first date to fetch} from the last day already stored in bars.
+    Symbols with no rows map to None (full history).
+    """
+    starts = {symbol: None for symbol in symbols}
+    if not symbols:
+        return starts
+
+    placeholders = ', '.join('?' for _ in symbols)
+    rows = conn.execute(f"""
+        SELECT symbol, MAX(day)
+        FROM bars
+        WHERE symbol IN ({placeholders})
+        GROUP BY symbol
+    """, list(symbols)).fetchall()
+
+    for symbol, last_day in rows:
+        if last_day is not None:
+            starts[symbol] = date(1970, 1, 1) + timedelta(days=last_day + 1)
+    return starts
+
+def empty_frame():
+    return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([]))
+
+class MarketDataProvider:
+    """Base class: subclasses implement fetch()."""
+
+    batch_size = 1
+
+    def __init__(self):
+        self.requests = 0
+
+    def fetch(self, starts):
+        """Return {symbol: DataFrame} for {symbol: start_date or None}."""
+        raise NotImplementedError
+
+    def fetch_symbol(self, symbol, start=None):
+        return self.fetch({symbol: start}).get(symbol, empty_frame())
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    Batched yfinance downloads. Symbols that share a start date go out in one
+    yf.download call of up to 'batch_size' tickers; symbols with no stored
+    history get 'default_period'.
+    """
+
+    def __init__(self, batch_size=50, default_period='1y', interval='1d'):
+        super().__init__()
+        self.batch_size = batch_size
+        self.default_period = default_period
+        self.interval = interval
+
+    def fetch(self, starts):
+        results = {}
+        today = date.today()
+
+        # Group symbols by start date so each group is one request
+        groups = {}
+        for symbol, start in starts.items():
+            if start is not None and start > today:
+                results[symbol] = empty_frame()  # Already up to date
+                continue
+            groups.setdefault(start, []).append(symbol)
+
+        for start, symbols in groups.items():
+            for i in range(0, len(symbols), self.batch_size):
+                chunk = symbols[i:i + self.batch_size]
+                results.update(self._download(chunk, start))
+        return results
+
+    def _download(self, symbols, start):
+        kwargs = {'interval': self.interval, 'group_by': 'ticker',
+                  'auto_adjust': True, 'progress': False, 'threads': True}
+        if start is None:
+            kwargs['period'] = self.default_period
+        else:
+            kwargs['start'] = start.isoformat()
+
+        self.requests += 1
+        data = yf.download(tickers=symbols, **kwargs)
+
+        frames = {}
+        for symbol in symbols:
+            if data is None or data.empty:
+                frames[symbol] = empty_frame()
+            elif isinstance(data.columns, pd.MultiIndex):
+                if symbol in data.columns.get_level_values(0):
+                    frames[symbol] = data[symbol][PRICE_COLUMNS].dropna(how='all')
+                else:
+                    frames[symbol] = empty_frame()
+            else:
+                frames[symbol] = data[PRICE_COLUMNS].dropna(how='all')
+        return frames
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serve bars from <directory>/<SYMBOL>.csv files (the layout DataFrame.to_csv
+    writes for a yfinance frame). Use save_replay() to record them.
+    """
+
+    def __init__(self, directory, batch_size=50):
+        super().__init__()
+        self.directory = directory
+        self.batch_size = batch_size
+
+    def fetch(self, starts):
+        self.requests += 1
+        results = {}
+        for symbol, start in starts.items():
+            path = os.path.join(self.directory, f"{symbol}.csv")
+            if not os.path.exists(path):
+                results[symbol] = empty_frame()
+                continue
+            df = pd.read_csv(path, index_col=0)
+            df.index = pd.to_datetime(df.index, utc=True).tz_localize(None)
+            if start is not None:
+                df = df[df.index >= pd.Timestamp(start)]
+            results[symbol] = df[PRICE_COLUMNS]
+        return results
+
+def save_replay(frames, directory):
+    """Write {symbol: DataFrame} as replay files for ReplayProvider."""
+    os.makedirs(directory, exist_ok=True)
+    for symbol, df in frames.items():
+        df[PRICE_COLUMNS].to_csv(os.path.join(directory, f"{symbol}.csv"))
@@ -1,19 +1,290 @@
-import time
-import schedule
+"""
+scheduler.py
+------------
+Runs the update chain once per trading session instead of every hour.
+
+Daily bars only change when a session closes, so the chain is due when a
+session has closed (plus SETTLE_MINUTES for the provider to publish the
+final bar) since the last successful run. Nights, weekends and exchange
+holidays (market_calendar.py) cost nothing but a sleep. A run that is
+missed, e.g. because the machine was off, happens on the next check.
+
+The chain, in order (a failing job stops the rest):
+
+  ingest    fetch + bars + indicators (pipeline.run_pipeline); its stages are
+            recorded as fetch / write_bars / indicators / write_indicators
+  signals   extend each symbol's stored KNN predictions (signal_store.py)
+  features  extend the feature cache (features.py), so the first API or
+            backtest read after the update is a cache hit. The web caches
+            key off symbol_summary revisions and model mtimes, so they
+            invalidate themselves once the rows above are written.
+  columnar  re-export the symbols that got new rows to the columnar files
+            (columnar_store.py) analytics read from
+  events    drop live_events rows (live_events.py) older than the dashboard
+            streams can resume from
+
+A file lock (scheduler.lock, next to the database) keeps two runs from
+overlapping, whether they come from this loop, a second scheduler or
+`scheduler.py once`. Every job's duration, item/row counts and status go
+into the job_metrics table.
+
+  python scheduler.py                run forever
+  python scheduler.py once [--force] run the chain now if due (--force: regardless)
+  python scheduler.py status         recent job_metrics rows and the next due time
+"""
+
+import json
 import os
-from data_fetch import update_multiple_stocks  # or update_stock_data, etc.
+import sys
+import time
+from datetime import datetime, timedelta, timezone
 
-def job():
-    print("Running data fetch job...")
-    update_multiple_stocks()  # or call your function that updates all tickers
-    print("Data fetch complete.")
+import data_fetch
+import db_writer
+import market_calendar
 
-# Schedule the job every 30 minutes
-schedule.every(60).minutes.do(job)
+# Shared modules (signal_store, features, ...) live in application/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import columnar_store
+import features
+import live_events
+import signal_store
 
-if __name__ == "__main__":
-    print("Scheduler started. Will update every 60 minutes.")
-    # Run the scheduler indefinitely
+SETTLE_MINUTES = 20
+MAX_SLEEP_SECONDS = 15 * 60  # re-check at least this often (clock changes, manual runs)
+RETRY_SECONDS = 10 * 60      # after a failed or locked run
+
+def ensure_job_metrics_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS job_metrics (
+            run_id INTEGER NOT NULL,
+            job TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            seconds REAL NOT NULL,
+            items INTEGER NOT NULL DEFAULT 0,
+            rows INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            detail TEXT,
+            PRIMARY KEY (run_id, job)
+        )
+    """)
+    conn.commit()
+
+def record(conn, run_id, job, started_at, seconds, status, items=0, rows=0, errors=0, detail=None):
+    conn.execute("""
+        INSERT OR REPLACE INTO job_metrics
+            (run_id, job, started_at, seconds, items, rows, errors, status, detail)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (run_id, job, started_at.isoformat(timespec='seconds'), round(seconds, 3),
+          items, rows, errors, status, detail))
+    conn.commit()
+
+def last_success(conn):
+    """When the last complete chain started (aware UTC datetime), or None."""
+    row = conn.execute("""
+        SELECT MAX(started_at) FROM job_metrics WHERE job = 'chain' AND status = 'ok'
+    """).fetchone()
+    return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+def next_due(conn):
+    """The first time the chain should run: SETTLE_MINUTES after the first close since the last success."""
+    settle = timedelta(minutes=SETTLE_MINUTES)
+    last = last_success(conn)
+    if last is None:
+        return market_calendar.now()
+    # The bar of a session is final SETTLE_MINUTES after its close
+    return market_calendar.next_close(last - settle) + settle
+
+#############################
+# LOCK                      #
+#############################
+
+class RunLock:
+    """Non-blocking exclusive lock on a file: `with RunLock(path) as acquired: ...`"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+')
+        try:
+            _lock_file(self._file)
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(f"{os.getpid()}\n")
+        self._file.flush()
+        return True
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            _unlock_file(self._file)
+            self._file.close()
+            self._file = None
+
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+#############################
+# JOBS                      #
+#############################
+# Each job takes (conn, symbols, provider) and returns (items, rows, errors, detail)
+# or, for a job with stages of its own, {stage: (seconds, items, rows, errors)}.
+
+def ingest_job(conn, symbols, provider):
+    from pipeline import run_pipeline  # pipeline imports data_fetch
+
+    stats = run_pipeline(symbols, provider=provider, db_path=conn_path(conn), refresh_signals=False)
+    return {name: (stage.seconds, stage.items, stage.rows, stage.errors) for name, stage in stats.items()}
+
+def signals_job(conn, symbols, provider):
+    rows = errors = 0
+    for symbol in symbols:
+        try:
+            rows += signal_store.refresh_signals_for_symbol(conn, symbol)
+        except Exception as e:
+            errors += 1
+            print(f"{symbol}: signal refresh failed: {e}")
+    return len(symbols), rows, errors, None
+
+def features_job(conn, symbols, provider):
+    matrices = features.load_many(conn, symbols)
+    return len(matrices), sum(len(m) for m in matrices.values()), 0, f"spec {features.SPEC_HASH}"
+
+def columnar_job(conn, symbols, provider):
+    written = columnar_store.export(conn, symbols)
+    return len(symbols), sum(written.values()), 0, f"{len(written)} symbols rewritten"
+
+def events_job(conn, symbols, provider):
+    removed = live_events.prune(conn)
+    return 0, removed, 0, f"kept {live_events.RETENTION_SECONDS // 86400} days"
+
+JOBS = [
+    ('ingest', ingest_job),
+    ('signals', signals_job),
+    ('features', features_job),
+    ('columnar', columnar_job),
+    ('events', events_job),
+]
+
+def conn_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+def run_chain(symbols=None, provider=None, db_path=None, force=False):
+    """
+    Run JOBS in order under the run lock if the chain is due (or 'force').
+    Returns 'ok', 'failed', 'locked' or 'not due'.
+    """
+    conn = db_writer.connect(db_path or data_fetch.DATABASE_PATH)
+    ensure_job_metrics_table(conn)
+    try:
+        if not force and market_calendar.now() < next_due(conn):
+            return 'not due'
+
+        with RunLock(os.path.join(os.path.dirname(conn_path(conn)), 'scheduler.lock')) as acquired:
+            if not acquired:
+                print("Another update run holds the lock; skipping.")
+                return 'locked'
+            # The run holding the lock may have just finished this session
+            if not force and market_calendar.now() < next_due(conn):
+                return 'not due'
+
+            symbols = symbols or data_fetch.load_tickers()
+            run_id = conn.execute("SELECT COALESCE(MAX(run_id), 0) + 1 FROM job_metrics").fetchone()[0]
+            chain_started = market_calendar.now()
+            chain_start = time.perf_counter()
+            status = 'ok'
+
+            for name, job in JOBS:
+                started = market_calendar.now()
+                start = time.perf_counter()
+                try:
+                    result = job(conn, symbols, provider)
+                except Exception as e:
+                    record(conn, run_id, name, started, time.perf_counter() - start, 'failed', detail=repr(e))
+                    print(f"Job {name} failed: {e}; stopping the chain.")
+                    status = 'failed'
+                    break
+
+                seconds = time.perf_counter() - start
+                if isinstance(result, dict):
+                    for stage, (stage_seconds, items, rows, errors) in result.items():
+                        record(conn, run_id, stage, started, stage_seconds, 'ok', items, rows, errors)
+                    items = len(symbols)
+                    rows = sum(r[2] for r in result.values())
+                    errors = sum(r[3] for r in result.values())
+                    detail = json.dumps(list(result))
+                else:
+                    items, rows, errors, detail = result
+                record(conn, run_id, name, started, seconds, 'ok', items, rows, errors, detail)
+                print(f"Job {name}: {seconds:.2f}s, {items} items, {rows} rows, {errors} errors")
+
+            record(conn, run_id, 'chain', chain_started, time.perf_counter() - chain_start, status,
+                   items=len(symbols))
+            return status
+    finally:
+        conn.close()
+
+def print_status(db_path=None, limit=20):
+    conn = db_writer.connect(db_path or data_fetch.DATABASE_PATH)
+    ensure_job_metrics_table(conn)
+    rows = conn.execute("""
+        SELECT run_id, job, started_at, seconds, items, rows, errors, status
+        FROM job_metrics ORDER BY run_id DESC, started_at DESC LIMIT ?
+    """, (limit,)).fetchall()
+    print(f"{'run':>5} {'job':<17}{'started (UTC)':<27}{'seconds':>9}{'items':>7}{'rows':>8}{'errors':>7}  status")
+    for run_id, job, started_at, seconds, items, n_rows, errors, status in rows:
+        print(f"{run_id:>5} {job:<17}{started_at:<27}{seconds:>9.2f}{items:>7}{n_rows:>8}{errors:>7}  {status}")
+    due = next_due(conn)
+    conn.close()
+    print(f"Market {'open' if market_calendar.is_open() else 'closed'}; "
+          f"next run due {due.astimezone(market_calendar.EXCHANGE_TZ):%Y-%m-%d %H:%M %Z}")
+
+def run_forever(db_path=None):
+    print("Scheduler started. Runs once per trading session, "
+          f"{SETTLE_MINUTES} minutes after the close.")
     while True:
-        schedule.run_pending()
-        time.sleep(1)
+        status = run_chain(db_path=db_path)
+        if status != 'not due':
+            print(f"Update chain: {status}")
+
+        conn = db_writer.connect(db_path or data_fetch.DATABASE_PATH)
+        ensure_job_metrics_table(conn)
+        due = next_due(conn)
+        conn.close()
+        wait = (due - datetime.now(timezone.utc)).total_seconds()
+        if status == 'not due' and wait > 0:
+            print(f"Next run {due.astimezone(market_calendar.EXCHANGE_TZ):%Y-%m-%d %H:%M %Z}")
+        if status in ('failed', 'locked'):
+            wait = RETRY_SECONDS
+        time.sleep(min(max(wait, 60), MAX_SLEEP_SECONDS))
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'once':
+        print(f"Update chain: {run_chain(force='--force' in sys.argv)}")
+    elif command == 'status':
+        print_status()
+    else:
+        run_forever()
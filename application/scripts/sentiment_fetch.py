@@ -11,10 +11,11 @@ load_dotenv()
 TWITTER_BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
 client = tweepy.Client(bearer_token=TWITTER_BEARER_TOKEN)
 
-def fetch_tweets_for_symbol(symbol, max_results=10):
+def fetch_tweets_for_symbol(symbol, max_results=10, since_id=None):
     """
     Fetch recent tweets containing the cashtag for the symbol,
-    e.g. $AAPL for Apple.
+    e.g. $AAPL for Apple. With 'since_id' (the newest tweet id already
+    stored, see sentiment_store.py) only newer tweets are returned.
     """
     # Twitter often uses the cashtag syntax $AAPL for stock mentions.
     query = f"${symbol} -is:retweet lang:en"
@@ -24,7 +25,8 @@ def fetch_tweets_for_symbol(symbol, max_results=10):
     response = client.search_recent_tweets(
         query=query,
         max_results=max_results,
-        tweet_fields=["created_at", "text", "public_metrics"]
+        tweet_fields=["created_at", "text", "public_metrics"],
+        since_id=since_id,
     )
 
     # response.data is usually a list of Tweet objects
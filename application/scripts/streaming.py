@@ -0,0 +1,319 @@
+"""
+streaming.py
+------------
+O(1)-per-bar indicator updaters.
+
+Each updater takes one new value with update(x) and returns the indicator
+value for that bar (NaN while it is still warming up), the same numbers
+the pandas batch versions produce. State round-trips through to_state() /
+load(state) as a short list of floats, so it can be stored as JSON and
+resumed in another process, and warm(values) rebuilds it from an array of
+history in one vectorized call.
+
+  EMA         - ewm(span, adjust=False).mean()
+  SMA         - rolling(window).mean()
+  RollingStd  - rolling(window).std()
+  WilderRSI   - indicators.compute_wilder_rsi
+  MACD        - (ema_fast - ema_slow, ewm(signal) of that)
+  Ribbon      - several EMAs of the same input
+
+`python streaming.py check` compares each one against pandas.
+"""
+
+import math
+import sys
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+NAN = float('nan')
+
+class EMA:
+    __slots__ = ('span', 'alpha', 'value')
+
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = None
+
+    def update(self, x):
+        if self.value is None:
+            self.value = x
+        else:
+            self.value = self.alpha * x + (1.0 - self.alpha) * self.value
+        return self.value
+
+    def warm(self, values):
+        if len(values):
+            self.value = float(pd.Series(values).ewm(span=self.span, adjust=False).mean().iloc[-1])
+        return self
+
+    def to_state(self):
+        return [self.value]
+
+    def load(self, state):
+        self.value = state[0]
+        return self
+
+class SMA:
+    __slots__ = ('window', 'values', 'total')
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+
+    def update(self, x):
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(x)
+        self.total += x
+        return self.total / self.window if len(self.values) == self.window else NAN
+
+    def warm(self, values):
+        self.values = deque((float(v) for v in values[-self.window:]), maxlen=self.window)
+        self.total = math.fsum(self.values)
+        return self
+
+    def to_state(self):
+        return list(self.values)
+
+    def load(self, state):
+        return self.warm(state)
+
+class RollingStd:
+    """Sample standard deviation (ddof=1) over the last 'window' values, via running mean/M2."""
+
+    __slots__ = ('window', 'values', 'mean', 'm2')
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        if len(self.values) == self.window:
+            # Remove the oldest value (reverse Welford step)
+            old = self.values[0]
+            n = len(self.values)
+            old_mean = self.mean
+            self.mean = (n * old_mean - old) / (n - 1) if n > 1 else 0.0
+            self.m2 -= (old - old_mean) * (old - self.mean)
+        self.values.append(x)
+        n = len(self.values)
+        delta = x - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (x - self.mean)
+        if n < self.window:
+            return NAN
+        return math.sqrt(max(self.m2, 0.0) / (n - 1))
+
+    def warm(self, values):
+        self.values = deque((float(v) for v in values[-self.window:]), maxlen=self.window)
+        tail = np.array(self.values)
+        self.mean = float(tail.mean()) if len(tail) else 0.0
+        self.m2 = float(((tail - self.mean) ** 2).sum()) if len(tail) else 0.0
+        return self
+
+    def to_state(self):
+        return list(self.values)
+
+    def load(self, state):
+        return self.warm(state)
+
+class WilderRSI:
+    """
+    Standard (Wilder) RSI: the first average gain/loss is a simple mean over
+    'window' changes, then avg = (avg * (window - 1) + new) / window.
+    """
+
+    __slots__ = ('window', 'prev', 'count', 'avg_gain', 'avg_loss')
+
+    def __init__(self, window=14):
+        self.window = window
+        self.prev = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, x):
+        if self.prev is None:
+            self.prev = x
+            return NAN
+        delta = x - self.prev
+        self.prev = x
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        self.count += 1
+
+        if self.count <= self.window:
+            # Warm-up: accumulate the simple mean of the first 'window' changes
+            self.avg_gain += gain / self.window
+            self.avg_loss += loss / self.window
+            if self.count < self.window:
+                return NAN
+        else:
+            self.avg_gain = (self.avg_gain * (self.window - 1) + gain) / self.window
+            self.avg_loss = (self.avg_loss * (self.window - 1) + loss) / self.window
+        return rsi_from_averages(self.avg_gain, self.avg_loss)
+
+    def warm(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) <= self.window:
+            self.__init__(self.window)
+            for x in values:
+                self.update(float(x))
+            return self
+        avg_gain, avg_loss = wilder_averages(pd.Series(values), self.window)
+        self.prev = float(values[-1])
+        self.count = len(values) - 1
+        self.avg_gain = float(avg_gain.iloc[-1])
+        self.avg_loss = float(avg_loss.iloc[-1])
+        return self
+
+    def to_state(self):
+        return [self.prev, self.count, self.avg_gain, self.avg_loss]
+
+    def load(self, state):
+        self.prev, self.count, self.avg_gain, self.avg_loss = state
+        return self
+
+class MACD:
+    """update(x) returns (macd, signal)."""
+
+    __slots__ = ('fast', 'slow', 'signal')
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def update(self, x):
+        line = self.fast.update(x) - self.slow.update(x)
+        return line, self.signal.update(line)
+
+    def warm(self, values):
+        close = pd.Series(values, dtype=float)
+        if len(close):
+            fast = close.ewm(span=self.fast.span, adjust=False).mean()
+            slow = close.ewm(span=self.slow.span, adjust=False).mean()
+            line = fast - slow
+            signal = line.ewm(span=self.signal.span, adjust=False).mean()
+            self.fast.value = float(fast.iloc[-1])
+            self.slow.value = float(slow.iloc[-1])
+            self.signal.value = float(signal.iloc[-1])
+        return self
+
+    def to_state(self):
+        return [self.fast.value, self.slow.value, self.signal.value]
+
+    def load(self, state):
+        self.fast.value, self.slow.value, self.signal.value = state
+        return self
+
+class Ribbon:
+    """Several EMAs of the same input; update(x) returns a tuple, one value per span."""
+
+    __slots__ = ('emas',)
+
+    def __init__(self, spans):
+        self.emas = [EMA(span) for span in spans]
+
+    def update(self, x):
+        return tuple(ema.update(x) for ema in self.emas)
+
+    def warm(self, values):
+        for ema in self.emas:
+            ema.warm(values)
+        return self
+
+    def to_state(self):
+        return [ema.value for ema in self.emas]
+
+    def load(self, state):
+        for ema, value in zip(self.emas, state):
+            ema.value = value
+        return self
+
+#############################
+# BATCH HELPERS             #
+#############################
+
+def rsi_from_averages(avg_gain, avg_loss):
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else NAN
+    return 100.0 - (100.0 / (1.0 + avg_gain / avg_loss))
+
+def wilder_averages(values, window):
+    """
+    Batch Wilder averages of gains and losses (NaN during warm-up).
+    Works on a Series or a dates x symbols DataFrame in one pass: each column is
+    seeded with the simple mean of its first 'window' changes and continued with
+    an alpha = 1/window EWM.
+    """
+    delta = values.diff()
+    gain = delta.clip(lower=0)
+    loss = -delta.clip(upper=0)
+
+    def smooth(changes):
+        sma = changes.rolling(window=window).mean()
+        started = sma.notna().cummax()
+        seed = started & ~started.shift(1, fill_value=False)
+        seeded = changes.where(started & ~seed, sma.where(seed))
+        return seeded.ewm(alpha=1.0 / window, adjust=False).mean().where(started)
+
+    return smooth(gain), smooth(loss)
+
+def check(n=3000, tolerance=1e-8):
+    """Feed a random walk through every updater and compare with the pandas versions."""
+    from indicators import compute_wilder_rsi  # indicators imports this module
+
+    close = pd.Series(100 * np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.02, n))))
+    macd_fast = close.ewm(span=12, adjust=False).mean()
+    macd_line = macd_fast - close.ewm(span=26, adjust=False).mean()
+
+    cases = {
+        'EMA(21)': (EMA(21), close.ewm(span=21, adjust=False).mean()),
+        'SMA(50)': (SMA(50), close.rolling(window=50).mean()),
+        'RollingStd(20)': (RollingStd(20), close.rolling(window=20).std()),
+        'WilderRSI(14)': (WilderRSI(14), compute_wilder_rsi(close, 14)),
+        'MACD signal': (MACD(), macd_line.ewm(span=9, adjust=False).mean()),
+    }
+
+    ok = True
+    for name, (updater, expected) in cases.items():
+        # Stream the first half, round-trip the state, stream the rest
+        half = n // 2
+        values = [updater.update(float(x)) for x in close.iloc[:half]]
+        resumed = copy_of(updater)
+        values += [resumed.update(float(x)) for x in close.iloc[half:]]
+        if isinstance(values[0], tuple):
+            values = [v[1] for v in values]
+        match = np.allclose(np.array(values, dtype=float), expected.to_numpy(),
+                            rtol=tolerance, atol=tolerance, equal_nan=True)
+
+        # warm() from the same history must land on the same state
+        warmed = copy_of(updater).warm(close.to_numpy())
+        match = match and np.allclose(warmed.to_state(), resumed.to_state(),
+                                      rtol=tolerance, atol=tolerance)
+        print(f"{name:<16} {'ok' if match else 'MISMATCH'}")
+        ok = ok and match
+    return ok
+
+def copy_of(updater):
+    """Rebuild an updater from its serialized state (what a restart would do)."""
+    if isinstance(updater, EMA):
+        fresh = EMA(updater.span)
+    elif isinstance(updater, MACD):
+        fresh = MACD(updater.fast.span, updater.slow.span, updater.signal.span)
+    elif isinstance(updater, Ribbon):
+        fresh = Ribbon([ema.span for ema in updater.emas])
+    else:
+        fresh = type(updater)(updater.window)
+    return fresh.load(updater.to_state())
+
+if __name__ == "__main__":
+    # `python streaming.py check` compares every updater with its pandas batch version
+    sys.exit(0 if check() else 1)
@@ -0,0 +1,291 @@
+"""
+sentiment_score.py
+------------------
+Lexicon sentiment scores for the items sentiment_store.py collects.
+
+Scoring is vectorized over a whole batch: the batch is tokenized in one pass
+(bytes.translate + split over the joined texts), every token is mapped to a
+lexicon code with one dict lookup, and the valences are summed per text with
+np.bincount (a word right after a negation counts
+-0.74x, as in VADER). The sum is squashed to [-1, 1] with VADER's
+normalization s / sqrt(s^2 + 15), so scores read like VADER compound scores
+(|score| > 0.05 = positive / negative, see sentiment_store.POLARITY_THRESHOLD).
+
+The lexicon is NLTK's VADER lexicon when nltk and its 'vader_lexicon' data are
+installed, else the small finance lexicon below. Large batches are split over
+worker processes (SENTIMENT_WORKERS, default: CPU count), each loading the
+lexicon once.
+
+Scores are cached in sentiment_score_cache by (text hash, lexicon version),
+so reposted or re-fetched text is never scored twice; only texts missing from
+the cache are scored. score_pending() fills sentiment_items.score and
+refreshes the touched sentiment_daily rows.
+
+  python sentiment_score.py          score every unscored item
+  python sentiment_score.py bench    throughput on synthetic posts (in-process vs workers, cache hits)
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+import sentiment_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_PATH = os.path.join(BASE_DIR, 'data', 'historical_data.db')
+
+BATCH_SIZE = 5000  # texts per worker task
+MIN_PARALLEL = 2 * BATCH_SIZE  # below this, worker start-up costs more than it saves
+WORKERS = int(os.getenv("SENTIMENT_WORKERS", "0")) or os.cpu_count() or 1
+
+SEPARATOR = '\x01'  # between texts in a batch (never part of a token)
+_TOKEN_TABLE = bytes(c if chr(c) in "abcdefghijklmnopqrstuvwxyz'" + SEPARATOR else 32 for c in range(256))
+NEGATIONS = {"not", "no", "never", "none", "nobody", "nothing", "neither", "nor", "cannot",
+             "isn't", "aren't", "wasn't", "weren't", "don't", "doesn't", "didn't", "won't",
+             "wouldn't", "shouldn't", "can't", "couldn't", "hasn't", "haven't", "hadn't"}
+NEGATION_SCALAR = -0.74
+ALPHA = 15.0
+
+# Valence on VADER's -4..4 scale; used when NLTK's lexicon isn't available
+FALLBACK_LEXICON = {
+    "bullish": 2.5, "bull": 1.5, "buy": 1.5, "buying": 1.5, "long": 1.0, "calls": 1.0,
+    "moon": 2.0, "rally": 2.0, "rallies": 2.0, "surge": 2.2, "surges": 2.2, "soar": 2.5,
+    "soars": 2.5, "beat": 1.8, "beats": 1.8, "upgrade": 2.0, "upgraded": 2.0, "outperform": 2.0,
+    "strong": 1.9, "growth": 1.6, "gain": 1.8, "gains": 1.8, "profit": 1.9, "profits": 1.9,
+    "record": 1.2, "breakout": 1.8, "undervalued": 1.5, "good": 1.9, "great": 3.1,
+    "love": 3.2, "excellent": 2.7, "positive": 2.6, "win": 2.8, "winning": 2.4, "up": 0.8,
+    "bearish": -2.5, "bear": -1.5, "sell": -1.5, "selling": -1.5, "short": -1.0, "puts": -1.0,
+    "crash": -3.0, "crashes": -3.0, "plunge": -2.6, "plunges": -2.6, "drop": -1.4, "drops": -1.4,
+    "miss": -1.8, "misses": -1.8, "downgrade": -2.0, "downgraded": -2.0, "underperform": -2.0,
+    "weak": -1.9, "loss": -2.0, "losses": -2.0, "lawsuit": -1.8, "fraud": -3.0,
+    "overvalued": -1.5, "bankruptcy": -3.0, "recall": -1.4, "layoffs": -1.9, "bad": -2.5,
+    "terrible": -2.9, "hate": -2.7, "negative": -2.7, "risk": -1.1, "fear": -2.2, "down": -0.8,
+    "dump": -2.0, "dumping": -2.0, "guidance": 0.0,
+}
+
+#############################
+# LEXICON                   #
+#############################
+
+def load_lexicon():
+    """(word -> valence dict, version string); the version keys the score cache."""
+    try:
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+        lexicon = SentimentIntensityAnalyzer().lexicon
+        name = "vader"
+    except (ImportError, LookupError):
+        lexicon = FALLBACK_LEXICON
+        name = "fallback"
+    digest = hashlib.sha1(repr(sorted(lexicon.items())).encode('utf-8')).hexdigest()[:8]
+    return dict(lexicon), f"{name}-{digest}"
+
+def compile_lexicon(lexicon):
+    """
+    (token -> code dict, valence per code, negation flag per code). Code 0 is
+    any other word and code 1 the batch SEPARATOR, so one dict lookup per
+    token answers all three questions.
+    """
+    words = sorted(set(lexicon) | NEGATIONS)
+    codes = {SEPARATOR.encode(): 1}
+    codes.update((word.encode('utf-8'), i) for i, word in enumerate(words, start=2))
+    valence = np.array([0.0, 0.0] + [float(lexicon.get(word, 0.0)) for word in words])
+    negation = np.array([False, False] + [word in NEGATIONS for word in words])
+    return codes, valence, negation
+
+_LEXICON = None
+
+def _lexicon():
+    """(lexicon, version, compiled), loaded once per process."""
+    global _LEXICON
+    if _LEXICON is None:
+        lexicon, version = load_lexicon()
+        _LEXICON = (lexicon, version, compile_lexicon(lexicon))
+    return _LEXICON
+
+#############################
+# SCORING                   #
+#############################
+
+def tokenize(text):
+    """Lower-case ASCII words (letters and apostrophes); everything else separates."""
+    return text.lower().encode('ascii', 'replace').translate(_TOKEN_TABLE).split()
+
+def score_texts(texts, compiled=None):
+    """Compound scores (float64 array in [-1, 1]) for a list of texts."""
+    codes, valence, negation = compiled or _lexicon()[2]
+    n = len(texts)
+    if n == 0:
+        return np.zeros(0)
+    # Tokenize the whole batch at once; SEPARATOR tokens mark where each text ends,
+    # so a SEPARATOR inside a text must not survive into the batch
+    tokens = tokenize((' ' + SEPARATOR + ' ').join((text or '').replace(SEPARATOR, ' ') for text in texts))
+    code = np.fromiter(map(codes.get, tokens, repeat(0)), dtype=np.intp, count=len(tokens))
+    boundary = code == 1
+    doc = np.cumsum(boundary)[~boundary]
+    code = code[~boundary]
+
+    value = valence[code]
+    negated = np.zeros(len(code), dtype=bool)
+    negated[1:] = negation[code[:-1]] & (doc[1:] == doc[:-1])
+    value[negated] *= NEGATION_SCALAR
+
+    total = np.bincount(doc, weights=value, minlength=n)
+    assert len(total) == n, f"{len(total)} scores for {n} texts"
+    return total / np.sqrt(total * total + ALPHA)
+
+def _score_batch(texts):
+    # Worker entry point: the lexicon loads once per process
+    return score_texts(texts)
+
+def score_many(texts, workers=None):
+    """score_texts over BATCH_SIZE chunks, spread over worker processes for large inputs."""
+    workers = workers or WORKERS
+    if workers <= 1 or len(texts) < MIN_PARALLEL:
+        return score_texts(texts)
+    batches = [texts[i:i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        return np.concatenate(list(pool.map(_score_batch, batches)))
+
+def text_hash(text):
+    """Whitespace/case-insensitive: a repost with different spacing is the same text."""
+    return hashlib.blake2b(' '.join((text or '').lower().split()).encode('utf-8'), digest_size=16).digest()
+
+#############################
+# CACHE + STORE             #
+#############################
+
+def ensure_score_cache_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sentiment_score_cache (
+            text_hash BLOB NOT NULL,
+            lexicon TEXT NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (text_hash, lexicon)
+        ) WITHOUT ROWID
+    """)
+    conn.commit()
+
+def cached_scores(conn, texts, workers=None):
+    """
+    Scores for 'texts' (array), scoring only distinct hashes missing from
+    sentiment_score_cache and adding them to it. Returns (scores, newly scored).
+    """
+    version = _lexicon()[1]
+    hashes = [text_hash(text) for text in texts]
+    unique = dict.fromkeys(hashes)
+
+    known = {}
+    keys = list(unique)
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        known.update(conn.execute(f"""
+            SELECT text_hash, score FROM sentiment_score_cache
+            WHERE lexicon = ? AND text_hash IN ({', '.join('?' for _ in chunk)})
+        """, [version] + chunk).fetchall())
+
+    missing = {h: text for h, text in zip(hashes, texts) if h not in known}
+    if missing:
+        new = score_many(list(missing.values()), workers)
+        known.update(zip(missing, new.tolist()))
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO sentiment_score_cache (text_hash, lexicon, score) VALUES (?, ?, ?)",
+                             [(h, version, known[h]) for h in missing])
+    return np.array([known[h] for h in hashes]), len(missing)
+
+def score_pending(conn, limit=None, workers=None):
+    """
+    Score every sentiment_items row with a NULL score, then refresh the
+    sentiment_daily rows of the (symbol, day)s touched. Returns the number
+    of items scored.
+    """
+    sentiment_store.ensure_sentiment_tables(conn)
+    ensure_score_cache_table(conn)
+    start = time.perf_counter()
+    query = "SELECT source, item_id, symbol, day, text FROM sentiment_items WHERE score IS NULL"
+    rows = conn.execute(query + (f" LIMIT {int(limit)}" if limit else "")).fetchall()
+    if not rows:
+        print("Sentiment scoring: nothing to score")
+        return 0
+
+    scores, scored = cached_scores(conn, [row[4] for row in rows], workers)
+    with conn:
+        conn.executemany("UPDATE sentiment_items SET score = ? WHERE source = ? AND item_id = ? AND symbol = ?",
+                         [(score, source, item, symbol)
+                          for score, (source, item, symbol, _, _) in zip(scores.tolist(), rows)])
+        touched = {}
+        for _, _, symbol, day, _ in rows:
+            touched.setdefault(symbol, set()).add(day)
+        for symbol, days in touched.items():
+            sentiment_store.refresh_daily(conn, symbol, sorted(days))
+
+    seconds = time.perf_counter() - start
+    print(f"Sentiment scoring: {len(rows)} items ({scored} new texts, {len(rows) - scored} cached) "
+          f"for {len(touched)} symbols in {seconds:.2f}s = {len(rows) / max(seconds, 1e-9):,.0f} items/s "
+          f"[{_lexicon()[1]}]")
+    return len(rows)
+
+#############################
+# BENCH                     #
+#############################
+
+def synthetic_posts(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vocab = list(FALLBACK_LEXICON) + ["the", "stock", "today", "earnings", "market", "shares",
+                                      "week", "price", "not", "never", "is", "this", "$aapl", "q3"]
+    lengths = rng.integers(5, 30, n)
+    words = rng.choice(vocab, lengths.sum())
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    return [' '.join(words[bounds[i]:bounds[i + 1]]) for i in range(n)]
+
+def _per_item_scores(texts, lexicon):
+    # The straightforward loop a scorer would otherwise run per item
+    out = []
+    for text in texts:
+        total, previous = 0.0, None
+        for word in tokenize(text):
+            word = word.decode()
+            value = lexicon.get(word, 0.0)
+            total += value * NEGATION_SCALAR if previous in NEGATIONS else value
+            previous = word
+        out.append(total / (total * total + ALPHA) ** 0.5)
+    return np.array(out)
+
+def benchmark(n=50000):
+    import tempfile
+
+    texts = synthetic_posts(n)
+    lexicon = _lexicon()[0]
+    print(f"{n} synthetic posts, lexicon {_lexicon()[1]} ({len(lexicon)} words), {WORKERS} worker(s)")
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        print(f"  {label:<28}{seconds:>8.3f}s {n / seconds:>12,.0f} items/s")
+        return result
+
+    loop = timed("per-item loop", lambda: _per_item_scores(texts, lexicon))
+    vectorized = timed("vectorized, in-process", lambda: score_texts(texts))
+    parallel = timed(f"vectorized, {WORKERS} worker(s)", lambda: score_many(texts, WORKERS))
+    assert np.allclose(loop, vectorized) and np.allclose(vectorized, parallel)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        ensure_score_cache_table(conn)
+        timed("cold cache (hash + score)", lambda: cached_scores(conn, texts))
+        timed("warm cache (reposts)", lambda: cached_scores(conn, texts))
+        conn.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        benchmark()
+    else:
+        conn = sqlite3.connect(DATABASE_PATH)
+        score_pending(conn)
+        conn.close()
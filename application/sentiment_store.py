@@ -0,0 +1,274 @@
+"""
+sentiment_store.py
+------------------
+Persisted sentiment items, per-source high-water marks and daily aggregates.
+
+  sentiment_items       one row per (source, item_id, symbol). item_id is the
+                        source's own id, or a hash of text + timestamp when
+                        it has none, so re-fetching the same items inserts
+                        nothing. Undated items are stored at fetched_at
+  sentiment_watermarks  per (source, symbol): the highest numeric id and the
+                        newest published created_at stored. poll() hands them to the
+                        aggregator so each source is asked only for newer
+                        items (since_id / from=)
+  sentiment_daily       per (symbol, day): item count, scored items, mean
+                        score, positive / negative counts
+
+'day' is the epoch day (schema.py) of the item's New York calendar date, the
+same key as the bars table, so the daily rows join bars / market_data on
+(symbol, day): see daily_features(). Items are stored unscored (score NULL)
+and scored in batches by sentiment_score.py, which refreshes the daily rows;
+the aggregates count every item and average the scored ones.
+
+  python sentiment_store.py poll [SYMBOLS...]   fetch new items for tickers.csv (or SYMBOLS)
+  python sentiment_store.py daily SYMBOL        print the daily aggregates
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from schema import from_day, to_day
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_PATH = os.path.join(BASE_DIR, 'data', 'historical_data.db')
+
+# Items are bucketed by the exchange's calendar date
+MARKET_TZ = ZoneInfo('America/New_York')
+
+# Sources whose ids increase over time (usable as since_id)
+SEQUENTIAL_ID_SOURCES = {'twitter', 'stocktwits'}
+
+# |score| above this counts as positive / negative (VADER's compound convention)
+POLARITY_THRESHOLD = 0.05
+
+def ensure_sentiment_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sentiment_items (
+            source TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            text TEXT NOT NULL,
+            score REAL,
+            fetched_at TEXT NOT NULL,
+            PRIMARY KEY (source, item_id, symbol)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sentiment_items_symbol_day ON sentiment_items (symbol, day)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sentiment_watermarks (
+            source TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            since_id TEXT,
+            last_created_at TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (source, symbol)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sentiment_daily (
+            symbol TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            items INTEGER NOT NULL,
+            scored INTEGER NOT NULL,
+            mean_score REAL,
+            positive INTEGER NOT NULL,
+            negative INTEGER NOT NULL,
+            PRIMARY KEY (symbol, day)
+        ) WITHOUT ROWID
+    """)
+    conn.commit()
+
+#############################
+# ITEMS                     #
+#############################
+
+def utc_timestamp(value):
+    """ISO 8601 / datetime -> 'YYYY-MM-DDTHH:MM:SS+00:00', or None if it can't be parsed."""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec='seconds')
+
+def item_id(item):
+    """The source's id, else a content hash (same text at the same time = same item)."""
+    if item.get('id') not in (None, ''):
+        return str(item['id'])
+    digest = hashlib.sha1(f"{item.get('created_at')}\x00{item.get('text', '')}".encode('utf-8'))
+    return 'h:' + digest.hexdigest()[:20]
+
+def market_day(created_at):
+    """Epoch day of the New York calendar date of a UTC timestamp string."""
+    return to_day(datetime.fromisoformat(created_at).astimezone(MARKET_TZ).date())
+
+def _higher_id(a, b):
+    # Numeric ids compare by value; None loses
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b, key=lambda v: (len(v), v))
+
+def store_items(conn, symbol, items, fetched_at=None):
+    """
+    Insert the aggregator's items for 'symbol' (duplicates are ignored),
+    advance the sources' watermarks and refresh the touched daily rows, in
+    one transaction. Returns the number of new rows.
+    """
+    fetched_at = fetched_at or datetime.now(timezone.utc).isoformat(timespec='seconds')
+    rows = []
+    marks = {}
+    for item in items:
+        source = item.get('source', 'unknown')
+        published = utc_timestamp(item.get('created_at'))
+        created_at = published or fetched_at
+        rows.append((source, item_id(item), symbol, market_day(created_at), created_at,
+                     item.get('text') or '', fetched_at))
+        since_id, last = marks.get(source, (None, None))
+        if source in SEQUENTIAL_ID_SOURCES and str(item.get('id', '')).isdigit():
+            since_id = _higher_id(since_id, str(item['id']))
+        # Only a real publication time moves the mark: fetched_at is later
+        # than anything the source has yet to show us
+        marks[source] = (since_id, max(filter(None, [last, published]), default=None))
+
+    if not rows:
+        return 0
+    with conn:
+        before = conn.total_changes
+        conn.executemany("""
+            INSERT OR IGNORE INTO sentiment_items
+                (source, item_id, symbol, day, created_at, text, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        inserted = conn.total_changes - before
+        for source, (since_id, last) in marks.items():
+            advance_watermark(conn, source, symbol, since_id, last, fetched_at)
+        if inserted:
+            refresh_daily(conn, symbol, sorted({row[3] for row in rows}))
+    return inserted
+
+def advance_watermark(conn, source, symbol, since_id, last_created_at, updated_at):
+    """Move (source, symbol)'s marks forward (never back). Does not commit."""
+    current = conn.execute("""
+        SELECT since_id, last_created_at FROM sentiment_watermarks WHERE source = ? AND symbol = ?
+    """, (source, symbol)).fetchone()
+    if current is not None:
+        since_id = _higher_id(current[0], since_id)
+        last_created_at = max(filter(None, [current[1], last_created_at]), default=None)
+    conn.execute("""
+        INSERT OR REPLACE INTO sentiment_watermarks (source, symbol, since_id, last_created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (source, symbol, since_id, last_created_at, updated_at))
+
+def read_watermarks(conn, symbols):
+    """{(source, symbol): {"since_id", "last_created_at"}} for the aggregator's 'since'."""
+    placeholders = ', '.join('?' for _ in symbols)
+    return {(source, symbol): {"since_id": since_id, "last_created_at": last}
+            for source, symbol, since_id, last in conn.execute(f"""
+                SELECT source, symbol, since_id, last_created_at
+                FROM sentiment_watermarks WHERE symbol IN ({placeholders})
+            """, list(symbols))}
+
+#############################
+# DAILY AGGREGATES          #
+#############################
+
+def refresh_daily(conn, symbol, days=None):
+    """Recompute 'symbol's sentiment_daily rows for 'days' (all days if None). Does not commit."""
+    where, params = "symbol = ?", [symbol]
+    if days is not None:
+        where += f" AND day IN ({', '.join('?' for _ in days)})"
+        params += list(days)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO sentiment_daily (symbol, day, items, scored, mean_score, positive, negative)
+        SELECT symbol, day, COUNT(*), COUNT(score), AVG(score),
+               COALESCE(SUM(score > ?), 0), COALESCE(SUM(score < ?), 0)
+        FROM sentiment_items
+        WHERE {where}
+        GROUP BY symbol, day
+    """, [POLARITY_THRESHOLD, -POLARITY_THRESHOLD] + params)
+
+def read_daily(conn, symbol):
+    """The symbol's sentiment_daily rows, oldest first (empty before the first poll)."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sentiment_daily'").fetchone() is None:
+        return pd.DataFrame(columns=['date', 'day', 'items', 'scored', 'mean_score', 'positive', 'negative'])
+    df = pd.read_sql_query("""
+        SELECT day, items, scored, mean_score, positive, negative
+        FROM sentiment_daily WHERE symbol = ? ORDER BY day ASC
+    """, conn, params=(symbol,))
+    df.insert(0, 'date', [from_day(day) for day in df['day']])
+    return df
+
+def daily_features(conn, symbol):
+    """
+    The symbol's trading days (bars) with that day's sentiment columns joined
+    on (symbol, day), ready to merge onto market_data / feature frames by
+    date; days without items get 0 items and a NULL mean score.
+    """
+    return pd.read_sql_query("""
+        SELECT date(b.day * 86400, 'unixepoch') AS date, b.close,
+               COALESCE(s.items, 0) AS sentiment_items,
+               s.mean_score AS sentiment_score,
+               COALESCE(s.positive, 0) AS sentiment_positive,
+               COALESCE(s.negative, 0) AS sentiment_negative
+        FROM bars AS b
+        LEFT JOIN sentiment_daily AS s ON s.symbol = b.symbol AND s.day = b.day
+        WHERE b.symbol = ?
+        ORDER BY b.day ASC
+    """, conn, params=(symbol,))
+
+#############################
+# POLLING                   #
+#############################
+
+def poll(conn, symbols, aggregator=None, max_items=50, score=True):
+    """
+    Fetch only what is newer than each (source, symbol) watermark, store it,
+    score the new items (sentiment_score.py, unless 'score' is False) and
+    report {symbol: new rows}.
+    """
+    if aggregator is None:
+        sys.path.append(os.path.join(BASE_DIR, 'aggregrator'))
+        from aggregator import default_aggregator
+        aggregator = default_aggregator()
+
+    ensure_sentiment_tables(conn)
+    start = time.perf_counter()
+    results = aggregator.fetch_many(symbols, max_items, since=read_watermarks(conn, symbols))
+    added = {symbol: store_items(conn, symbol, items) for symbol, items in results.items()}
+    fetched = sum(len(items) for items in results.values())
+    print(f"Sentiment poll: {fetched} items fetched, {sum(added.values())} new, "
+          f"{time.perf_counter() - start:.2f}s")
+    if score and any(added.values()):
+        import sentiment_score
+        sentiment_score.score_pending(conn)
+    return added
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    conn = sqlite3.connect(DATABASE_PATH)
+    ensure_sentiment_tables(conn)
+    if command == 'poll':
+        symbols = sys.argv[2:]
+        if not symbols:
+            symbols = pd.read_csv(os.path.join(BASE_DIR, 'tickers.csv'))['Symbol'].dropna().tolist()
+        poll(conn, symbols)
+    elif command == 'daily' and len(sys.argv) > 2:
+        print(read_daily(conn, sys.argv[2]).to_string(index=False))
+    else:
+        print("usage: python sentiment_store.py poll [SYMBOLS...] | daily SYMBOL")
+    conn.close()
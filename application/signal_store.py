@@ -0,0 +1,121 @@
+"""
+signal_store.py
+---------------
+Persisted KNN predictions.
+
+Predictions for past dates never change for a given model, so they are
+stored once in the `signals` table keyed by (symbol, model_version, date):
+filled when a model is trained, extended when new bars arrive, and read
+back by /api/knn-signals with an indexed range scan. Extensions publish a
+'signals' live event (live_events.py).
+
+model_version is a content hash of the model (see knn_artifact.py; for a
+legacy pickle, of the pickle bytes), so retraining a symbol starts a new
+set of rows and the old ones are pruned.
+"""
+
+import hashlib
+import os
+import pickle
+
+import features
+import knn_artifact
+import live_events
+from features import FEATURE_COLS  # noqa: F401 (re-exported for older imports)
+from schema import to_day
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, 'models')
+
+def ensure_signals_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS signals (
+            symbol TEXT NOT NULL,
+            model_version TEXT NOT NULL,
+            date TEXT NOT NULL,
+            close REAL,
+            prediction INTEGER NOT NULL,
+            PRIMARY KEY (symbol, model_version, date)
+        ) WITHOUT ROWID
+    """)
+    conn.commit()
+    live_events.ensure_events_table(conn)
+
+def model_version(model_bytes):
+    """Short content hash of a pickled model."""
+    return hashlib.sha1(model_bytes).hexdigest()[:16]
+
+def model_file_path(symbol, model_dir=MODEL_DIR):
+    """The file that identifies 'symbol's current model: the artifact header, else a legacy pickle."""
+    path = knn_artifact.meta_path(model_dir, symbol)
+    if os.path.exists(path):
+        return path
+    return os.path.join(model_dir, f"{symbol}_knn.pkl")
+
+def load_model_file(symbol, model_dir=MODEL_DIR):
+    """
+    Return (model, version) for 'symbol', or (None, None).
+    Artifacts (models/{symbol}_knn.json) are memory-mapped; legacy pickles are still read.
+    """
+    artifact = knn_artifact.load(model_dir, symbol)
+    if artifact is not None:
+        return artifact, artifact.version
+
+    path = os.path.join(model_dir, f"{symbol}_knn.pkl")
+    if not os.path.exists(path):
+        return None, None
+    with open(path, 'rb') as model_file:
+        model_bytes = model_file.read()
+    return pickle.loads(model_bytes), model_version(model_bytes)
+
+def refresh_signals(conn, symbol, model, version):
+    """
+    Predict every day newer than the last stored prediction for (symbol, version)
+    and insert the results. Older model versions of the symbol are dropped.
+    Features come from the shared feature cache (features.py).
+    Returns the number of rows added.
+    """
+    ensure_signals_table(conn)
+    last_date = last_signal_date(conn, symbol, version)
+    rows = features.load_features(conn, symbol).after(to_day(last_date) if last_date else None)
+
+    if last_date is None:
+        conn.execute("DELETE FROM signals WHERE symbol = ? AND model_version != ?", (symbol, version))
+
+    if len(rows):
+        predictions = model.predict(rows.frame()[FEATURE_COLS])
+        conn.executemany("""
+            INSERT OR REPLACE INTO signals (symbol, model_version, date, close, prediction)
+            VALUES (?, ?, ?, ?, ?)
+        """, zip([symbol] * len(rows), [version] * len(rows), rows.dates,
+                 rows.column('close').tolist(), [int(p) for p in predictions]))
+        live_events.publish(conn, symbol, 'signals', rows.days[0])
+    conn.commit()
+    return len(rows)
+
+def refresh_signals_for_symbol(conn, symbol, model_dir=MODEL_DIR):
+    """Extend the stored predictions with the model on disk (no-op without a model)."""
+    model, version = load_model_file(symbol, model_dir)
+    if model is None:
+        return 0
+    return refresh_signals(conn, symbol, model, version)
+
+def last_signal_date(conn, symbol, version):
+    """Date of the newest stored prediction for (symbol, version), or None."""
+    return conn.execute("""
+        SELECT MAX(date) FROM signals WHERE symbol = ? AND model_version = ?
+    """, (symbol, version)).fetchone()[0]
+
+def has_signals(conn, symbol, version):
+    return conn.execute("""
+        SELECT 1 FROM signals WHERE symbol = ? AND model_version = ? LIMIT 1
+    """, (symbol, version)).fetchone() is not None
+
+def read_signals(conn, symbol, version, since=None):
+    """Buy/sell rows for (symbol, version) as [(date, close, prediction)], from 'since' on; holds are skipped."""
+    return conn.execute("""
+        SELECT date, close, prediction
+        FROM signals
+        WHERE symbol = ? AND model_version = ? AND prediction != 0 AND date >= ?
+        ORDER BY date ASC
+    """, (symbol, version, since or '')).fetchall()
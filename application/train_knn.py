@@ -1,33 +1,49 @@
 import os
+import sys
+import json
+import time
 import sqlite3
 import pandas as pd
-import pickle
+import features
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sklearn.neighbors import KNeighborsClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import GridSearchCV, TimeSeriesSplit, train_test_split
 from sklearn.metrics import accuracy_score
-
-DATABASE_PATH = 'data/historical_data.db'  # Adjust as needed
-TICKERS_CSV = 'tickers.csv'  # Path to your tickers.csv
-MODEL_DIR = 'models'  # Directory to save the models
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+import knn_artifact
+from features import FEATURE_COLS
+from signal_store import refresh_signals
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_PATH = os.path.join(BASE_DIR, 'data', 'historical_data.db')  # Adjust as needed
+TICKERS_CSV = os.path.join(BASE_DIR, 'tickers.csv')  # Path to your tickers.csv
+MODEL_DIR = os.path.join(BASE_DIR, 'models')  # Directory to save the models
+MANIFEST_PATH = os.path.join(MODEL_DIR, 'manifest.json')  # Per-ticker training metrics
 
 # Ensure the model directory exists
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-def load_data(symbol):
-    conn = sqlite3.connect(DATABASE_PATH)
-    df = pd.read_sql_query(f"""
-        SELECT date, close, volume,
-               ema_8, ema_13, ema_21, ema_34, ema_55, ema_89, ema_144, ema_200,
-               rsi_14, macd, macd_signal
-        FROM market_data
-        WHERE symbol='{symbol}'
-        ORDER BY date ASC
-    """, conn)
-    conn.close()
-
-    if df.empty:
-        return df
-
+MIN_ROWS = 50
+
+# Next-day move that counts as buy/sell (backtest.py sweeps alternatives)
+LABEL_THRESHOLD = 0.01
+
+# Walk-forward search space: scaling x metric x k
+CV_SPLITS = 4
+SCALERS = {
+    'none': 'passthrough',
+    'standard': StandardScaler(),
+    'minmax': MinMaxScaler(),
+}
+PARAM_GRID = {
+    'scale': list(SCALERS.values()),
+    'knn__metric': ['euclidean', 'manhattan'],
+    'knn__n_neighbors': [3, 5, 9, 15, 25],
+}
+
+def add_labels(df):
+    """Sort by date and add the next-day buy/hold/sell 'label' column."""
     df['date'] = pd.to_datetime(df['date'])
     df.sort_values('date', inplace=True)
     df.reset_index(drop=True, inplace=True)
@@ -40,57 +56,174 @@ def load_data(symbol):
     df.dropna(inplace=True)  # Remove last row with no future_close
 
     # Define a threshold for significant change (e.g., 1% of current price)
-    threshold = 0.01
+    threshold = LABEL_THRESHOLD
     df['label'] = 0  # Default to hold
     df.loc[(df['future_close'] > df['close'] * (1 + threshold)), 'label'] = 1  # Buy
     df.loc[(df['future_close'] < df['close'] * (1 - threshold)), 'label'] = -1  # Sell
 
     return df
 
-def train_knn_for_symbol(symbol):
-    df = load_data(symbol)
-    if len(df) < 50:
-        print(f"Not enough data to train KNN for {symbol}. Skipping...")
-        return None
+def load_data(symbol):
+    return load_panel([symbol]).get(symbol, pd.DataFrame())
+
+def load_panel(symbols):
+    """
+    Load the features of every symbol from the feature cache (features.py).
+    Returns {symbol: labeled DataFrame} (see add_labels).
+    """
+    conn = features.connect(DATABASE_PATH)
+    matrices = features.load_many(conn, symbols)
+    conn.close()
 
-    # Define features and labels
-    feature_cols = [
-        'close', 'volume',
-        'ema_8', 'ema_13', 'ema_21', 'ema_34', 'ema_55', 'ema_89', 'ema_144', 'ema_200',
-        'rsi_14', 'macd', 'macd_signal'
-    ]
-    X = df[feature_cols].fillna(0)  # Fill NaN with 0
-    y = df['label']
+    return {symbol: add_labels(matrix.frame()) for symbol, matrix in matrices.items()}
 
-    # Train-test split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+def scaler_name(scaler):
+    for name, candidate in SCALERS.items():
+        if candidate is scaler or type(candidate) is type(scaler):
+            return name
+    return str(scaler)
+
+def search_symbol(symbol, df, cv_splits=CV_SPLITS):
+    """
+    Walk-forward grid search for one symbol (runs in a worker process).
 
-    # Train KNN
-    knn = KNeighborsClassifier(n_neighbors=5)
-    knn.fit(X_train, y_train)
+    The last 20% of rows is held out as before; the search runs TimeSeriesSplit
+    folds over the first 80%, so every fold validates on days after the ones
+    it was fitted on. Returns (symbol, artifact fields of the best model
+    (see knn_artifact.from_sklearn), metrics dict).
+    """
+    X = df[FEATURE_COLS]  # NaN is already 0 (features.FEATURE_SPEC)
+    y = df['label']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
 
-    # Evaluate accuracy
-    y_pred = knn.predict(X_test)
-    acc = accuracy_score(y_test, y_pred)
-    print(f"KNN Accuracy for {symbol}: {acc * 100:.2f}%")
+    # The first fold trains on ~1/(splits+1) of the rows; k can't exceed that
+    grid = dict(PARAM_GRID)
+    max_k = len(X_train) // (cv_splits + 1)
+    grid['knn__n_neighbors'] = [k for k in PARAM_GRID['knn__n_neighbors'] if k <= max_k] or [1]
+
+    pipeline = Pipeline([('scale', 'passthrough'), ('knn', KNeighborsClassifier())])
+    search = GridSearchCV(pipeline, grid, cv=TimeSeriesSplit(n_splits=cv_splits),
+                          scoring='accuracy', n_jobs=1)
+    start = time.perf_counter()
+    search.fit(X_train, y_train)
+    search_seconds = time.perf_counter() - start
+
+    model = search.best_estimator_
+    start = time.perf_counter()
+    y_pred = model.predict(X_test)
+    predict_seconds = time.perf_counter() - start
+
+    fields = knn_artifact.from_sklearn(model)
+    fields['train_range'] = {
+        "first_date": df['date'].iloc[0].strftime('%Y-%m-%d'),
+        "last_date": df['date'].iloc[len(X_train) - 1].strftime('%Y-%m-%d'),
+    }
+    best = search.best_params_
+    metrics = {
+        "label_threshold": LABEL_THRESHOLD,
+        "k": best['knn__n_neighbors'],
+        "metric": best['knn__metric'],
+        "scaling": scaler_name(best['scale']),
+        "cv_accuracy": round(float(search.best_score_), 4),
+        "test_accuracy": round(float(accuracy_score(y_test, y_pred)), 4),
+        "candidates": len(search.cv_results_['params']),
+        "search_seconds": round(search_seconds, 3),
+        "fit_seconds": round(float(search.refit_time_), 4),
+        "predict_ms_per_row": round(predict_seconds * 1000 / max(len(X_test), 1), 4),
+        "train_rows": len(X_train),
+        "test_rows": len(X_test),
+        "last_date": df['date'].iloc[-1].strftime('%Y-%m-%d'),
+    }
+    return symbol, fields, metrics
+
+def save_model(symbol, fields, metrics):
+    """
+    Write the model artifact (see knn_artifact.py) and precompute its predictions
+    (served by /api/knn-signals). Returns the loaded artifact.
+    """
+    meta = knn_artifact.save(MODEL_DIR, symbol, features=FEATURE_COLS, metrics=metrics, **fields)
+    metrics['version'] = meta['version']
+    metrics['model_bytes'] = knn_artifact.size_on_disk(MODEL_DIR, symbol)
+
+    model = knn_artifact.load(MODEL_DIR, symbol)
+    conn = sqlite3.connect(DATABASE_PATH)
+    refresh_signals(conn, symbol, model, model.version)
+    conn.close()
+    return model
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+def write_manifest(results):
+    """Merge this run's {symbol: metrics} into models/manifest.json."""
+    manifest = load_manifest()
+    manifest.update(results)
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as manifest_file:
+        json.dump(dict(sorted(manifest.items())), manifest_file, indent=2)
+
+def print_metrics(symbol, metrics):
+    print(f"{symbol:<6} k={metrics['k']:<3} {metrics['metric']:<9} scale={metrics['scaling']:<8} "
+          f"cv {metrics['cv_accuracy'] * 100:5.1f}%  test {metrics['test_accuracy'] * 100:5.1f}%  "
+          f"search {metrics['search_seconds']:.2f}s  {metrics['model_bytes'] / 1024:.0f} KB")
 
-    # Save the model to file
-    model_path = os.path.join(MODEL_DIR, f"{symbol}_knn.pkl")
-    with open(model_path, 'wb') as model_file:
-        pickle.dump(knn, model_file)
+def train_knn_for_symbol(symbol):
+    df = load_data(symbol)
+    if len(df) < MIN_ROWS:
+        print(f"Not enough data to train KNN for {symbol}. Skipping...")
+        return None
 
-    return knn
+    symbol, fields, metrics = search_symbol(symbol, df)
+    model = save_model(symbol, fields, metrics)
+    write_manifest({symbol: metrics})
+    print_metrics(symbol, metrics)
+    return model
 
-def train_knn_for_all_tickers():
-    # Load tickers from CSV
+def load_tickers():
     if not os.path.exists(TICKERS_CSV):
         print(f"ERROR: {TICKERS_CSV} does not exist.")
-        return
-
-    tickers = pd.read_csv(TICKERS_CSV)['Symbol'].dropna().tolist()
-    for symbol in tickers:
-        print(f"Training KNN for {symbol}...")
-        train_knn_for_symbol(symbol)
+        return []
+    return pd.read_csv(TICKERS_CSV)['Symbol'].dropna().tolist()
+
+def train_knn_for_all_tickers(symbols=None, workers=None):
+    """
+    Train every ticker: load all features from the cache, run the per-symbol
+    searches on a process pool ('workers' processes, default: CPU count), then
+    save models, signals and the manifest from this process (the only DB writer).
+    """
+    symbols = symbols or load_tickers()
+    if not symbols:
+        return {}
+
+    started = time.perf_counter()
+    panel = load_panel(symbols)
+    for symbol in symbols:
+        if len(panel.get(symbol, ())) < MIN_ROWS:
+            print(f"Not enough data to train KNN for {symbol}. Skipping...")
+            panel.pop(symbol, None)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(search_symbol, symbol, df): symbol for symbol, df in panel.items()}
+        for future in as_completed(futures):
+            try:
+                symbol, fields, metrics = future.result()
+            except Exception as e:
+                print(f"{futures[future]}: training failed: {e}")
+                continue
+            save_model(symbol, fields, metrics)
+            results[symbol] = metrics
+            print_metrics(symbol, metrics)
+
+    write_manifest(results)
+    print(f"Trained {len(results)} models in {time.perf_counter() - started:.2f}s "
+          f"(manifest: {MANIFEST_PATH})")
+    return results
 
 if __name__ == "__main__":
-    train_knn_for_all_tickers()
+    # `python train_knn.py [SYMBOLS...]` trains the given symbols (default: tickers.csv);
+    # TRAIN_WORKERS sets the process pool size
+    workers = int(os.getenv("TRAIN_WORKERS", "0")) or None
+    train_knn_for_all_tickers(sys.argv[1:] or None, workers=workers)
@@ -1,125 +1,490 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Blueprint, Flask, Response, jsonify, request, render_template, stream_with_context
+import gc
+import math
 import os
-import pickle
-import sqlite3
-import pandas as pd
+import sys
+import json
+import time
 
-app = Flask(__name__)
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'historical_data.db')
-MODEL_DIR = 'models'
+# Shared modules (signal_store, ...) live in application/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
+from db_pool import ConnectionPool, SymbolList
+from model_registry import ModelRegistry
+import backtest
+import downsample
+import encoding
+import features
+import intraday_store
+import live_events
+import market_summary
+import schema
+import sentiment_store
+import signal_store
 
-@app.route('/')
+# Routes live on a blueprint; create_app() builds the Flask app around it
+dashboard = Blueprint('dashboard', __name__)
+DATABASE_PATH = os.getenv("DATABASE_PATH") or os.path.join(os.path.dirname(__file__), '..', 'data', 'historical_data.db')
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+# Models are unpickled once per process and reloaded when the .pkl changes
+MODEL_CACHE_MB = int(os.getenv("MODEL_CACHE_MB", "256"))
+MODEL_REGISTRY = ModelRegistry(MODEL_DIR, max_bytes=MODEL_CACHE_MB * 1024 * 1024)
+
+# Long-lived read-only WAL connections instead of a connect() per request
+DB_POOL = ConnectionPool(DATABASE_PATH,
+                         size=int(os.getenv("DB_POOL_SIZE", "8")),
+                         mmap_mb=int(os.getenv("DB_MMAP_MB", "256")),
+                         cache_mb=int(os.getenv("DB_CACHE_MB", "32")))
+SYMBOLS = SymbolList(DB_POOL)
+
+# One poller per process turns the writers' live_events rows into stream pushes
+LIVE_EVENTS = live_events.EventHub(DB_POOL.reader)
+STREAM_KEEPALIVE_SECONDS = 15
+
+PRELOADED = {}  # what preload() loaded, for /readyz
+
+
+def create_app(preload_data=False):
+    """
+    The WSGI application. With preload_data, every model and feature matrix is
+    loaded first (see preload); wsgi.py does this for gunicorn and waitress,
+    while `python app.py` starts the dev server without it.
+    """
+    app = Flask(__name__)
+    app.register_blueprint(dashboard)
+    if preload_data:
+        preload()
+    return app
+
+def preload():
+    """
+    Load every model and the feature matrices of every symbol into this process,
+    then close its database connections. Run in the gunicorn master before it
+    forks (preload_app), so the workers start with all of it in shared
+    copy-on-write pages instead of each loading its own copy on first request.
+    gc.freeze() keeps the workers' garbage collector from writing to (and so
+    copying) those pages.
+    """
+    start = time.perf_counter()
+    models = MODEL_REGISTRY.warm()
+    with DB_POOL.reader() as conn:
+        matrices = features.preload(conn, market_summary.read_symbols(conn))
+    DB_POOL.close()
+    gc.freeze()
+    PRELOADED.update(models=models, feature_symbols=len(matrices),
+                     feature_rows=sum(len(m) for m in matrices.values()),
+                     seconds=round(time.perf_counter() - start, 3))
+    print(f"Preloaded {models} models and {len(matrices)} feature matrices "
+          f"in {PRELOADED['seconds']:.3f}s (pid {os.getpid()})")
+
+@dashboard.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests (no I/O)."""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+@dashboard.route('/readyz')
+def readyz():
+    """
+    Readiness: the database answers through the pool and has symbols. 503 until
+    it does, so a load balancer holds traffic back from a worker that can't serve.
+    """
+    try:
+        with DB_POOL.reader() as conn:
+            version = schema.schema_version(conn)
+            symbols = len(SYMBOLS.get())
+    except Exception as e:
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    if not symbols:
+        return jsonify({"status": "unavailable", "error": "no symbols in the database"}), 503
+    return jsonify({"status": "ready", "pid": os.getpid(), "schema_version": version,
+                    "symbols": symbols, "preloaded": PRELOADED})
+
+@dashboard.route('/')
 def index():
     return render_template('index.html')
 
 def load_model(symbol):
-    model_path = os.path.join(MODEL_DIR, f"{symbol}_knn.pkl")
-    if not os.path.exists(model_path):
-        return None
-    with open(model_path, 'rb') as model_file:
-        model = pickle.load(model_file)
-    return model
-
-@app.route('/api/knn-signals/<symbol>', methods=['GET'])
+    return MODEL_REGISTRY.get(symbol)
+
+@dashboard.route('/api/model-cache/stats')
+def get_model_cache_stats():
+    """Hit/miss/load-time counters for the model cache."""
+    return jsonify(MODEL_REGISTRY.stats())
+
+@dashboard.route('/api/db-pool/stats')
+def get_db_pool_stats():
+    """Open/idle connections and time spent waiting for one."""
+    return jsonify(DB_POOL.stats())
+
+@dashboard.route('/api/knn-signals/<symbol>', methods=['GET'])
 def get_knn_signals(symbol):
-    """Return predicted buy/sell signals using the KNN model for the selected symbol."""
-    model = load_model(symbol)
+    """
+    Return predicted buy/sell signals using the KNN model for the selected symbol.
+    Predictions are read from the signals table; bars newer than the stored
+    predictions (or a freshly retrained model) are predicted once and persisted.
+    """
+    model, version = MODEL_REGISTRY.lookup(symbol)
     if model is None:
         return jsonify({"error": f"No model found for {symbol}"}), 404
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    df = pd.read_sql_query(f"""
-        SELECT date, close, volume,
-               ema_8, ema_13, ema_21, ema_34, ema_55, ema_89, ema_144, ema_200,
-               rsi_14, macd, macd_signal
-        FROM market_data
-        WHERE symbol = ?
-        ORDER BY date ASC
-    """, conn, params=(symbol,))
-    conn.close()
-
-    if df.empty:
+    rows = current_signals(symbol, model, version)
+    if rows is None:
         return jsonify({"error": f"No data found for {symbol}"}), 404
 
-    feature_cols = [
-        "close", "volume",
-        "ema_8", "ema_13", "ema_21", "ema_34", "ema_55", "ema_89", "ema_144", "ema_200",
-        "rsi_14", "macd", "macd_signal"
+    # Holds (label == 0) are not stored in 'rows'
+    signals = [
+        {"date": date, "price": close, "type": "buy" if prediction == 1 else "sell"}
+        for date, close, prediction in rows
     ]
-    df["prediction"] = model.predict(df[feature_cols].fillna(0))
+    return jsonify(signals)
 
-    # Filter out "hold" signals (label == 0)
-    signals = []
-    for _, row in df.iterrows():
-        if row["prediction"] == 1:  # Buy
-            signals.append({"date": row["date"], "price": row["close"], "type": "buy"})
-        elif row["prediction"] == -1:  # Sell
-            signals.append({"date": row["date"], "price": row["close"], "type": "sell"})
+def current_signals(symbol, model, version):
+    """
+    Buy/sell rows [(date, close, prediction)] of 'model' for 'symbol', predicting
+    and storing bars newer than the stored predictions first. None if the
+    model has no predictions at all.
+    """
+    with DB_POOL.reader() as conn:
+        summary = market_summary.read_summary(conn, symbol)
+        last_signal = signal_store.last_signal_date(conn, symbol, version)
 
-    return jsonify(signals)
+    # Only take the writer when there are bars the model hasn't predicted yet
+    if summary and (last_signal is None or summary['last_date'] > last_signal):
+        with DB_POOL.writer() as conn:
+            signal_store.refresh_signals(conn, symbol, model, version)
+
+    with DB_POOL.reader() as conn:
+        rows = signal_store.read_signals(conn, symbol, version)
+        if rows or signal_store.has_signals(conn, symbol, version):
+            return rows
+    return None
+
+
+@dashboard.route('/api/backtest/<symbol>')
+def get_backtest(symbol):
+    """
+    Backtest the symbol's KNN signals (see backtest.py): metrics plus the daily
+    position and equity series.
 
+    Query options:
+      threshold=0.01   label threshold to re-vote the neighbours at (default:
+                       the one the model was trained with)
+      short=1          trade sell signals as shorts (default: long only)
+      cost_bps=5       transaction cost per unit of turnover (default 5)
+      in_sample=1      also trade the model's training days
+      grid=1           add metrics for every threshold x long/short x cost in backtest.py's defaults
+    """
+    params = {}
+    for name in ('threshold', 'cost_bps'):
+        value = request.args.get(name)
+        if value is not None:
+            try:
+                params[name] = float(value)
+            except ValueError:
+                params[name] = math.nan
+            if not math.isfinite(params[name]):
+                return jsonify({"error": f"Invalid {name} {value!r}; expected a finite number"}), 400
+
+    model, _ = MODEL_REGISTRY.lookup(symbol)
+    if model is None:
+        return jsonify({"error": f"No model found for {symbol}"}), 404
 
+    with DB_POOL.reader() as conn:
+        matrix = features.load_features(conn, symbol)
+    inputs = backtest.prepare(symbol, model, matrix, in_sample=request.args.get('in_sample') == '1')
+    if inputs is None:
+        return jsonify({"error": f"Not enough data to backtest {symbol}"}), 404
 
-@app.route('/api/symbols')
+    threshold = params.get('threshold')
+    if threshold is None:
+        threshold = inputs.trained_threshold
+    if threshold is None:
+        threshold = backtest.TRAINED_THRESHOLD
+    short = request.args.get('short') == '1'
+    cost_bps = params.get('cost_bps', 5.0)
+
+    if request.args.get('grid') == '1':
+        thresholds = sorted(set(backtest.DEFAULT_THRESHOLDS) | {threshold})
+        shorts, costs = [False, True], sorted(set(backtest.DEFAULT_COSTS_BPS) | {cost_bps})
+    else:
+        thresholds, shorts, costs = [threshold], [short], [cost_bps]
+
+    result = backtest.run([inputs], thresholds, shorts, costs, workers=1)
+    body = result.result(symbol, threshold, short, cost_bps)
+    if len(thresholds) > 1:
+        body['grid'] = result.table().drop(columns=['symbol']).to_dict(orient='records')
+    return jsonify(body)
+
+@dashboard.route('/api/sentiment/<symbol>')
+def get_sentiment(symbol):
+    """Daily sentiment aggregates for the symbol (sentiment_store.py), oldest first."""
+    with DB_POOL.reader() as conn:
+        daily = sentiment_store.read_daily(conn, symbol)
+    daily['mean_score'] = daily['mean_score'].astype(object).where(daily['mean_score'].notna(), None)
+    return jsonify(daily.drop(columns=['day']).to_dict(orient='records'))
+
+@dashboard.route('/api/symbols')
 def get_symbols():
-    """Return distinct symbols in the DB."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT symbol FROM market_data ORDER BY symbol ASC;")
-    rows = cursor.fetchall()
-    conn.close()
-    symbols = [r[0] for r in rows]
-    return jsonify(symbols)
-
-@app.route('/api/market-data/<symbol>')
+    """Return distinct symbols in the DB (cached until the ingester adds bars)."""
+    return jsonify(SYMBOLS.get())
+
+@dashboard.route('/api/latest-bar/<symbol>')
+def get_latest_bar(symbol):
+    """Latest OHLCV bar plus first/last date and bar count, from symbol_summary."""
+    with DB_POOL.reader() as conn:
+        summary = market_summary.read_summary(conn, symbol)
+    if summary is None:
+        return jsonify({"error": f"No data found for {symbol}"}), 404
+    return jsonify(summary)
+
+MARKET_DATA_COLUMNS = [
+    'date',
+    'open', 'high', 'low', 'close', 'volume',
+    'ma_50', 'ma_200', 'rsi_14', 'macd', 'macd_signal',
+    'bb_upper', 'bb_mid', 'bb_lower',
+    'ema_8', 'ema_13', 'ema_21', 'ema_34', 'ema_55', 'ema_89', 'ema_144', 'ema_200'
+]
+CLOSE = MARKET_DATA_COLUMNS.index('close')
+
+@dashboard.route('/api/market-data/<symbol>')
 def get_market_data(symbol):
-    """Return date, close, and the new indicator columns (multi-EMA) for the selected symbol."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    """
+    Return date, close, and the new indicator columns (multi-EMA) for the selected symbol.
+
+    Query options:
+      format=columnar  one array per field instead of one object per row
+      float32=1        (columnar) write floats at float32 precision
+      since=YYYY-MM-DD only rows on or after this date
+      limit=N          only the N most recent rows
+      interval=1d      1d (default) reads the daily table; 1m/5m/15m/30m/1h read
+                       the intraday store (OHLCV only, 'date' in New York time,
+                       since=YYYY-MM-DD[ HH:MM]), each month resampled from
+                       the coarsest stored interval that divides the one asked for
+      width=N          chart decimation: about N rows picked by LTTB on the
+                       close (downsample.py), plus (1d) every day with a
+                       buy/sell signal so no marker loses its bar
+    Responses carry an ETag built from the symbol's summary row (latest date,
+    row count and write revision; If-None-Match -> 304) and are gzip/brotli compressed when the client accepts it.
+    """
+    fmt = request.args.get('format', 'rows')
+    float32 = request.args.get('float32') == '1'
+    since = request.args.get('since') or None
+    limit = request.args.get('limit')
+    interval = request.args.get('interval', '1d')
+    width = request.args.get('width')
+    if interval not in intraday_store.INTERVAL_SECONDS:
+        return jsonify({"error": f"Unknown interval {interval}; expected one of "
+                                 f"{', '.join(intraday_store.INTERVAL_SECONDS)}"}), 400
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            return jsonify({"error": f"Invalid limit {limit!r}; expected a positive integer"}), 400
+        limit = int(limit)
+    if width is not None:
+        if not width.isdigit() or int(width) < 1:
+            return jsonify({"error": f"Invalid width {width!r}; expected a positive integer"}), 400
+        width = int(width)
+    if since is not None:
+        try:
+            schema.to_day(since) if interval == '1d' else intraday_store.to_epoch(since)
+        except ValueError:
+            expected = 'YYYY-MM-DD' if interval == '1d' else 'YYYY-MM-DD[ HH:MM]'
+            return jsonify({"error": f"Invalid since {since!r}; expected {expected}"}), 400
+    if interval != '1d':
+        return get_intraday_data(symbol, interval, fmt, float32, since, limit, width)
+
+    # The signal days kept by 'width' depend on the model as well as the bars
+    model, model_version = MODEL_REGISTRY.lookup(symbol) if width else (None, None)
+
+    with DB_POOL.reader() as conn:
+        # Cheap freshness check (one summary row) before reading any rows
+        summary = market_summary.read_summary(conn, symbol) or {}
+        version = f"{summary.get('last_date')}-{summary.get('bar_count', 0)}-{summary.get('revision', 0)}"
+        etag = f'"{symbol}-{version}-{fmt}-{int(float32)}-{since}-{limit}-{width}-{model_version}"'
+        if request.headers.get('If-None-Match') == etag:
+            return '', 304, {'ETag': etag}
+
+        rows = read_market_data(conn, symbol, since, limit)
+
+    total = len(rows)
+    if width and total > width:
+        signal_dates = {date for date, _, _ in current_signals(symbol, model, model_version) or []} if model else set()
+        dates = [row[0] for row in rows]
+        keep = [i for i, date in enumerate(dates) if date in signal_dates]
+        picked = downsample.lttb_indices(schema.to_days(dates), [row[CLOSE] for row in rows], width, keep)
+        rows = [rows[i] for i in picked]
+
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if fmt == 'columnar':
+        columns = dict(zip(MARKET_DATA_COLUMNS, zip(*rows))) if rows else {c: [] for c in MARKET_DATA_COLUMNS}
+        body = encoding.columnar_json(columns, meta={"symbol": symbol, "rows": len(rows), "total": total},
+                                      float32=float32)
+    else:
+        body = json.dumps([dict(zip(MARKET_DATA_COLUMNS, row)) for row in rows])
+    return encoding.negotiated_response(body, request, headers=headers)
+
+INTRADAY_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+def get_intraday_data(symbol, interval, fmt, float32, since, limit, width=None):
+    """get_market_data for an intraday interval, from intraday_store.py."""
+    etag = (f'"{symbol}-{interval}-{intraday_store.version(symbol, interval)}'
+            f'-{fmt}-{int(float32)}-{since}-{limit}-{width}"')
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304, {'ETag': etag}
+
+    bars = intraday_store.read_bars(symbol, interval, start=since, limit=limit)
+    total = len(bars)
+    if width and total > width:
+        bars = bars.take(downsample.lttb_indices(bars.ts, bars.close, width))
+    columns = {'date': bars.dates()}
+    columns.update((field, getattr(bars, field).tolist()) for field in INTRADAY_COLUMNS[1:])
+
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if fmt == 'columnar':
+        meta = {"symbol": symbol, "interval": interval, "rows": len(bars), "total": total}
+        body = encoding.columnar_json(columns, meta=meta, float32=float32)
+    else:
+        body = json.dumps([dict(zip(INTRADAY_COLUMNS, row)) for row in zip(*columns.values())])
+    return encoding.negotiated_response(body, request, headers=headers)
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+@dashboard.route('/api/market-data/<symbol>/page')
+def get_market_data_page(symbol):
+    """
+    One page of the data table, newest rows first.
+
+    Query options:
+      size=N        rows per page (default PAGE_SIZE, at most MAX_PAGE_SIZE)
+      cursor=...    'next_cursor' of the previous page; omitted for the newest page
+      interval=1d   as for /api/market-data
+
+    Pages are keyset reads (rows older than the cursor's bar, an index range
+    scan on (symbol, day)), so deep pages cost the same as the first and rows
+    written meanwhile don't shift them. 'next_cursor' is null on the last page.
+    """
+    size = min(max(request.args.get('size', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    interval = request.args.get('interval', '1d')
+    if interval not in intraday_store.INTERVAL_SECONDS:
+        return jsonify({"error": f"Unknown interval {interval}; expected one of "
+                                 f"{', '.join(intraday_store.INTERVAL_SECONDS)}"}), 400
+    if cursor is not None and not cursor.isdigit():
+        return jsonify({"error": f"Invalid cursor {cursor!r}"}), 400
+    before = int(cursor) if cursor else None
+
+    # One row past the page tells whether another page follows
+    if interval == '1d':
+        where = "symbol = ?" + (" AND day < ?" if before is not None else "")
+        params = [symbol] + ([before] if before is not None else []) + [size + 1]
+        with DB_POOL.reader() as conn:
+            found = conn.execute(f"SELECT day, {', '.join(MARKET_DATA_COLUMNS)} FROM market_data "
+                                 f"WHERE {where} ORDER BY day DESC LIMIT ?", params).fetchall()
+        keys = [row[0] for row in found]
+        rows = [dict(zip(MARKET_DATA_COLUMNS, row[1:])) for row in found[:size]]
+    else:
+        bars = intraday_store.read_bars(symbol, interval, end=before, limit=size + 1)
+        bars = bars.take(slice(None, None, -1))
+        keys = bars.ts.tolist()
+        columns = [bars.dates()] + [getattr(bars, field).tolist() for field in INTRADAY_COLUMNS[1:]]
+        rows = [dict(zip(INTRADAY_COLUMNS, row)) for row in zip(*columns)][:size]
+
+    next_cursor = str(keys[size - 1]) if len(keys) > size else None
+    body = json.dumps({"symbol": symbol, "interval": interval, "rows": rows, "next_cursor": next_cursor})
+    return encoding.negotiated_response(body, request, headers={'Cache-Control': 'no-cache'})
+
+@dashboard.route('/api/stream')
+def stream_updates():
+    """
+    Server-sent events with the bars and signals written after the page loaded.
+
+    Query options:
+      symbols=AAPL,MSFT  symbols to follow
+      last_id=N          resume after event N (browsers send Last-Event-ID on reconnect)
+
+    Each 'bars' event carries the columnar MARKET_DATA_COLUMNS rows from the
+    earliest day the writers touched, 'signals' the buy/sell rows of the
+    current model from that day on; the client replaces rows it already has
+    and appends the rest. A comment line goes out every
+    STREAM_KEEPALIVE_SECONDS so proxies keep the connection open.
+    """
+    symbols = [s for s in request.args.get('symbols', '').upper().split(',') if s]
+    if not symbols:
+        return jsonify({"error": "symbols is required"}), 400
+    resume = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+
+    # Subscribe before replaying so nothing published in between is lost
+    subscription, last_id = LIVE_EVENTS.subscribe(symbols)
+    backlog = []
+    if resume and resume.isdigit():
+        with DB_POOL.reader() as conn:
+            backlog = live_events.read_all_events(conn, int(resume), symbols)
+        last_id = int(resume)
+
+    def generate():
+        sent = last_id
+        try:
+            yield f"retry: 3000\nid: {sent}\n\n"
+            events = backlog
+            while True:
+                events = [event for event in events if event[0] > sent]
+                if events:
+                    sent = events[-1][0]
+                    with DB_POOL.reader() as conn:
+                        for (symbol, kind), first_day in live_events.coalesce(events).items():
+                            payload = live_payload(conn, symbol, kind, schema.from_day(first_day))
+                            if payload is not None:
+                                yield f"id: {sent}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n"
+                events = subscription.get(STREAM_KEEPALIVE_SECONDS)
+                if not events:
+                    yield ": keepalive\n\n"
+        finally:
+            LIVE_EVENTS.unsubscribe(subscription)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+def live_payload(conn, symbol, kind, since):
+    """Body of one stream event: 'symbol's rows of 'kind' from date 'since' on."""
+    if kind == 'signals':
+        model, version = MODEL_REGISTRY.lookup(symbol)
+        if model is None:
+            return None
+        signals = [{"date": date, "price": close, "type": "buy" if prediction == 1 else "sell"}
+                   for date, close, prediction in signal_store.read_signals(conn, symbol, version, since)]
+        return {"symbol": symbol, "since": since, "signals": signals}
+    rows = read_market_data(conn, symbol, since)
+    columns = dict(zip(MARKET_DATA_COLUMNS, zip(*rows))) if rows else {c: [] for c in MARKET_DATA_COLUMNS}
+    return {"symbol": symbol, "since": since, "columns": columns}
+
+@dashboard.route('/api/stream/stats')
+def get_stream_stats():
+    """Open streams and polls of the live_events table in this process."""
+    return jsonify(LIVE_EVENTS.stats())
+
+def read_market_data(conn, symbol, since=None, limit=None):
+    """MARKET_DATA_COLUMNS rows for 'symbol', oldest first."""
     # SELECT the columns you want, including the new EMAs
-    cursor.execute("""
-        SELECT date,
-            open, high, low, close, volume,
-            ma_50, ma_200, rsi_14, macd, macd_signal,
-            bb_upper, bb_mid, bb_lower,
-            ema_8, ema_13, ema_21, ema_34, ema_55, ema_89, ema_144, ema_200
-        FROM market_data
-        WHERE symbol = ?
-        ORDER BY date ASC
-    """, (symbol,))
-    rows = cursor.fetchall()
-    conn.close()
-
-    data_list = []
-    for row in rows:
-        data_list.append({
-            "date": row[0],
-            "open": row[1],
-            "high": row[2],
-            "low": row[3],
-            "close": row[4],
-            "volume": row[5],
-            "ma_50": row[6],
-            "ma_200": row[7],
-            "rsi_14": row[8],
-            "macd": row[9],
-            "macd_signal": row[10],
-            "bb_upper": row[11],
-            "bb_mid": row[12],
-            "bb_lower": row[13],
-            "ema_8": row[14],
-            "ema_13": row[15],
-            "ema_21": row[16],
-            "ema_34": row[17],
-            "ema_55": row[18],
-            "ema_89": row[19],
-            "ema_144": row[20],
-            "ema_200": row[21]
-        })
-
-    return jsonify(data_list)
+    where = "symbol = ?"
+    params = [symbol]
+    if since:
+        # Filter on the epoch day so SQLite range-scans the (symbol, day) key
+        where += " AND day >= ?"
+        params.append(schema.to_day(since))
+    query = f"SELECT {', '.join(MARKET_DATA_COLUMNS)} FROM market_data WHERE {where}"
+    if limit:
+        # Newest N rows, returned oldest first
+        query = f"SELECT * FROM ({query} ORDER BY day DESC LIMIT ?) ORDER BY date ASC"
+        params.append(limit)
+    else:
+        query += " ORDER BY day ASC"
+    return conn.execute(query, params).fetchall()
 
 if __name__ == '__main__':
+    # Development only; production goes through wsgi.py (gunicorn or waitress)
+    # Set PREWARM_MODELS=1 to load every model before serving
+    if os.getenv("PREWARM_MODELS") == "1":
+        print(f"Pre-warmed {MODEL_REGISTRY.warm()} models.")
     # Run your Flask dev server
-    app.run(debug=True)
+    create_app().run(debug=True)
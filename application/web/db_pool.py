@@ -0,0 +1,244 @@
+"""
+db_pool.py
+----------
+SQLite connections for the web app.
+
+Opening a connection per request costs a file open, a schema parse and an
+empty page cache every time. Instead, each worker process keeps a small
+pool of read-only connections (WAL, so readers never block the ingester or
+each other) with a large page cache and memory-mapped I/O, plus a single
+writable connection for the few writes the API does (extending stored
+signals). Connections live for the whole process, so sqlite3's per-connection
+statement cache keeps the route queries prepared between requests.
+
+The pool is fork-aware: a worker that inherits a pool from its parent
+(gunicorn --preload) opens its own connections on first use. The parent
+should close() its connections before forking (app.preload does).
+
+`python db_pool.py bench [THREADS] [REQUESTS]` compares connect-per-request
+with the pool on the symbol list and latest-bar lookups.
+"""
+
+import os
+import pathlib
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Shared modules (market_summary, ...) live in application/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import market_summary
+import schema
+import signal_store
+
+def read_pragmas(mmap_mb, cache_mb):
+    return [
+        "PRAGMA query_only=1",
+        f"PRAGMA mmap_size={mmap_mb * 1024 * 1024}",
+        f"PRAGMA cache_size={-cache_mb * 1024}",  # negative = KiB
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+WRITE_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+]
+
+class ConnectionPool:
+    def __init__(self, db_path, size=8, mmap_mb=256, cache_mb=32, busy_timeout=5.0):
+        self.db_path = os.path.abspath(db_path)
+        self.size = size
+        self.mmap_mb = mmap_mb
+        self.cache_mb = cache_mb
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()  # LIFO: reuse the connection with the warmest cache
+        self._opened = 0
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._prepared = False
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def _check_pid(self):
+        # Connections must not cross a fork; the child starts a fresh pool
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def prepare(self):
+        """
+        One-time setup with a writable connection: switch the database to WAL,
+        migrate the schema and make sure the summary, signals and live_events
+        tables exist, so the read-only connections never have to create anything.
+        """
+        self._check_pid()
+        if self._prepared:
+            return
+        with self._lock:
+            if self._prepared:
+                return
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            schema.migrate(conn)
+            market_summary.ensure_summary_tables(conn)
+            signal_store.ensure_signals_table(conn)
+            conn.close()
+            self._prepared = True
+
+    def _open_reader(self):
+        uri = pathlib.Path(self.db_path).as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, timeout=self.busy_timeout,
+                               check_same_thread=False, cached_statements=256)
+        for pragma in read_pragmas(self.mmap_mb, self.cache_mb):
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection: `with pool.reader() as conn: ...`"""
+        self.prepare()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._opened < self.size:
+                    self._opened += 1
+                    conn = self._open_reader()
+            if conn is None:
+                # Pool exhausted: wait for a connection to come back
+                start = time.perf_counter()
+                conn = self._idle.get()
+                with self._lock:
+                    self.waits += 1
+                    self.wait_seconds += time.perf_counter() - start
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """The process's single writable connection, held exclusively while in use."""
+        self.prepare()
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                               check_same_thread=False)
+                for pragma in WRITE_PRAGMAS:
+                    self._writer.execute(pragma)
+            yield self._writer
+
+    def close(self):
+        """
+        Close the idle readers and the writer; the pool reopens connections on
+        next use. Call before forking so no open SQLite handle crosses the fork.
+        """
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": self._idle.qsize(),
+                "waits": self.waits,
+                "wait_ms_total": round(self.wait_seconds * 1000, 3),
+                "mmap_mb": self.mmap_mb,
+                "cache_mb": self.cache_mb,
+            }
+
+class SymbolList:
+    """
+    The symbol list, cached per process. It is re-read from symbol_summary only
+    when the ingester has written bars since (db_meta.bars_generation changed).
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._symbols = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self.pool.reader() as conn:
+            generation = market_summary.bars_generation(conn)
+            if self._symbols is not None and generation == self._generation:
+                return self._symbols
+            symbols = market_summary.read_symbols(conn)
+        with self._lock:
+            self._symbols, self._generation = symbols, generation
+        return symbols
+
+def benchmark(threads=16, requests=200):
+    """
+    'threads' concurrent clients each doing 'requests' symbol-list + latest-bar
+    lookups, first with a new connection and full-table queries per request
+    (the old routes), then through the pool and summary tables.
+    """
+    import tempfile
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
+
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'historical_data.db')
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, 'bench.db')
+    shutil.copy(source, db_path)
+
+    def old_request(_):
+        start = time.perf_counter()
+        conn = sqlite3.connect(db_path)
+        symbols = [r[0] for r in conn.execute("SELECT DISTINCT symbol FROM market_data ORDER BY symbol ASC")]
+        conn.execute("SELECT MAX(date), COUNT(*) FROM market_data WHERE symbol = ?", (symbols[0],)).fetchone()
+        conn.close()
+        return time.perf_counter() - start
+
+    pool = ConnectionPool(db_path, size=threads)
+    symbol_list = SymbolList(pool)
+
+    def pooled_request(_):
+        start = time.perf_counter()
+        symbols = symbol_list.get()
+        with pool.reader() as conn:
+            market_summary.read_summary(conn, symbols[0])
+        return time.perf_counter() - start
+
+    try:
+        for label, func in [("connect per request", old_request), ("pool + summary", pooled_request)]:
+            func(0)  # warm-up
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                latencies = sorted(executor.map(func, range(threads * requests)))
+            wall = time.perf_counter() - start
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            print(f"{label:<20} {len(latencies) / wall:8.0f} req/s  p50 {p50:.2f} ms  p99 {p99:.2f} ms")
+        print(f"pool: {pool.stats()}")
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        benchmark(*(int(arg) for arg in sys.argv[2:4]))
@@ -0,0 +1,57 @@
+"""
+downsample.py
+-------------
+Chart decimation for the market-data API: Largest-Triangle-Three-Buckets.
+
+A chart a few hundred pixels wide can't show more than a point or two per
+pixel, so /api/market-data?width=N sends about N rows instead of the whole
+history. LTTB splits the series into N - 2 buckets and keeps, from each,
+the point forming the largest triangle with the point kept in the previous
+bucket and the average of the next bucket. Spikes and turning points
+survive, while flat stretches thin out.
+
+Rows named in 'keep' (the days with a buy/sell signal) are always part of
+the result on top of the N points, so no marker ends up without its bar.
+"""
+
+import numpy as np
+
+MIN_POINTS = 3
+
+def lttb_indices(x, y, points, keep=None):
+    """
+    Sorted indices of the rows to draw: about 'points' picked by LTTB on
+    (x, y), plus every index in 'keep'. Everything if 'points' covers the
+    series. 'x' must be increasing; NaNs in 'y' (e.g. an EMA's warm-up)
+    count as the bucket's lowest value.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    points = max(int(points), MIN_POINTS)
+    if n <= points:
+        return np.arange(n)
+    y = np.where(np.isnan(y), np.nanmin(y) if not np.isnan(y).all() else 0.0, y)
+
+    # Bucket b (1..points-2) covers rows edges[b-1]:edges[b]; first and last rows stand alone
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    # Average of every bucket, with the last row as the "bucket" after the final one
+    cx = np.add.reduceat(x[:-1], edges[:-1]) / np.diff(edges)
+    cy = np.add.reduceat(y[:-1], edges[:-1]) / np.diff(edges)
+    cx = np.append(cx[1:], x[-1])
+    cy = np.append(cy[1:], y[-1])
+
+    chosen = np.empty(points, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for b in range(points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        # Twice the triangle area (a, candidate, next bucket average)
+        area = np.abs((x[a] - cx[b]) * (by - y[a]) - (x[a] - bx) * (cy[b] - y[a]))
+        a = lo + int(area.argmax())
+        chosen[b + 1] = a
+
+    if keep is not None and len(keep):
+        chosen = np.union1d(chosen, np.asarray(keep, dtype=np.int64))
+    return chosen
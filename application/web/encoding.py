@@ -0,0 +1,72 @@
+"""
+encoding.py
+-----------
+Response helpers for the market-data API: columnar JSON and
+Accept-Encoding negotiation (brotli if the package is installed, else gzip).
+"""
+
+import gzip
+import json
+
+import numpy as np
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+# Don't bother compressing tiny bodies
+MIN_COMPRESS_BYTES = 1024
+
+def json_array(values, float32=False):
+    """
+    Encode one column as a JSON array.
+    Float columns go through NumPy: float32=True writes the shortest repr of
+    the float32 value (about 7 significant digits) instead of 17-digit doubles.
+    NaN/None become null.
+    """
+    arr = np.asarray(values)
+    if arr.dtype == object:
+        # Mixed None/float (SQL NULLs) -> float with NaN
+        try:
+            arr = arr.astype(float)
+        except (TypeError, ValueError):
+            return json.dumps(list(values))
+    if arr.dtype.kind == 'f':
+        if float32:
+            arr = arr.astype(np.float32)
+        text = arr.astype(str)
+        text[np.isnan(arr)] = 'null'
+        return '[' + ','.join(text.tolist()) + ']'
+    if arr.dtype.kind in 'iub':
+        return '[' + ','.join(arr.astype(str).tolist()) + ']'
+    return json.dumps(arr.tolist())
+
+def columnar_json(columns, meta=None, float32=False):
+    """{"meta"..., "columns": {name: [...]}} with each column encoded by json_array."""
+    parts = [f'{json.dumps(name)}:{json_array(values, float32)}' for name, values in columns.items()]
+    head = ''.join(f'{json.dumps(k)}:{json.dumps(v)},' for k, v in (meta or {}).items())
+    return '{' + head + '"columns":{' + ','.join(parts) + '}}'
+
+def negotiated_response(body, request, mimetype='application/json', headers=None):
+    """Build a Response, compressing 'body' with the best encoding the client accepts."""
+    data = body.encode('utf-8') if isinstance(body, str) else body
+    accepted = request.headers.get('Accept-Encoding', '')
+    encoding = None
+
+    if len(data) >= MIN_COMPRESS_BYTES:
+        if brotli is not None and 'br' in accepted:
+            data = brotli.compress(data, quality=5)
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            data = gzip.compress(data, compresslevel=6)
+            encoding = 'gzip'
+
+    response = Response(data, mimetype=mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    for key, value in (headers or {}).items():
+        response.headers[key] = value
+    return response
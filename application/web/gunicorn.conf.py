@@ -0,0 +1,35 @@
+"""
+gunicorn.conf.py
+----------------
+gunicorn settings for the dashboard API:
+
+  gunicorn -c web/gunicorn.conf.py wsgi:application     (from application/)
+
+preload_app imports wsgi.py, and with it loads every model and feature
+matrix, in the master before forking; the workers share those pages
+copy-on-write (see app.preload). Each worker then opens its own SQLite pool
+(db_pool.py), so DB_POOL_SIZE should be at least WEB_THREADS.
+
+gthread workers because /api/stream holds a thread per open browser tab;
+the stream's 15 s keepalive keeps it well inside 'timeout', which gunicorn
+applies to the worker heartbeat, not to one request.
+
+  BIND          address to listen on (0.0.0.0:8000)
+  WEB_WORKERS   worker processes (2 x CPUs + 1)
+  WEB_THREADS   threads per worker (8)
+"""
+
+import multiprocessing
+import os
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+errorlog = "-"
@@ -0,0 +1,115 @@
+"""
+loadtest.py
+-----------
+Requests/second and p50/p99 latency of the main API routes.
+
+  python loadtest.py [URL] [SECONDS] [CONCURRENCY]
+
+With a URL (e.g. http://127.0.0.1:8000 for gunicorn started with
+gunicorn.conf.py) the running server is measured. Without one (or with
+'local'), the app is served from this process, waitress if installed, else
+werkzeug's threaded server, against a copy of the fixture database
+data/historical_data.db, so runs are repeatable and never touch the committed
+file. Clients and server then share this process's GIL, so use the local
+mode to compare changes and a real server for capacity numbers.
+
+Each route gets SECONDS (10) of CONCURRENCY (8) clients requesting it in a
+loop, cycling through the symbols:
+
+  /api/symbols
+  /api/market-data/<symbol>               full daily history
+  /api/market-data/<symbol>?width=800     decimated for an 800 px chart
+  /api/knn-signals/<symbol>
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+FIXTURE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'historical_data.db')
+
+ROUTES = [
+    ('symbols', lambda symbol: '/api/symbols'),
+    ('market-data', lambda symbol: f'/api/market-data/{symbol}'),
+    ('market-data width=800', lambda symbol: f'/api/market-data/{symbol}?format=columnar&width=800'),
+    ('knn-signals', lambda symbol: f'/api/knn-signals/{symbol}'),
+]
+
+def serve_locally(db_path):
+    """Start the app on a free port in a daemon thread. Returns its base URL."""
+    os.environ["DATABASE_PATH"] = db_path  # read when app.py is imported
+    from app import create_app
+    app = create_app(preload_data=True)
+    try:
+        from waitress.server import create_server
+        server = create_server(app, host='127.0.0.1', port=0, threads=8)
+        port, run = server.effective_port, server.run
+        print("serving with waitress")
+    except ImportError:
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no access log per request
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        port, run = server.server_port, server.serve_forever
+        print("serving with werkzeug (threaded); pip install waitress for a production server")
+    threading.Thread(target=run, daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+def run_route(base_url, path_for, symbols, seconds, concurrency):
+    """Hammer one route; returns (requests, errors, sorted latencies in seconds, wall seconds)."""
+    deadline = time.perf_counter() + seconds
+
+    def client(index):
+        session = requests.Session()
+        latencies, errors, i = [], 0, index
+        while time.perf_counter() < deadline:
+            url = base_url + path_for(symbols[i % len(symbols)])
+            start = time.perf_counter()
+            response = session.get(url, headers={'Accept-Encoding': 'gzip'})
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+            i += 1
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies = np.sort(np.concatenate([np.array(lat) for lat, _ in results]))
+    return len(latencies), sum(err for _, err in results), latencies, wall
+
+def main(base_url=None, seconds=10, concurrency=8):
+    tmp = None
+    if base_url in (None, 'local'):
+        tmp = tempfile.mkdtemp()
+        db_path = os.path.join(tmp, 'loadtest.db')
+        shutil.copy(FIXTURE_DB, db_path)
+        base_url = serve_locally(db_path)
+    try:
+        ready = requests.get(f"{base_url}/readyz").json()
+        symbols = requests.get(f"{base_url}/api/symbols").json()
+        print(f"{base_url}: {ready['status']}, {len(symbols)} symbols, "
+              f"{seconds}s x {concurrency} clients per route")
+        for label, path_for in ROUTES:
+            requests.get(base_url + path_for(symbols[0]))  # warm-up
+            count, errors, latencies, wall = run_route(base_url, path_for, symbols, seconds, concurrency)
+            p50 = np.percentile(latencies, 50) * 1000
+            p99 = np.percentile(latencies, 99) * 1000
+            print(f"{label:<24} {count / wall:8.0f} req/s  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms"
+                  f"  ({count} requests, {errors} errors)")
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(args[0] if args else None,
+         int(args[1]) if len(args) > 1 else 10,
+         int(args[2]) if len(args) > 2 else 8)
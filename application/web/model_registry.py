@@ -0,0 +1,113 @@
+"""
+model_registry.py
+-----------------
+Process-wide cache for the per-symbol KNN models.
+
+Models are loaded once and kept in an LRU ordered dict. A model whose file
+mtime changed (retrained) is reloaded on the next request, and the least
+recently used models are evicted once the cache goes over its memory
+budget. Artifacts (knn_artifact.py) are memory-mapped, so loading one only
+parses its JSON header and the matrix pages are shared with the other
+workers; their size estimate is the mapped arrays. For legacy pickles the
+file size is used: a fitted KNeighborsClassifier is mostly its training
+matrix, which is what the pickle holds.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from signal_store import load_model_file, model_file_path
+
+class ModelRegistry:
+    def __init__(self, model_dir, max_bytes=256 * 1024 * 1024):
+        self.model_dir = model_dir
+        self.max_bytes = max_bytes
+        self._models = OrderedDict()  # symbol -> (model, version, mtime, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def model_path(self, symbol):
+        return model_file_path(symbol, self.model_dir)
+
+    def get(self, symbol):
+        """Return the model for 'symbol' (None if there is no model file)."""
+        return self.lookup(symbol)[0]
+
+    def lookup(self, symbol):
+        """Return (model, model_version) for 'symbol', or (None, None)."""
+        path = self.model_path(symbol)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._drop(symbol)
+            return None, None
+
+        with self._lock:
+            cached = self._models.get(symbol)
+            if cached is not None and cached[2] == stat.st_mtime:
+                self._models.move_to_end(symbol)
+                self.hits += 1
+                return cached[0], cached[1]
+
+        # Load outside the lock so one slow unpickle doesn't block other symbols
+        start = time.perf_counter()
+        model, version = load_model_file(symbol, self.model_dir)
+        elapsed = time.perf_counter() - start
+        if model is None:
+            return None, None
+
+        with self._lock:
+            self.misses += 1
+            self.load_seconds += elapsed
+            if symbol in self._models:
+                self.reloads += 1
+                self._drop(symbol)
+            size = getattr(model, 'nbytes', stat.st_size)
+            self._models[symbol] = (model, version, stat.st_mtime, size)
+            self._bytes += size
+            self._evict()
+        return model, version
+
+    def warm(self, symbols=None):
+        """Load every model in model_dir (or just 'symbols') ahead of the first request."""
+        if symbols is None:
+            if not os.path.isdir(self.model_dir):
+                return 0
+            symbols = sorted({name.rsplit('_knn.', 1)[0] for name in os.listdir(self.model_dir)
+                              if name.endswith(('_knn.json', '_knn.pkl'))})
+        return sum(1 for symbol in symbols if self.get(symbol) is not None)
+
+    def stats(self):
+        with self._lock:
+            loads = self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "load_seconds_total": round(self.load_seconds, 6),
+                "load_ms_avg": round(self.load_seconds / loads * 1000, 3) if loads else 0.0,
+                "cached_models": list(self._models),
+                "cached_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, symbol):
+        entry = self._models.pop(symbol, None)
+        if entry is not None:
+            self._bytes -= entry[3]
+
+    def _evict(self):
+        # Always keep the most recent model, even if it alone is over budget
+        while self._bytes > self.max_bytes and len(self._models) > 1:
+            symbol = next(iter(self._models))
+            self._drop(symbol)
+            self.evictions += 1
@@ -11,7 +11,15 @@ document.addEventListener('DOMContentLoaded', () => {
   const loadDataBtn = document.getElementById('loadDataBtn');
   loadDataBtn.addEventListener('click', () => {
     const symbol = document.getElementById('symbolDropdown').value;
-    fetchMarketData(symbol);
+    const interval = document.getElementById('intervalDropdown').value;
+    fetchMarketData(symbol, interval);
+  });
+
+  // 3) Next page of the data table
+  document.getElementById('loadMoreBtn').addEventListener('click', () => {
+    if (tablePage && tablePage.next) {
+      loadTablePage(tablePage.symbol, tablePage.interval, tablePage.next);
+    }
   });
 });
 
@@ -26,15 +34,24 @@ function populateDropdown(symbols) {
   });
 }
 
-function fetchMarketData(symbol) {
-  fetch(`/api/market-data/${symbol}`)
+function fetchMarketData(symbol, interval = '1d') {
+  closeLiveStream();
+  // Columnar format: one array per field, ready for Plotly. The chart can't show
+  // more than about a row per pixel, so the server decimates to its width
+  // (keeping every signal day); the table pages through the full rows on its own.
+  const width = document.getElementById('chartContainer').clientWidth || 1000;
+  fetch(`/api/market-data/${symbol}?format=columnar&float32=1&interval=${interval}&width=${width}`)
     .then(res => res.json())
-    .then(data => {
-      renderTable(data);
+    .then(payload => {
+      const data = payload.columns;
       renderChart(data, symbol);
-      fetchKnnSignals(symbol); // Fetch KNN signals and add to chart
+      if (interval === '1d') {
+        fetchKnnSignals(symbol); // KNN signals are daily; add them to the chart
+        openLiveStream(symbol, data);
+      }
     })
     .catch(err => console.error('Error fetching market data:', err));
+  loadTablePage(symbol, interval, null);
 }
 
 
@@ -71,19 +88,53 @@ function addSignalsToChart(signals) {
 
   // Add markers to the existing chart
   Plotly.addTraces('chartContainer', [buyMarkers, sellMarkers]);
+  if (live) {
+    const chart = document.getElementById('chartContainer');
+    live.signalTraces = { buy: chart.data.length - 2, sell: chart.data.length - 1 };
+    signals.forEach(s => live.signalDates.add(s.date));
+  }
 }
 
 
 
 // -------------- Table Rendering --------------
 
-function renderTable(data) {
-  const tableBody = document.querySelector('#marketDataTable tbody');
-  tableBody.innerHTML = ''; // clear existing rows
+// Newest rows first, PAGE_SIZE at a time, following the server's cursor
+const PAGE_SIZE = 100;
+let tablePage = null;       // { symbol, interval, next } of the loaded table
+const tableRows = new Map(); // date -> <tr>, for live updates
+
+function loadTablePage(symbol, interval, cursor) {
+  const params = new URLSearchParams({ size: PAGE_SIZE, interval: interval });
+  if (cursor) params.set('cursor', cursor);
+  const request = tablePage = { symbol, interval, next: null };
+  fetch(`/api/market-data/${symbol}/page?${params}`)
+    .then(res => res.json())
+    .then(page => {
+      if (request !== tablePage) return; // another symbol or page was asked for since
+      if (!cursor) {
+        document.querySelector('#marketDataTable tbody').innerHTML = ''; // clear existing rows
+        tableRows.clear();
+      }
+      renderTableRows(page.rows);
+      request.next = page.next_cursor;
+      document.getElementById('loadMoreBtn').style.display = page.next_cursor ? '' : 'none';
+    })
+    .catch(err => console.error('Error fetching table page:', err));
+}
 
-  data.forEach(row => {
+function renderTableRows(rows) {
+  const tableBody = document.querySelector('#marketDataTable tbody');
+  rows.forEach(row => {
     const tr = document.createElement('tr');
-    tr.innerHTML = `
+    tr.innerHTML = tableRowHtml(row);
+    tableBody.appendChild(tr);
+    tableRows.set(row.date, tr);
+  });
+}
+
+function tableRowHtml(row) {
+  return `
       <td>${row.date}</td>
       <td>${formatNumber(row.open)}</td>
       <td>${formatNumber(row.high)}</td>
@@ -98,10 +149,8 @@ function renderTable(data) {
       <td>${formatNumber(row.ema_89)}</td>
       <td>${formatNumber(row.ema_144)}</td>
       <td>${formatNumber(row.ema_200)}</td>
-      <td>${row.signals}</td>
+      <td>${row.signals ?? ''}</td>
     `;
-    tableBody.appendChild(tr);
-  });
 }
 
 // Helper to format numbers to 2 decimal places or blank if null
@@ -111,12 +160,12 @@ function formatNumber(val) {
 
 // -------------- Chart Rendering (Plotly) --------------
 function renderChart(data, symbol) {
-  // 1) Prepare arrays
-  const dates = data.map(d => d.date);
-  const open = data.map(d => d.open);
-  const high = data.map(d => d.high);
-  const low = data.map(d => d.low);
-  const close = data.map(d => d.close);
+  // 1) Arrays come straight from the columnar response
+  const dates = data.date;
+  const open = data.open;
+  const high = data.high;
+  const low = data.low;
+  const close = data.close;
 
   // 2) Candlestick trace
   const candlestickTrace = {
@@ -148,16 +197,16 @@ function renderChart(data, symbol) {
 const EMA_COLOR = 'rgba(255, 0, 0, 0.25)'; // red at 50% opacity
 
 
-  const ema8Trace   = lineTrace('EMA_8',   data.map(d => d.ema_8),   EMA_COLOR);
-  const ema13Trace  = lineTrace('EMA_13',  data.map(d => d.ema_13),  EMA_COLOR);
-  const ema21Trace  = lineTrace('EMA_21',  data.map(d => d.ema_21),  EMA_COLOR);
-  const ema34Trace  = lineTrace('EMA_34',  data.map(d => d.ema_34),  EMA_COLOR);
-  const ema55Trace  = lineTrace('EMA_55',  data.map(d => d.ema_55),  EMA_COLOR);
-  const ema89Trace  = lineTrace('EMA_89',  data.map(d => d.ema_89),  EMA_COLOR);
-  const ema144Trace = lineTrace('EMA_144', data.map(d => d.ema_144), EMA_COLOR);
-  const ema200Trace = lineTrace('EMA_200', data.map(d => d.ema_200), EMA_COLOR);
+  const ema8Trace   = lineTrace('EMA_8',   data.ema_8,   EMA_COLOR);
+  const ema13Trace  = lineTrace('EMA_13',  data.ema_13,  EMA_COLOR);
+  const ema21Trace  = lineTrace('EMA_21',  data.ema_21,  EMA_COLOR);
+  const ema34Trace  = lineTrace('EMA_34',  data.ema_34,  EMA_COLOR);
+  const ema55Trace  = lineTrace('EMA_55',  data.ema_55,  EMA_COLOR);
+  const ema89Trace  = lineTrace('EMA_89',  data.ema_89,  EMA_COLOR);
+  const ema144Trace = lineTrace('EMA_144', data.ema_144, EMA_COLOR);
+  const ema200Trace = lineTrace('EMA_200', data.ema_200, EMA_COLOR);
 
-  // 4) Combine all traces
+  // 4) Combine all traces (intraday intervals have no EMA columns)
   const traces = [
     candlestickTrace,
     ema8Trace,
@@ -168,7 +217,7 @@ const EMA_COLOR = 'rgba(255, 0, 0, 0.25)'; // red at 50% opacity
     ema89Trace,
     ema144Trace,
     ema200Trace
-  ];
+  ].filter(trace => trace.type === 'candlestick' || trace.y);
 
   // 5) Layout (e.g. dark background or normal)
   const layout = {
@@ -184,3 +233,98 @@ const EMA_COLOR = 'rgba(255, 0, 0, 0.25)'; // red at 50% opacity
   // 6) Plot
   Plotly.newPlot('chartContainer', traces, layout);
 }
+
+// -------------- Live Updates (server-sent events) --------------
+
+// The open stream and what it needs to patch the chart and table in place
+let live = null;
+
+function closeLiveStream() {
+  if (live) {
+    live.source.close();
+    live = null;
+  }
+}
+
+function openLiveStream(symbol, data) {
+  // The chart holds a decimated subset of the days, so look points up by date
+  const chartIndex = new Map(data.date.map((date, i) => [date, i]));
+  const lastDate = data.date[data.date.length - 1] ?? '';
+  const source = new EventSource(`/api/stream?symbols=${encodeURIComponent(symbol)}`);
+  live = { source, symbol, chartIndex, lastDate, signalTraces: null, signalDates: new Set() };
+
+  source.addEventListener('bars', event => applyLiveBars(JSON.parse(event.data)));
+  source.addEventListener('signals', event => applyLiveSignals(JSON.parse(event.data)));
+  source.onerror = err => console.error('Live stream error (the browser will reconnect):', err);
+}
+
+// Rows the page already has are patched in place; newer days are appended to
+// the chart and added to the top of the table
+function applyLiveBars(payload) {
+  if (!live || payload.symbol !== live.symbol) return;
+  const chart = document.getElementById('chartContainer');
+  const tableBody = document.querySelector('#marketDataTable tbody');
+  const cols = payload.columns;
+  const rowAt = i => Object.fromEntries(Object.keys(cols).map(field => [field, cols[field][i]]));
+  const candles = chart.data[0];
+  const emaTraces = chart.data
+    .map((trace, index) => ({ index, column: trace.name.toLowerCase() }))
+    .filter(t => t.column.startsWith('ema_'));
+
+  const appended = [];
+  let changed = false;
+  cols.date.forEach((date, i) => {
+    if (date > live.lastDate) {
+      appended.push(i);
+      return;
+    }
+    const point = live.chartIndex.get(date);
+    if (point !== undefined) {
+      ['open', 'high', 'low', 'close'].forEach(field => { candles[field][point] = cols[field][i]; });
+      emaTraces.forEach(t => { chart.data[t.index].y[point] = cols[t.column][i]; });
+      changed = true;
+    }
+    const tr = tableRows.get(date);
+    if (tr) tr.innerHTML = tableRowHtml(rowAt(i));
+  });
+  if (changed) {
+    Plotly.redraw(chart);
+  }
+  if (!appended.length) return;
+
+  const pick = field => appended.map(i => cols[field][i]);
+  const dates = pick('date');
+  Plotly.extendTraces(chart, {
+    x: [dates], open: [pick('open')], high: [pick('high')], low: [pick('low')], close: [pick('close')]
+  }, [0]);
+  if (emaTraces.length) {
+    Plotly.extendTraces(chart, {
+      x: emaTraces.map(() => dates),
+      y: emaTraces.map(t => pick(t.column))
+    }, emaTraces.map(t => t.index));
+  }
+  appended.forEach(i => {
+    live.chartIndex.set(cols.date[i], live.chartIndex.size);
+    live.lastDate = cols.date[i];
+    if (tableRows.has(cols.date[i])) return; // the first table page already had it
+    const tr = document.createElement('tr');
+    tr.innerHTML = tableRowHtml(rowAt(i));
+    tableBody.insertBefore(tr, tableBody.firstChild);
+    tableRows.set(cols.date[i], tr);
+  });
+}
+
+function applyLiveSignals(payload) {
+  if (!live || payload.symbol !== live.symbol || !live.signalTraces) return;
+  const offset = 5; // same spacing as addSignalsToChart
+  const fresh = payload.signals.filter(s => !live.signalDates.has(s.date));
+  fresh.forEach(s => live.signalDates.add(s.date));
+
+  const buys = fresh.filter(s => s.type === 'buy');
+  const sells = fresh.filter(s => s.type === 'sell');
+  if (!buys.length && !sells.length) return;
+  Plotly.extendTraces('chartContainer', {
+    x: [buys.map(s => s.date), sells.map(s => s.date)],
+    y: [buys.map(s => s.price + offset), sells.map(s => s.price - offset)]
+  }, [live.signalTraces.buy, live.signalTraces.sell]);
+}
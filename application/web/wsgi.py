@@ -0,0 +1,36 @@
+"""
+wsgi.py
+-------
+Production entry point for the dashboard API.
+
+  gunicorn -c web/gunicorn.conf.py wsgi:application    Linux/macOS (from application/)
+  python web/wsgi.py                                   waitress, e.g. on Windows
+
+Both serve create_app() with the models and feature matrices preloaded
+(app.preload). Under gunicorn that happens once in the master, before the
+workers are forked (preload_app in gunicorn.conf.py), so they share it.
+waitress is a single multi-threaded process: nothing is shared, but the
+first requests don't pay for the loading either. PRELOAD=0 skips it.
+
+Liveness is /healthz and readiness /readyz.
+"""
+
+import os
+
+from app import create_app
+
+try:
+    import waitress
+except ImportError:  # Optional: pip install waitress
+    waitress = None
+
+BIND = os.getenv("BIND", "0.0.0.0:8000")
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+
+application = create_app(preload_data=os.getenv("PRELOAD", "1") == "1")
+
+if __name__ == '__main__':
+    if waitress is None:
+        raise SystemExit("waitress is not installed (pip install waitress); "
+                         "on Linux/macOS use: gunicorn -c web/gunicorn.conf.py wsgi:application")
+    waitress.serve(application, listen=BIND, threads=WEB_THREADS)